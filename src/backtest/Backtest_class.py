@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
+from src.backtest.core import run_backtest, run_portfolio_backtest, run_backtest_columns
+from src.backtest.metrics import frequency_mapping, portfolio_returns, calculate_sharpe_ratio, performance_metrics
 
 class BacktestSingleStock:
 
@@ -17,19 +19,8 @@ class BacktestSingleStock:
         """
         Calculate the Sharpe Ratio of the portfolio.
         """
-        frequency_mapping = {
-            '1min': 252 * 6.5 * 60,  # Assuming 6.5 hours of trading per day
-            '5min': 252 * 6.5 * 12,  # Assuming 6.5 hours of trading per day
-            '15min': 252 * 26,      # 26 intervals per day
-            '1H': 252 * 6.5,        # 6.5 trading hours per day
-            '1D': 252,               # 252 trading days per year
-            '1W': 52,                # 52 weeks per year
-            '1Y': 1
-        }
         annualization_factor = frequency_mapping.get(self.frequency, 252)
-        excess_returns = [d - (self.risk_free_rate / annualization_factor) for d in self.daily_returns]
-        sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(annualization_factor)
-        return sharpe_ratio
+        return calculate_sharpe_ratio(self.daily_returns, self.risk_free_rate, annualization_factor, ddof=0)
 
     def plot_portfolio(self):
         """
@@ -51,59 +42,15 @@ class BacktestSingleStock:
     def compute_backtest(self, initial_capital: float = 10000, leverage: float = 1.0, fees_type: str = "-", fees_amount: float = 0):
         """
         Run the backtest based on the signal data provided.
+        Signal, Execute and Quantity follow src/signal/encoding.py; legacy string signals are converted first.
+        Orders fill at their Execute price when it lies within the Low/High range of their bar (see backtest/core.py).
         """
-        cash = initial_capital
-        max_cash_available = - np.abs(leverage * initial_capital)
-        max_short_position = np.abs(leverage * initial_capital)
-        position = 0
-
-        for i in range(len(self.data)):
-            signal = self.data['Signal'].iloc[i]
-            execute_price = self.data['Execute'].iloc[i]
-            quantity = self.data['Quantity'].iloc[i]
-            low = self.data['Low'].iloc[i]
-            high = self.data['High'].iloc[i]
-
-            if execute_price is not None:
-                if (execute_price >= low) and (execute_price <= high):
-                    trade_value = quantity * initial_capital
-
-                    if signal == "Sell" and position > 0:
-                        proceeds = position * execute_price
-                        fee = fees_amount if fees_type == "-" else proceeds * fees_amount
-                        cash += proceeds - fee
-                        position = 0
-                        max_cash_available = -np.abs(leverage * portfolio_value)
-                        max_short_position = np.abs(leverage * portfolio_value)
-
-                    elif signal == "Buy" and position < 0:
-                        proceeds = -position * execute_price
-                        fee = fees_amount if fees_type == "-" else proceeds * fees_amount
-                        cash -= proceeds + fee
-                        position = 0
-                        max_cash_available = -np.abs(leverage * portfolio_value)
-                        max_short_position = np.abs(leverage * portfolio_value)
-
-                    elif signal == "Buy" and cash - trade_value >= max_cash_available:
-                        fee = fees_amount if fees_type == "-" else trade_value * fees_amount
-                        cash -= (trade_value + fee)
-                        position += trade_value / execute_price
-
-                    elif signal == "Sell" and cash - trade_value <= max_short_position:
-                        fee = fees_amount if fees_type == "-" else trade_value * fees_amount
-                        cash += (trade_value - fee)
-                        position -= trade_value / execute_price
-
-            stock_value = position * self.data['Close'].iloc[i] if position != 0 else 0
-            portfolio_value = cash + stock_value
-
-            self.portfolio_values.append(portfolio_value)
-            self.cash_values.append(cash)
-            self.stock_values.append(stock_value)
-
-            if i > 0:
-                daily_return = (portfolio_value - self.portfolio_values[-2]) / self.portfolio_values[-2]
-                self.daily_returns.append(daily_return)
+        outputs = run_backtest(self.data, fill="limit", sizing="fraction", initial_capital=initial_capital,
+                               leverage=leverage, fees_type="-" if fees_type == "-" else "%", fees_amount=fees_amount)
+        self.portfolio_values = outputs["Portfolio_Value"]
+        self.cash_values = outputs["Cash"]
+        self.stock_values = outputs["Stock_Value"]
+        self.daily_returns = portfolio_returns(self.portfolio_values)
 
         final_value = self.portfolio_values[-1]
         profit = final_value - initial_capital
@@ -118,3 +65,70 @@ class BacktestSingleStock:
         self.data['Portfolio_Value'] = self.portfolio_values
         self.data['Cash'] = self.cash_values
         self.data['Stock_Value'] = self.stock_values
+
+    def compute_backtest_columns(self, signals: pd.DataFrame, execute=None, quantities=1.0,
+                                 initial_capital: float = 10000, leverage: float = 1.0, fees_type: str = "-",
+                                 fees_amount: float = 0):
+        """
+        Run compute_backtest on every column of a signal matrix in one pass, e.g. the columns of
+        ma_crossover_signal_grid, against the Close (High and Low) of self.data.
+
+        signals pd.DataFrame: (T x P) BUY/SELL/HOLD codes aligned on self.data, one column per parameter set
+        execute: (T) or (T x P) order prices filled within High/Low, None to fill every order at the close
+        quantities: order size as a fraction of initial_capital, scalar, (T) or (T x P)
+        returns (pd.DataFrame, pd.DataFrame): (T x P) portfolio values and one row of metrics per column
+            (see backtest/metrics.py)
+        """
+        outputs = run_backtest_columns(signals.to_numpy(), self.data['Close'].to_numpy(), execute, quantities,
+                                       None if execute is None else self.data['High'].to_numpy(),
+                                       None if execute is None else self.data['Low'].to_numpy(),
+                                       initial_capital=initial_capital, leverage=leverage,
+                                       fees_type="-" if fees_type == "-" else "%", fees_amount=fees_amount)
+        portfolio_values = pd.DataFrame(outputs["Portfolio_Value"], index=self.data.index, columns=signals.columns)
+
+        final_value = outputs["Portfolio_Value"][-1]
+        metrics = pd.DataFrame({
+            "Final_Value": final_value,
+            "Total_Profit": final_value - initial_capital,
+            "Return": (final_value - initial_capital) / initial_capital * 100,
+        }, index=signals.columns)
+        frequency = self.frequency if self.frequency in frequency_mapping else "1D"
+        metrics = metrics.join(performance_metrics(portfolio_values, outputs["Stock_Value"], self.data['Close'],
+                                                   self.risk_free_rate, frequency, ddof=0))
+        return portfolio_values, metrics
+
+
+class BacktestPortfolio(BacktestSingleStock):
+
+    def __init__(self, panel: pd.DataFrame = None, risk_free_rate: float = 0.03, frequency: str = "daily"):
+        """
+        panel pd.DataFrame: (field, symbol) columns holding Signal, Execute, Quantity, High, Low and Close for
+            every symbol (see src/technicalanalysis/engine.py)
+        """
+        super().__init__(panel, risk_free_rate, frequency)
+        self.positions = None
+
+    def compute_backtest(self, initial_capital: float = 10000, leverage: float = 1.0, fees_type: str = "-", fees_amount: float = 0):
+        """
+        Run the orders of all the symbols against one shared cash account, with the leverage and fee rules of
+        BacktestSingleStock.compute_backtest (see run_portfolio_backtest in backtest/core.py).
+        """
+        fields = [self.data[field] for field in ("Signal", "Execute", "Quantity", "High", "Low", "Close")]
+        outputs = run_portfolio_backtest(*(field.to_numpy() for field in fields), initial_capital=initial_capital,
+                                         leverage=leverage, fees_type="-" if fees_type == "-" else "%",
+                                         fees_amount=fees_amount)
+        self.portfolio_values = outputs["Portfolio_Value"]
+        self.cash_values = outputs["Cash"]
+        self.stock_values = outputs["Stock_Value"]
+        self.daily_returns = portfolio_returns(self.portfolio_values)
+        self.positions = pd.DataFrame(outputs["Positions"], index=self.data.index, columns=fields[0].columns)
+
+        final_value = self.portfolio_values[-1]
+        profit = final_value - initial_capital
+        return_rate = (profit / initial_capital) * 100
+        sharpe_ratio = self.compute_sharpe_ratio()
+
+        print(f"Final Portfolio Value: ${final_value:.2f}")
+        print(f"Total Profit: ${profit:.2f}")
+        print(f"Return: {return_rate:.2f}%")
+        print(f"Sharpe Ratio: {sharpe_ratio:.2f}")
@@ -4,19 +4,13 @@ Example without backtester
 
 from src.data.yFinance import yfinanceGetter
 from src.signal.Moving_Average_Crossover import ma_crossover_signal
+from src.backtest.core import run_backtest
+from src.backtest.metrics import portfolio_returns, calculate_sharpe_ratio
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 
 
-def calculate_sharpe_ratio(returns, risk_free_rate=0.01):
-    """
-    Calculate the Sharpe Ratio of the portfolio.
-    """
-    excess_returns = returns - risk_free_rate / 252  # Daily risk-free rate
-    sharpe_ratio = excess_returns.mean() / excess_returns.std() * np.sqrt(252)
-    return sharpe_ratio
-
 def plot_portfolio(df):
     """
     Plot portfolio value, cash, and stock position over time using Plotly.
@@ -81,53 +75,13 @@ def backtest_ma_crossover_strategy(ticker: str, start_date: str, end_date: str,
     # Apply the moving average crossover strategy
     df = ma_crossover_signal(df, base_line_window=base_line_window, signal_line_window=signal_line_window)
 
-    # Initialize backtest variables
-    cash = initial_capital
-    position = 0
-    portfolio_values = []
-    cash_values = []
-    stock_values = []
-    daily_returns = []
-
-    for i in range(1, len(df)):
-        signal = df['Signal'].iloc[i]
-        close_price = df['Close'].iloc[i]
-
-        # Calculate fees
-        def calculate_fees(amount):
-            if fees_type == "%":
-                return np.abs(amount * fees_amount)
-            elif fees_type == "-":
-                return fees_amount
-            else:
-                raise ValueError("Invalid fees_type. Use '-' for flat fees or '%' for proportional fees.")
-
-        # Buy signal
-        if signal == "Buy" and cash > 0:
-            fee = calculate_fees(cash)
-            effective_cash = cash - fee
-            position = effective_cash / close_price
-            cash = 0
-
-        # Sell signal
-        elif signal == "Sell" and position > 0:
-            proceeds = position * close_price
-            fee = calculate_fees(proceeds)
-            cash = proceeds - fee
-            position = 0
-
-        # Portfolio value tracking
-        stock_value = position * close_price
-        portfolio_value = cash + stock_value
-
-        portfolio_values.append(portfolio_value)
-        cash_values.append(cash)
-        stock_values.append(stock_value)
-
-        # Calculate daily returns
-        if i > 1:
-            daily_return = (portfolio_value - portfolio_values[-2]) / portfolio_values[-2]
-            daily_returns.append(daily_return)
+    # Run the orders at the close, all-in, from the second bar on
+    values = run_backtest(df, fill="close", sizing="all_in", initial_capital=initial_capital,
+                          fees_type=fees_type, fees_amount=fees_amount, start=1)
+    portfolio_values = values["Portfolio_Value"][1:]
+    cash_values = values["Cash"][1:]
+    stock_values = values["Stock_Value"][1:]
+    daily_returns = portfolio_returns(portfolio_values)
 
     # Final portfolio value and Sharpe Ratio
     final_value = portfolio_values[-1]
@@ -4,6 +4,9 @@ We buy at close on day t and sell at open on day t+1
 import pandas as pd
 import numpy as np
 from src.data.Alpaca import fetch_alpaca_data
+from src.backtest.core import run_backtest
+from src.backtest.metrics import portfolio_returns, calculate_sharpe_ratio
+from src.signal.encoding import BUY, SELL
 import plotly.graph_objects as go
 import plotly.io as pio
 pio.renderers.default = "browser"
@@ -26,9 +29,7 @@ class OvernightLongBacktest:
         """
         Calculate the Sharpe Ratio of the portfolio.
         """
-        excess_returns = [d - (self.risk_free_rate / 252) for d in returns]
-        sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252)
-        return sharpe_ratio
+        return calculate_sharpe_ratio(returns, self.risk_free_rate, periods=252, ddof=0)
 
     def plot_portfolio(self):
         """
@@ -52,47 +53,26 @@ class OvernightLongBacktest:
         """
         Run the backtest for the overnight long strategy.
         """
-        cash = self.initial_capital
-        position = 0
+        # One Buy at the close of day t and one Sell at the open of day t+1 per overnight, run all in on the core
+        close = self.data['Close'].to_numpy(dtype=np.float64)
+        next_open = self.data['Open'].to_numpy(dtype=np.float64)[1:]
+        prices = np.column_stack([close[:-1], next_open]).ravel()
+        events = pd.DataFrame({'Signal': np.tile(np.array([BUY, SELL], dtype=np.int8), len(next_open)),
+                               'Close': prices})
+        values = run_backtest(events, sizing="all_in", initial_capital=self.initial_capital, fill_prices=prices)
+
+        # The value of each day is taken after its Sell, the last day has no overnight and repeats the previous one
+        overnight_values = values['Portfolio_Value'][1::2]
+        self.portfolio_values = list(np.append(overnight_values, overnight_values[-1:]))
+        self.cash_values = list(np.append(values['Cash'][1::2], values['Cash'][-1:]))
+        self.stock_values = list(np.append(values['Stock_Value'][1::2], values['Stock_Value'][-1:]))
 
         # Buy & Hold benchmark
-        benchmark_position = self.initial_capital / self.data['Close'].iloc[0]
-
-        for i in range(len(self.data)):
-            if i == len(self.data) - 1:
-                self.portfolio_values.append(self.portfolio_values[-1])
-                self.cash_values.append(self.cash_values[-1])
-                self.stock_values.append(self.stock_values[-1])
-                self.benchmark_values.append(benchmark_position * self.data['Close'].iloc[i])
-                break
-
-            close_price = self.data['Close'].iloc[i]
-            next_open_price = self.data['Open'].iloc[i + 1]
-
-            # Buy at close price
-            position = cash / close_price
-            cash = 0
-
-            # Sell at next day's open price
-            proceeds = position * next_open_price
-            cash = proceeds
-            position = 0
-
-            portfolio_value = cash
-            self.portfolio_values.append(portfolio_value)
-            self.cash_values.append(cash)
-            self.stock_values.append(position)
-
-            # Benchmark tracking
-            benchmark_value = benchmark_position * self.data['Close'].iloc[i]
-            self.benchmark_values.append(benchmark_value)
-
-            # Calculate daily returns
-            if i > 0:
-                daily_return = (portfolio_value - self.portfolio_values[-2]) / self.portfolio_values[-2]
-                benchmark_return = (benchmark_value - self.benchmark_values[-2]) / self.benchmark_values[-2]
-                self.daily_returns.append(daily_return)
-                self.benchmark_returns.append(benchmark_return)
+        benchmark_position = self.initial_capital / close[0]
+        self.benchmark_values = list(benchmark_position * close)
+
+        self.daily_returns = list(portfolio_returns(overnight_values))
+        self.benchmark_returns = list(portfolio_returns(self.benchmark_values[:-1]))
 
         final_value = self.portfolio_values[-1]
         profit = final_value - self.initial_capital
@@ -5,39 +5,25 @@ import pandas as pd
 import numpy as np
 from src.data.Alpaca import fetch_alpaca_data
 from src.signal.RSI_p import RSI_distrib
+from src.backtest import metrics
+from src.backtest.core import run_backtest
+from src.backtest.metrics import portfolio_returns, periods_per_year
 import plotly.graph_objects as go
 
 
-def calculate_sharpe_ratio(returns, risk_free_rate=0.01, frequency='daily'):
+def calculate_sharpe_ratio(returns, risk_free_rate=0.01, frequency='1D'):
     """
     Calculate the Sharpe Ratio of the portfolio for different time frequencies.
 
     Parameters:
         returns (pd.Series): Series of portfolio returns.
         risk_free_rate (float): Annualized risk-free rate.
-        frequency (str): Frequency of the data ('minutes', '15minutes', 'hourly', 'daily', 'weekly').
+        frequency (str): Frequency of the data, a key of metrics.frequency_mapping ('15min', '1D', ...).
 
     Returns:
         float: Sharpe ratio
     """
-    frequency_mapping = {
-        '1min': 252 * 6.5 * 60,  # Assuming 6.5 hours of trading per day
-        '5min': 252 * 6.5 * 12,  # Assuming 6.5 hours of trading per day
-        '15min': 252 * 26,  # 26 intervals per day
-        '1H': 252 * 6.5,  # 6.5 trading hours per day
-        '1D': 252,  # 252 trading days per year
-        '1W': 52,  # 52 weeks per year
-        '1Y': 1,  # 52 weeks per year
-    }
-
-    if frequency not in frequency_mapping:
-        raise ValueError("Invalid frequency. Choose from 'minutes', '15minutes', 'hourly', 'daily', 'weekly'.")
-
-    annualization_factor = frequency_mapping[frequency]
-    excess_returns = returns - (risk_free_rate / annualization_factor)
-    sharpe_ratio = excess_returns.mean() / excess_returns.std() * np.sqrt(annualization_factor)
-
-    return sharpe_ratio
+    return metrics.calculate_sharpe_ratio(returns, risk_free_rate, periods_per_year(frequency))
 
 
 def plot_portfolio(df):
@@ -71,81 +57,13 @@ def backtest_rsi_distrib_strategy_with_leverage_alpaca(ticker: str, start_date:
     # Apply the RSI distribution strategy
     df = RSI_distrib(df, alpha=alpha, window=window, dist_window=dist_window, lag=lag, rsi_exit_up=rsi_exit_up, rsi_exit_down=rsi_exit_down, bb_target_std=bb_target_std)
 
-    # Initialize backtest variables
-    cash = initial_capital
-    max_cash_available = leverage * cash
-    max_short_position = leverage * cash
-    position = 0
-    portfolio_values = []
-    cash_values = []
-    stock_values = []
-    daily_returns = []
-
-    # Calculate fees
-    def calculate_fees(amount):
-        if fees_type == "%":
-            return amount * fees_amount
-        elif fees_type == "-":
-            return fees_amount
-        else:
-            raise ValueError("Invalid fees_type. Use '-' for flat fees or '%' for proportional fees.")
-
-    for i in range(len(df)):
-        signal = df['Signal'].iloc[i]
-        execute_price = df['Execute'].iloc[i]
-        quantity = df['Quantity'].iloc[i]
-        low = df['Low'].iloc[i]
-        high = df['High'].iloc[i]
-
-        if execute_price is not None:
-            if (execute_price >= low) and (execute_price <= high):
-                trade_value = quantity * initial_capital
-
-                if signal == "Sell" and position > 0:
-                    # Close a long position
-                    proceeds = position * execute_price
-                    fee = calculate_fees(proceeds)
-                    cash += proceeds - fee
-                    position = 0
-
-                    max_cash_available = leverage * cash
-                    max_short_position = leverage * cash
-
-
-                elif signal == "Buy" and position < 0:
-                    # Close a short position
-                    proceeds = -position * execute_price
-                    fee = calculate_fees(proceeds)
-                    cash -= proceeds + fee
-                    position = 0
-
-                    max_cash_available = leverage * cash
-                    max_short_position = leverage * cash
-
-                elif signal == "Buy" and cash - trade_value >= max_cash_available:
-                    # Open a long position
-                    fee = calculate_fees(trade_value)
-                    cash -= (trade_value + fee)
-                    position += trade_value / execute_price
-
-                elif signal == "Sell" and cash - trade_value <= max_short_position:
-                    # Open a short position within the leverage limit
-                    fee = calculate_fees(trade_value)
-                    cash += (trade_value - fee)
-                    position -= trade_value / execute_price
-
-        # Portfolio value tracking
-        stock_value = position * df['Close'].iloc[i] if position != 0 else 0
-        portfolio_value = cash + stock_value
-
-        portfolio_values.append(portfolio_value)
-        cash_values.append(cash)
-        stock_values.append(stock_value)
-
-        # Calculate daily returns
-        if i > 0:
-            daily_return = (portfolio_value - portfolio_values[-2]) / portfolio_values[-2]
-            daily_returns.append(daily_return)
+    # Limit orders within the Low/High range, leverage limits taken from the cash left after closing a position
+    values = run_backtest(df, fill="limit", sizing="fraction", initial_capital=initial_capital, leverage=leverage,
+                          fees_type=fees_type, fees_amount=fees_amount, margin="cash")
+    portfolio_values = values["Portfolio_Value"]
+    cash_values = values["Cash"]
+    stock_values = values["Stock_Value"]
+    daily_returns = portfolio_returns(portfolio_values)
 
     # Final portfolio value and Sharpe Ratio
     final_value = portfolio_values[-1]
@@ -3,19 +3,13 @@ Example without backtester
 """
 
 from src.data.yFinance import yfinanceGetter
-from src.signal.Volume_Price_divergence import price_volume_divergence_signal
+from src.signal.Volume_Price_divergence import price_volume_divergence_signal, price_volume_divergence_signals
+from src.backtest.core import run_backtest
+from src.backtest.metrics import portfolio_returns, calculate_sharpe_ratio
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 
-def calculate_sharpe_ratio(returns, risk_free_rate=0.01):
-    """
-    Calculate the Sharpe Ratio of the portfolio.
-    """
-    excess_returns = returns - risk_free_rate / 252  # Daily risk-free rate
-    sharpe_ratio = excess_returns.mean() / excess_returns.std() * np.sqrt(252)
-    return sharpe_ratio
-
 def plot_portfolio(df):
     """
     Plot portfolio value, cash, and stock position over time using Plotly.
@@ -77,53 +71,13 @@ def backtest_strategy(ticker: str, start_date: str, end_date: str, initial_capit
     # Apply the volume-price divergence strategy
     df = price_volume_divergence_signal(df, window)
 
-    # Initialize backtest variables
-    cash = initial_capital
-    position = 0
-    portfolio_values = []
-    cash_values = []
-    stock_values = []
-    daily_returns = []
-
-    # Calculate fees
-    def calculate_fees(amount):
-        if fees_type == "%":
-            return amount * fees_amount
-        elif fees_type == "-":
-            return fees_amount
-        else:
-            raise ValueError("Invalid fees_type. Use '-' for flat fees or '%' for proportional fees.")
-
-    for i in range(1, len(df)):
-        signal = df['Signal'].iloc[i]
-        close_price = df['Close'].iloc[i]
-
-        # Buy signal
-        if signal == "Buy" and cash > 0:
-            fee = calculate_fees(cash)
-            effective_cash = cash - fee
-            position = effective_cash / close_price
-            cash = 0
-
-        # Sell signal
-        elif signal == "Sell" and position > 0:
-            proceeds = position * close_price
-            fee = calculate_fees(proceeds)
-            cash = proceeds - fee
-            position = 0
-
-        # Portfolio value tracking
-        stock_value = position * close_price
-        portfolio_value = cash + stock_value
-
-        portfolio_values.append(portfolio_value)
-        cash_values.append(cash)
-        stock_values.append(stock_value)
-
-        # Calculate daily returns
-        if i > 1:
-            daily_return = (portfolio_value - portfolio_values[-2]) / portfolio_values[-2]
-            daily_returns.append(daily_return)
+    # Run the orders at the close, all-in, from the second bar on
+    values = run_backtest(df, fill="close", sizing="all_in", initial_capital=initial_capital,
+                          fees_type=fees_type, fees_amount=fees_amount, start=1)
+    portfolio_values = values["Portfolio_Value"][1:]
+    cash_values = values["Cash"][1:]
+    stock_values = values["Stock_Value"][1:]
+    daily_returns = portfolio_returns(portfolio_values)
 
     # Final portfolio value and Sharpe Ratio
     final_value = portfolio_values[-1]
@@ -144,6 +98,35 @@ def backtest_strategy(ticker: str, start_date: str, end_date: str, initial_capit
 
     return df
 
+def window_study(df: pd.DataFrame, windows: list, initial_capital: float = 10000, fees_type: str = "-",
+                 fees_amount: float = 0):
+    """
+    Backtest the Volume-Price Divergence strategy for several windows of the volume moving average.
+    The signals of all the windows come from price_volume_divergence_signals (one cumulative volume sum).
+
+    Parameters:
+        df: pd.DataFrame
+            Historical data with Close and Volume.
+        windows: list[int]
+            Windows to compare.
+        initial_capital, fees_type, fees_amount:
+            As backtest_strategy.
+
+    Returns:
+        pd.DataFrame: final portfolio value, return (%) and Sharpe Ratio per window.
+    """
+    signals = price_volume_divergence_signals(df, windows)
+    results = []
+    for window in windows:
+        portfolio_values = run_backtest(df.assign(Signal=signals[window]), fill="close", sizing="all_in",
+                                        initial_capital=initial_capital, fees_type=fees_type, fees_amount=fees_amount,
+                                        start=1)["Portfolio_Value"][1:]
+        daily_returns = portfolio_returns(portfolio_values)
+        results.append({"Final_Value": portfolio_values[-1],
+                        "Return": (portfolio_values[-1] - initial_capital) / initial_capital * 100,
+                        "Sharpe_Ratio": calculate_sharpe_ratio(pd.Series(daily_returns))})
+    return pd.DataFrame(results, index=pd.Index(windows, name="window"))
+
 if __name__ == "__main__":
     import plotly.io as pio
     pio.renderers.default = "browser"
@@ -0,0 +1,415 @@
+"""
+Backtest core shared by the strategy scripts
+
+A backtest is split in two steps:
+    - a fill rule turns the signal columns into the orders reaching the market on
+      each bar and the price they fill at, NaN when they do not fill
+      (FILL_RULES: 'close', 'limit', 'next_open');
+    - one compiled cash/position loop walks the fills (Numba when installed, see
+      src/technicalanalysis/kernels.py) and writes the portfolio, cash and stock
+      values into preallocated arrays.
+
+Sizing:
+    'all_in'    a Buy invests the whole cash, a Sell closes the whole long position
+                (the example scripts of this folder)
+    'fraction'  an order trades Quantity * initial_capital, within the leverage
+                limits; opposite orders close the open position first
+                (BacktestSingleStock)
+
+run_portfolio_backtest applies the 'fraction' sizing with limit fills to N
+assets at once: (T x N) arrays in, one shared cash account and one position
+per asset. run_backtest_columns runs the 'fraction' sizing on P independent
+signal columns of one asset, e.g. the P points of a parameter grid, with the
+cash and position of every column held in length-P vectors.
+
+Example:
+    values = run_backtest(df, fill="limit", sizing="fraction", leverage=2.0, fees_type="%", fees_amount=0.001)
+    performance_metrics(values["Portfolio_Value"], values["Stock_Value"], df["Close"])  (backtest/metrics.py)
+"""
+import numpy as np
+import pandas as pd
+
+from src.technicalanalysis import kernels
+from src.signal.encoding import BUY, SELL, HOLD, SIGNAL_CODES, encode_signals
+
+
+def _orders(dataframe: pd.DataFrame):
+    """
+    Signal and Quantity arrays of dataframe in the compact schema, zero quantities when there is no Quantity
+    column. The columns are encoded on a copy, dataframe is left as it is.
+    """
+    orders = encode_signals(dataframe[[col for col in ('Signal', 'Quantity') if col in dataframe]].copy())
+    quantities = orders['Quantity'].to_numpy() if 'Quantity' in orders else np.zeros(len(orders))
+    return orders['Signal'].to_numpy(), quantities
+
+
+def close_fill(dataframe: pd.DataFrame, signals, quantities):
+    """
+    Every order fills at the close of its bar.
+    """
+    close = dataframe['Close'].to_numpy(dtype=np.float64)
+    return signals, quantities, np.where(signals != HOLD, close, np.nan)
+
+
+def _limit_prices(execute, low, high):
+    """
+    Execute where it lies within [low, high], NaN elsewhere, for arrays of any shape.
+    """
+    return np.where((execute >= low) & (execute <= high), execute, np.nan)
+
+
+def limit_fill(dataframe: pd.DataFrame, signals, quantities):
+    """
+    An order fills at its Execute price when the price lies within the Low/High range of its bar.
+    """
+    execute = pd.to_numeric(dataframe['Execute']).to_numpy(dtype=np.float64)
+    return signals, quantities, _limit_prices(execute,
+                                              dataframe['Low'].to_numpy(dtype=np.float64),
+                                              dataframe['High'].to_numpy(dtype=np.float64))
+
+
+def next_open_fill(dataframe: pd.DataFrame, signals, quantities):
+    """
+    The order of bar i reaches the market on bar i+1 and fills at its open, so the values of bar i only use
+    data up to its close. The order of the last bar does not fill.
+    """
+    delayed_signals = np.full(len(signals), HOLD, dtype=signals.dtype)
+    delayed_signals[1:] = signals[:-1]
+    delayed_quantities = np.zeros(len(quantities))
+    delayed_quantities[1:] = quantities[:-1]
+    opens = dataframe['Open'].to_numpy(dtype=np.float64)
+    return delayed_signals, delayed_quantities, np.where(delayed_signals != HOLD, opens, np.nan)
+
+
+FILL_RULES = {
+    "close": close_fill,
+    "limit": limit_fill,
+    "next_open": next_open_fill,
+}
+
+
+@kernels.jit
+def _backtest_loop(signals, fill_prices, quantities, closes, start, initial_capital, leverage, all_in, cash_margin,
+                   flat_fee, fees_amount, portfolio_values, cash_values, stock_values):
+    """
+    Cash/position loop over bars start.., the bars before start keep the initial capital.
+    """
+    cash = initial_capital
+    position = 0.
+    portfolio_value = initial_capital
+    if cash_margin:
+        max_cash_available = leverage * cash
+        max_short_position = leverage * cash
+    else:
+        max_cash_available = - np.abs(leverage * initial_capital)
+        max_short_position = np.abs(leverage * initial_capital)
+
+    for i in range(len(signals)):
+        if i < start:
+            portfolio_values[i] = initial_capital
+            cash_values[i] = initial_capital
+            stock_values[i] = 0.
+            continue
+
+        signal = signals[i]
+        price = fill_prices[i]
+
+        if not np.isnan(price):
+            if all_in:
+                if signal == BUY and cash > 0:
+                    fee = fees_amount if flat_fee else cash * fees_amount
+                    effective_cash = cash - fee
+                    position = effective_cash / price
+                    cash = 0.
+
+                elif signal == SELL and position > 0:
+                    proceeds = position * price
+                    fee = fees_amount if flat_fee else proceeds * fees_amount
+                    cash = proceeds - fee
+                    position = 0.
+
+            else:
+                trade_value = quantities[i] * initial_capital
+
+                if signal == SELL and position > 0:
+                    proceeds = position * price
+                    fee = fees_amount if flat_fee else proceeds * fees_amount
+                    cash += proceeds - fee
+                    position = 0.
+                    if cash_margin:
+                        max_cash_available = leverage * cash
+                        max_short_position = leverage * cash
+                    else:
+                        max_cash_available = -np.abs(leverage * portfolio_value)
+                        max_short_position = np.abs(leverage * portfolio_value)
+
+                elif signal == BUY and position < 0:
+                    proceeds = -position * price
+                    fee = fees_amount if flat_fee else proceeds * fees_amount
+                    cash -= proceeds + fee
+                    position = 0.
+                    if cash_margin:
+                        max_cash_available = leverage * cash
+                        max_short_position = leverage * cash
+                    else:
+                        max_cash_available = -np.abs(leverage * portfolio_value)
+                        max_short_position = np.abs(leverage * portfolio_value)
+
+                elif signal == BUY and cash - trade_value >= max_cash_available:
+                    fee = fees_amount if flat_fee else trade_value * fees_amount
+                    cash -= (trade_value + fee)
+                    position += trade_value / price
+
+                elif signal == SELL and cash - trade_value <= max_short_position:
+                    fee = fees_amount if flat_fee else trade_value * fees_amount
+                    cash += (trade_value - fee)
+                    position -= trade_value / price
+
+        stock_value = position * closes[i] if position != 0 else 0.
+        portfolio_value = cash + stock_value
+
+        portfolio_values[i] = portfolio_value
+        cash_values[i] = cash
+        stock_values[i] = stock_value
+
+
+def run_backtest(dataframe: pd.DataFrame, fill: str = "close", sizing: str = "all_in", initial_capital: float = 10000,
+                 leverage: float = 1.0, fees_type: str = "-", fees_amount: float = 0, start: int = 0,
+                 margin: str = "portfolio", fill_prices=None):
+    """
+    Run the orders of a signal frame through the cash/position loop.
+
+    dataframe pd.DataFrame: output of a signal function, with Close and the columns the fill rule reads, left
+        unchanged ("Buy"/"Sell"/"Hold" signals are encoded on a copy)
+    fill str: key of FILL_RULES
+    sizing str: 'all_in' or 'fraction' (see module docstring)
+    initial_capital float: starting cash
+    leverage float: leverage limit of the 'fraction' sizing
+    fees_type str: '-' for a flat fee per order or '%' for a fee proportional to the traded value
+    fees_amount float: fee amount based on fees_type
+    start int: first bar traded
+    margin str: leverage limits of the 'fraction' sizing after a position is closed: 'portfolio' takes them
+        from the portfolio value of the previous bar, 'cash' from the cash left (backtest/RSI_p.py)
+    fill_prices np.ndarray: fill price of the order of each bar, replaces the fill rule
+    returns dict[str, np.ndarray]: 'Portfolio_Value', 'Cash' and 'Stock_Value' of every bar
+    """
+    if fill not in FILL_RULES:
+        raise ValueError(f"Unknown fill rule '{fill}', expected one of {list(FILL_RULES)}")
+    if sizing not in ("all_in", "fraction"):
+        raise ValueError("sizing must be either 'all_in' or 'fraction'")
+    if margin not in ("portfolio", "cash"):
+        raise ValueError("margin must be either 'portfolio' or 'cash'")
+    if fees_type not in ("-", "%"):
+        raise ValueError("Invalid fees_type. Use '-' for flat fees or '%' for proportional fees.")
+
+    n = len(dataframe)
+    signals, quantities = _orders(dataframe)
+    if fill_prices is None:
+        signals, quantities, fill_prices = FILL_RULES[fill](dataframe, signals, quantities)
+    outputs = {"Portfolio_Value": np.empty(n), "Cash": np.empty(n), "Stock_Value": np.empty(n)}
+
+    loop = _backtest_loop if kernels.backend == "numba" else getattr(_backtest_loop, "py_func", _backtest_loop)
+    loop(np.ascontiguousarray(signals), np.ascontiguousarray(fill_prices, dtype=np.float64),
+         np.ascontiguousarray(quantities), np.ascontiguousarray(dataframe['Close'].to_numpy(dtype=np.float64)),
+         int(start), float(initial_capital), float(leverage), sizing == "all_in", margin == "cash",
+         fees_type == "-", float(fees_amount), outputs["Portfolio_Value"], outputs["Cash"], outputs["Stock_Value"])
+    return outputs
+
+
+@kernels.jit
+def _portfolio_loop(signals, fill_prices, quantities, closes, initial_capital, leverage, flat_fee, fees_amount,
+                    positions, portfolio_values, cash_values, stock_values):
+    """
+    'fraction' loop of _backtest_loop over the bars of (T x N) arrays, vectorised over the assets.
+    Within a bar the closing orders fill first, then the opening orders in asset order against the shared cash.
+    """
+    n_assets = signals.shape[1]
+    cash = initial_capital
+    position = np.zeros(n_assets)
+    portfolio_value = initial_capital
+    max_cash_available = - np.abs(leverage * initial_capital)
+    max_short_position = np.abs(leverage * initial_capital)
+
+    for t in range(signals.shape[0]):
+        signal = signals[t]
+        price = fill_prices[t]
+        filled = ~np.isnan(price)
+
+        # Closing orders always fill and reset the leverage limits to the portfolio value of the previous bar
+        close_long = filled & (signal == SELL) & (position > 0)
+        close_short = filled & (signal == BUY) & (position < 0)
+        closing = close_long | close_short
+        if closing.any():
+            proceeds = np.where(closing, np.abs(position) * price, 0.)
+            fees = np.where(closing, fees_amount, 0.) if flat_fee else proceeds * fees_amount
+            # sums are taken with cumsum, sequential on both backends where np.sum is pairwise in numpy
+            cash += np.cumsum(np.where(close_long, proceeds - fees, 0.))[-1] - \
+                np.cumsum(np.where(close_short, proceeds + fees, 0.))[-1]
+            position[closing] = 0.
+            max_cash_available = -np.abs(leverage * portfolio_value)
+            max_short_position = np.abs(leverage * portfolio_value)
+
+        # Opening orders move the shared cash one after the other: when the limits hold all along the running
+        # cash they fill at once, otherwise they are checked one by one
+        opening = np.flatnonzero(filled & ~closing & (signal != HOLD))
+        if len(opening):
+            buy = signal[opening] == BUY
+            trade_value = quantities[t][opening] * initial_capital
+            fees = np.full(len(opening), fees_amount) if flat_fee else trade_value * fees_amount
+            flows = np.where(buy, -(trade_value + fees), trade_value - fees)
+            running_cash = np.cumsum(np.concatenate((np.array([cash]), flows)))
+            before = running_cash[:-1] - trade_value
+            if np.all(np.where(buy, before >= max_cash_available, before <= max_short_position)):
+                cash = running_cash[-1]
+                position[opening] += np.where(buy, trade_value / price[opening], -(trade_value / price[opening]))
+            else:
+                for k in range(len(opening)):
+                    j = opening[k]
+                    if buy[k] and cash - trade_value[k] >= max_cash_available:
+                        cash += flows[k]
+                        position[j] += trade_value[k] / price[j]
+                    elif not buy[k] and cash - trade_value[k] <= max_short_position:
+                        cash += flows[k]
+                        position[j] -= trade_value[k] / price[j]
+
+        stock_value = np.cumsum(np.where(position != 0, position * closes[t], 0.))[-1]
+        portfolio_value = cash + stock_value
+
+        positions[t] = position
+        portfolio_values[t] = portfolio_value
+        cash_values[t] = cash
+        stock_values[t] = stock_value
+
+
+def run_portfolio_backtest(signals, execute, quantities, high, low, close, initial_capital: float = 10000,
+                           leverage: float = 1.0, fees_type: str = "-", fees_amount: float = 0):
+    """
+    Backtest N assets against one capital base with the 'fraction' sizing and limit fills of run_backtest.
+    A held asset without a close on a bar is valued at its last close.
+
+    signals array-like (T x N): BUY/SELL/HOLD codes or "Buy"/"Sell"/"Hold" labels
+    execute array-like (T x N): order prices, NaN when there is no order
+    quantities array-like (T x N): order sizes as fractions of initial_capital
+    high, low, close array-like (T x N): bars of the assets
+    initial_capital float: starting cash, shared by all the assets
+    leverage float: leverage limit of the whole portfolio
+    fees_type str: '-' for a flat fee per order or '%' for a fee proportional to the traded value
+    fees_amount float: fee amount based on fees_type
+    returns dict[str, np.ndarray]: 'Portfolio_Value', 'Cash' and 'Stock_Value' of every bar and the (T x N) 'Positions'
+    """
+    if fees_type not in ("-", "%"):
+        raise ValueError("Invalid fees_type. Use '-' for flat fees or '%' for proportional fees.")
+    signals = np.asarray(signals)
+    if signals.dtype.kind in "OUS":
+        if not np.isin(signals, list(SIGNAL_CODES)).all():
+            raise ValueError("Signal must hold 'Buy', 'Sell' or 'Hold' or their codes BUY, SELL and HOLD")
+        signals = np.select([signals == "Buy", signals == "Sell"], [BUY, SELL], HOLD)
+    signals = np.ascontiguousarray(signals, dtype=np.int8)
+    if signals.ndim != 2:
+        raise ValueError("signals must be a (T x N) array")
+    arrays = [np.asarray(array, dtype=np.float64) for array in (execute, quantities, high, low, close)]
+    if any(array.shape != signals.shape for array in arrays):
+        raise ValueError("signals, execute, quantities, high, low and close must have the same (T x N) shape")
+    execute, quantities, high, low, close = arrays
+
+    T, N = signals.shape
+    outputs = {"Portfolio_Value": np.empty(T), "Cash": np.empty(T), "Stock_Value": np.empty(T),
+               "Positions": np.empty((T, N))}
+    loop = _portfolio_loop if kernels.backend == "numba" else getattr(_portfolio_loop, "py_func", _portfolio_loop)
+    loop(signals, np.ascontiguousarray(_limit_prices(execute, low, high)), np.ascontiguousarray(quantities),
+         np.ascontiguousarray(pd.DataFrame(close).ffill().to_numpy()), float(initial_capital), float(leverage),
+         fees_type == "-", float(fees_amount), outputs["Positions"], outputs["Portfolio_Value"], outputs["Cash"],
+         outputs["Stock_Value"])
+    return outputs
+
+
+@kernels.jit
+def _column_loop(signals, fill_prices, quantities, closes, initial_capital, leverage, flat_fee, fees_amount,
+                 portfolio_values, cash_values, stock_values):
+    """
+    'fraction' loop of _backtest_loop run on the P columns of (T x P) arrays at once, one account per column.
+    """
+    n_columns = signals.shape[1]
+    cash = np.full(n_columns, initial_capital)
+    position = np.zeros(n_columns)
+    portfolio_value = np.full(n_columns, initial_capital)
+    max_cash_available = np.full(n_columns, - np.abs(leverage * initial_capital))
+    max_short_position = np.full(n_columns, np.abs(leverage * initial_capital))
+
+    for t in range(signals.shape[0]):
+        signal = signals[t]
+        price = fill_prices[t]
+        trade_value = quantities[t] * initial_capital
+        filled = ~np.isnan(price)
+
+        # the branches of _backtest_loop as masks, in the same order
+        close_long = filled & (signal == SELL) & (position > 0)
+        close_short = filled & (signal == BUY) & (position < 0) & ~close_long
+        open_long = filled & (signal == BUY) & ~close_short & (cash - trade_value >= max_cash_available)
+        open_short = filled & (signal == SELL) & ~close_long & (cash - trade_value <= max_short_position)
+
+        proceeds = np.abs(position) * price
+        close_fee = np.full(n_columns, fees_amount) if flat_fee else proceeds * fees_amount
+        open_fee = np.full(n_columns, fees_amount) if flat_fee else trade_value * fees_amount
+        cash = np.where(close_long, cash + (proceeds - close_fee),
+                        np.where(close_short, cash - (proceeds + close_fee),
+                                 np.where(open_long, cash - (trade_value + open_fee),
+                                          np.where(open_short, cash + (trade_value - open_fee), cash))))
+        position = np.where(close_long | close_short, 0.,
+                            np.where(open_long, position + trade_value / price,
+                                     np.where(open_short, position - trade_value / price, position)))
+        closing = close_long | close_short
+        max_cash_available = np.where(closing, -np.abs(leverage * portfolio_value), max_cash_available)
+        max_short_position = np.where(closing, np.abs(leverage * portfolio_value), max_short_position)
+
+        stock_value = np.where(position != 0, position * closes[t], 0.)
+        portfolio_value = cash + stock_value
+
+        portfolio_values[t] = portfolio_value
+        cash_values[t] = cash
+        stock_values[t] = stock_value
+
+
+def run_backtest_columns(signals, close, execute=None, quantities=1.0, high=None, low=None,
+                         initial_capital: float = 10000, leverage: float = 1.0, fees_type: str = "-",
+                         fees_amount: float = 0):
+    """
+    Backtest P signal columns of one asset in one pass, each column as run_backtest(sizing="fraction") would.
+
+    signals array-like (T x P): BUY/SELL/HOLD codes, one column per parameter set
+    close array-like (T): closes of the asset
+    execute array-like (T) or (T x P): order prices filled within high/low, None to fill every order at the close
+    quantities float | array-like (T) or (T x P): order sizes as fractions of initial_capital
+    high, low array-like (T): bar range of the limit fills, required with execute
+    initial_capital float: starting cash of every column
+    leverage float: leverage limit of every column
+    fees_type str: '-' for a flat fee per order or '%' for a fee proportional to the traded value
+    fees_amount float: fee amount based on fees_type
+    returns dict[str, np.ndarray]: (T x P) 'Portfolio_Value', 'Cash' and 'Stock_Value'
+    """
+    if fees_type not in ("-", "%"):
+        raise ValueError("Invalid fees_type. Use '-' for flat fees or '%' for proportional fees.")
+    signals = np.ascontiguousarray(signals, dtype=np.int8)
+    if signals.ndim != 2:
+        raise ValueError("signals must be a (T x P) array")
+    close = np.asarray(close, dtype=np.float64)
+
+    def columns(array):
+        array = np.asarray(array, dtype=np.float64)
+        return np.ascontiguousarray(np.broadcast_to(array[:, None] if array.ndim == 1 else array, signals.shape))
+
+    if execute is None:
+        fill_prices = np.where(signals != HOLD, close[:, None], np.nan)
+    else:
+        if high is None or low is None:
+            raise ValueError("high and low are required to fill execute prices")
+        fill_prices = _limit_prices(columns(execute), columns(low), columns(high))
+
+    T, P = signals.shape
+    quantities = np.full(T, quantities) if np.ndim(quantities) == 0 else quantities
+    outputs = {"Portfolio_Value": np.empty((T, P)), "Cash": np.empty((T, P)), "Stock_Value": np.empty((T, P))}
+    loop = _column_loop if kernels.backend == "numba" else getattr(_column_loop, "py_func", _column_loop)
+    loop(signals, np.ascontiguousarray(fill_prices), columns(quantities), np.ascontiguousarray(close),
+         float(initial_capital), float(leverage), fees_type == "-", float(fees_amount),
+         outputs["Portfolio_Value"], outputs["Cash"], outputs["Stock_Value"])
+    return outputs
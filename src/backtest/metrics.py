@@ -0,0 +1,174 @@
+"""
+Performance metrics of backtests, vectorised over runs
+
+Every function takes the portfolio values of one run (T) or of P runs side by
+side (T x P), e.g. the outputs of run_backtest_columns, and reduces along the
+bars, so ranking thousands of runs costs a few numpy passes. The annualised
+metrics take the bars per year from frequency_mapping.
+
+Example:
+    values = run_backtest_columns(signals, df['Close'], quantities=0.5)
+    performance_metrics(values["Portfolio_Value"], values["Stock_Value"], df['Close'], frequency="1D")
+"""
+import numpy as np
+import pandas as pd
+
+frequency_mapping = {
+    '1min': 252 * 6.5 * 60,  # Assuming 6.5 hours of trading per day
+    '5min': 252 * 6.5 * 12,  # Assuming 6.5 hours of trading per day
+    '15min': 252 * 26,      # 26 intervals per day
+    '1H': 252 * 6.5,        # 6.5 trading hours per day
+    '1D': 252,               # 252 trading days per year
+    '1W': 52,                # 52 weeks per year
+    '1Y': 1
+}
+
+
+def periods_per_year(frequency: str):
+    """
+    Annualisation factor of a bar frequency, a key of frequency_mapping.
+    """
+    if frequency not in frequency_mapping:
+        raise ValueError(f"Invalid frequency '{frequency}', expected one of {list(frequency_mapping)}")
+    return frequency_mapping[frequency]
+
+
+def portfolio_returns(values):
+    """
+    Bar-over-bar returns of a series of portfolio values, one fewer than values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return (values[1:] - values[:-1]) / values[:-1]
+
+
+def calculate_sharpe_ratio(returns, risk_free_rate: float = 0.01, periods: int = 252, ddof: int = 1):
+    """
+    Annualised Sharpe Ratio of (T) or (T x P) returns.
+
+    returns array-like: returns of the portfolio per bar
+    risk_free_rate float: annual risk-free rate
+    periods int: bars per year
+    ddof int: delta degrees of freedom of the standard deviation (1 as pandas, 0 as numpy)
+    """
+    excess_returns = np.asarray(returns, dtype=np.float64) - risk_free_rate / periods
+    return excess_returns.mean(axis=0) / excess_returns.std(ddof=ddof, axis=0) * np.sqrt(periods)
+
+
+def sortino_ratio(returns, risk_free_rate: float = 0.01, periods: int = 252):
+    """
+    Annualised Sortino Ratio of (T) or (T x P) returns: mean excess return over its downside deviation.
+    """
+    excess_returns = np.asarray(returns, dtype=np.float64) - risk_free_rate / periods
+    downside = np.sqrt(np.mean(np.minimum(excess_returns, 0.) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return excess_returns.mean(axis=0) / downside * np.sqrt(periods)
+
+
+def drawdowns(values):
+    """
+    Drawdown of every bar from the running peak of the portfolio values, 0 at a peak and negative below it.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return values / np.maximum.accumulate(values, axis=0) - 1
+
+
+def max_drawdown(values):
+    """
+    Deepest drawdown and longest time under water of (T) or (T x P) portfolio values.
+
+    returns (float | np.ndarray, int | np.ndarray): maximum drawdown (<= 0) and its duration in bars,
+        the longest stretch spent below a previous peak
+    """
+    values = np.asarray(values, dtype=np.float64)
+    peak = np.maximum.accumulate(values, axis=0)
+    bars = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    last_peak = np.maximum.accumulate(np.where(values >= peak, bars, 0), axis=0)
+    return (values / peak - 1).min(axis=0), (bars - last_peak).max(axis=0)
+
+
+def calmar_ratio(values, periods: int = 252):
+    """
+    Annualised compounded return over the depth of the maximum drawdown, NaN without drawdown.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return _calmar_ratio(values, max_drawdown(values)[0], periods)
+
+
+def _calmar_ratio(values, max_drawdown_depth, periods: int):
+    """
+    calmar_ratio from the maximum drawdown already computed on values.
+    """
+    annual_return = (values[-1] / values[0]) ** (periods / max(len(values) - 1, 1)) - 1
+    depth = -max_drawdown_depth
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(depth > 0, annual_return / depth, np.nan)[()]
+
+
+def hit_rate(returns):
+    """
+    Share of the bars with a non-zero return that gained, NaN for a run that never moved.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.count_nonzero(returns > 0, axis=0) / np.count_nonzero(returns != 0, axis=0)
+
+
+def turnover(values, stock_values, close, periods: int = 252):
+    """
+    Annualised traded value over the portfolio value of single-asset runs.
+    The traded value of a bar is the change of the stock value not explained by the move of the close.
+
+    values, stock_values array-like (T) or (T x P): portfolio and stock values of the runs
+    close array-like (T): closes of the asset
+    """
+    values = np.asarray(values, dtype=np.float64)
+    stock_values = np.asarray(stock_values, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64).reshape((-1,) + (1,) * (stock_values.ndim - 1))
+    drifted = np.zeros(stock_values.shape)
+    drifted[1:] = stock_values[:-1] * (close[1:] / close[:-1])
+    return np.mean(np.abs(stock_values - drifted) / values, axis=0) * periods
+
+
+def exposure(stock_values):
+    """
+    Share of the bars with an open position.
+    """
+    return np.mean(np.asarray(stock_values) != 0, axis=0)
+
+
+def performance_metrics(values, stock_values=None, close=None, risk_free_rate: float = 0.01, frequency: str = "1D",
+                        ddof: int = 1):
+    """
+    Every metric of this module for P runs at once.
+
+    values array-like | pd.DataFrame (T x P): portfolio values, the columns of a frame name the runs
+    stock_values array-like (T x P): stock values, adds Exposure (and Turnover with close)
+    close array-like (T): closes of the asset of single-asset runs, adds Turnover
+    risk_free_rate float: annual risk-free rate
+    frequency str: bar frequency, a key of frequency_mapping
+    ddof int: delta degrees of freedom of the Sharpe Ratio
+    returns pd.DataFrame: one row of metrics per run
+    """
+    periods = periods_per_year(frequency)
+    index = values.columns if isinstance(values, pd.DataFrame) else None
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    returns = portfolio_returns(values)
+    depth, duration = max_drawdown(values)
+
+    metrics = {
+        "Total_Return": values[-1] / values[0] - 1,
+        "Sharpe_Ratio": calculate_sharpe_ratio(returns, risk_free_rate, periods, ddof=ddof),
+        "Sortino_Ratio": sortino_ratio(returns, risk_free_rate, periods),
+        "Max_Drawdown": depth,
+        "Max_Drawdown_Duration": duration,
+        "Calmar_Ratio": _calmar_ratio(values, depth, periods),
+        "Hit_Rate": hit_rate(returns),
+    }
+    if stock_values is not None:
+        stock_values = np.asarray(stock_values, dtype=np.float64).reshape(values.shape)
+        if close is not None:
+            metrics["Turnover"] = turnover(values, stock_values, close, periods)
+        metrics["Exposure"] = exposure(stock_values)
+    return pd.DataFrame(metrics, index=index)
@@ -0,0 +1,145 @@
+"""
+Parameter sweeps of a signal function over one bar dataset
+
+The numeric columns of the dataset are copied once into shared memory as one
+float64 block, and every worker process of the pool maps the block without
+copying; the other columns travel to the workers with the pool initializer.
+Each worker takes a contiguous chunk of the grid and evaluates it inside
+shared_indicators, so grid points asking for the same indicator (same window,
+same column, ...) compute it once per worker. List the parameters that drive
+the indicators first in param_grid: the grid is enumerated with the last
+parameter varying fastest, which keeps points sharing their indicators in the
+same chunk.
+
+Example:
+    results = sweep(RSI_distrib, {"window": [5, 14], "alpha": [0.1, 0.2, 0.3]}, df)
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.metrics import portfolio_returns, calculate_sharpe_ratio, exposure
+from src.signal.encoding import BUY, SELL
+from src.technicalanalysis.technicalanalysis import shared_indicators
+
+# dataset of the worker process, mapped from shared memory by _attach
+_dataset = None
+
+
+def signal_metrics(dataframe: pd.DataFrame, risk_free_rate: float = 0.01, periods: int = 252):
+    """
+    Default metrics of a sweep: long the whole portfolio at the close of a Buy, flat at the close of a Sell,
+    as the backtest scripts without fees.
+
+    dataframe pd.DataFrame: output of a signal function, with Close and Signal
+    risk_free_rate float: annual risk-free rate
+    periods int: bars per year
+    returns dict: Total_Return, Sharpe_Ratio, Trades and Exposure (share of bars invested)
+    """
+    close = dataframe['Close'].to_numpy(dtype=float)
+    signal = dataframe['Signal'].to_numpy()
+    invested = pd.Series(np.where(signal == BUY, 1., np.where(signal == SELL, 0., np.nan))).ffill().fillna(0.)
+    invested = invested.to_numpy()
+
+    # equity curve of one unit of capital, the metrics are the ones of the backtest reports (metrics.py)
+    equity = np.cumprod(np.concatenate(([1.], 1 + invested[:-1] * (close[1:] / close[:-1] - 1))))
+    returns = portfolio_returns(equity)
+    sharpe_ratio = np.nan
+    if len(returns) > 1:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe_ratio = calculate_sharpe_ratio(returns, risk_free_rate, periods, ddof=1)
+    return {"Total_Return": equity[-1] - 1,
+            "Sharpe_Ratio": sharpe_ratio if np.isfinite(sharpe_ratio) else np.nan,
+            "Trades": int(np.count_nonzero(np.diff(invested, prepend=0.) > 0)),
+            "Exposure": exposure(invested) if len(invested) else np.nan}
+
+
+def _split(dataframe: pd.DataFrame):
+    """
+    Numeric columns of dataframe as one float64 (T x N) array, the column order and the other columns.
+    """
+    numeric = dataframe.select_dtypes(include=[np.number])
+    return numeric.to_numpy(dtype=np.float64), list(dataframe.columns), dataframe.drop(columns=numeric.columns)
+
+
+def _frame(values: np.ndarray, columns: list, others: pd.DataFrame):
+    """
+    Frame of the sweep over the numeric block values without copying it, the other columns put back in place.
+    The block is read-only: signal functions may add or replace columns but not write into the dataset.
+    """
+    values = values.view()
+    values.flags.writeable = False
+    frame = pd.DataFrame(values, columns=[col for col in columns if col not in others.columns], index=others.index,
+                         copy=False)
+    for loc, col in enumerate(columns):
+        if col in others.columns:
+            frame.insert(loc, col, others[col])
+    return frame
+
+
+def _share(dataframe: pd.DataFrame):
+    """
+    Copy the numeric columns of dataframe into one shared memory block, returns the block and how to map it.
+    """
+    values, columns, others = _split(dataframe)
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=np.float64, buffer=block.buf)[:] = values
+    return block, (block.name, values.shape, columns, others)
+
+
+def _attach(name: str, shape: tuple, columns: list, others: pd.DataFrame):
+    """
+    Pool initializer: map the shared dataset as the frame of this worker.
+    """
+    global _dataset
+    block = shared_memory.SharedMemory(name=name)
+    _dataset = (block, _frame(np.ndarray(shape, dtype=np.float64, buffer=block.buf), columns, others))
+
+
+def _run_chunk(signal_function, points: list, evaluate, dataframe: pd.DataFrame = None):
+    """
+    Evaluate consecutive grid points on one frame, sharing their indicators.
+    """
+    dataframe = _dataset[1] if dataframe is None else dataframe
+    results = []
+    with shared_indicators(dataframe):
+        for params in points:
+            results.append(evaluate(signal_function(dataframe, **params)))
+    return results
+
+
+def sweep(signal_function, param_grid: dict, dataframe: pd.DataFrame, evaluate=signal_metrics,
+          processes: int = None):
+    """
+    Evaluate signal_function on every combination of param_grid and collect the metrics of each.
+
+    signal_function: function(dataframe, **params) returning dataframe with its Signal columns
+    param_grid dict[str, list]: values of each parameter, indicator parameters first
+    dataframe pd.DataFrame: bars, left untouched. Whatever processes is, the signal function receives the same
+        frame: the numeric columns as float64 in one read-only block, the other columns as they are
+    evaluate: function(dataframe) returning a dict of metrics, signal_metrics by default
+    processes int: worker processes, os.cpu_count() by default; 1 runs in this process
+    returns pd.DataFrame: one row per parameter set, the parameters followed by the metrics
+    """
+    names = list(param_grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+    processes = min(processes or os.cpu_count() or 1, len(points)) or 1
+
+    if processes == 1:
+        results = _run_chunk(signal_function, points, evaluate, _frame(*_split(dataframe)))
+    else:
+        chunks = [list(chunk) for chunk in np.array_split(np.array(points, dtype=object), processes)]
+        block, layout = _share(dataframe)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_attach, initargs=layout) as pool:
+                futures = [pool.submit(_run_chunk, signal_function, chunk, evaluate) for chunk in chunks]
+                results = [metrics for future in futures for metrics in future.result()]
+        finally:
+            block.close()
+            block.unlink()
+
+    return pd.concat([pd.DataFrame(points, columns=names), pd.DataFrame(results)], axis=1)
@@ -1,8 +1,49 @@
 """
 https://trendspider.com/learning-center/moving-average-crossover-strategies/
 """
+import itertools
+
+import numpy as np
 import pandas as pd
-from src.technicalanalysis.technicalanalysis import EMA, SMA
+from src.technicalanalysis.technicalanalysis import EMA, SMA, SMA_windows, EMA_windows
+from src.signal.encoding import signal_codes
+
+
+def crossover_signal(dataframe: pd.DataFrame, base_line_col: str, signal_line_col: str):
+    """
+    Buy where base_line_col crosses above signal_line_col, Sell where it crosses below, Hold elsewhere.
+    A bar where either column is NaN, now or on the previous bar, is not a crossover,
+    so the warm-up period of the moving averages is Hold.
+
+    Parameters:
+        dataframe: pd.DataFrame
+            Input data holding both columns.
+        base_line_col: str
+            Column crossing the signal line.
+        signal_line_col: str
+            Column being crossed.
+
+    Returns:
+        np.ndarray
+            BUY/SELL/HOLD code per row (see encoding.py).
+    """
+    return signal_codes(*crossings(dataframe[base_line_col].to_numpy(dtype=float),
+                                   dataframe[signal_line_col].to_numpy(dtype=float)))
+
+def crossings(base, signal):
+    """
+    Rows where base crosses above and below signal, along the first axis of (T) or (T x N) arrays.
+
+    Returns:
+        (np.ndarray[bool], np.ndarray[bool])
+            Upward and downward crossings.
+    """
+    # comparisons with NaN are False, which keeps the warm-up rows on Hold
+    up = np.zeros(base.shape, dtype=bool)
+    down = np.zeros(base.shape, dtype=bool)
+    up[1:] = (base[:-1] <= signal[:-1]) & (base[1:] > signal[1:])
+    down[1:] = (base[:-1] >= signal[:-1]) & (base[1:] < signal[1:])
+    return up, down
 
 def ma_crossover_signal(
         dataframe: pd.DataFrame,
@@ -53,26 +94,78 @@ def ma_crossover_signal(
     signal_line_col = f"{signal_line_ma_type}_{signal_line_window}_{signal_line_column[0]}"
 
     # Generate signals
-    signals = []
-    for i in range(len(dataframe)):
-        if i == 0:
-            signals.append("Hold")
-        else:
-            prev_base = dataframe[base_line_col].iloc[i - 1]
-            prev_signal = dataframe[signal_line_col].iloc[i - 1]
-            curr_base = dataframe[base_line_col].iloc[i]
-            curr_signal = dataframe[signal_line_col].iloc[i]
-
-            if prev_base <= prev_signal and curr_base > curr_signal:
-                signals.append("Buy")
-            elif prev_base >= prev_signal and curr_base < curr_signal:
-                signals.append("Sell")
-            else:
-                signals.append("Hold")
-
-    dataframe['Signal'] = signals
+    dataframe['Signal'] = crossover_signal(dataframe, base_line_col, signal_line_col)
     return dataframe
 
+def ma_crossover_signal_panel(
+        panel,
+        base_line_window: int = 14,
+        base_line_ma_type: str = "SMA",
+        base_line_column: list[str] = ["Close"],
+        signal_line_window: int = 50,
+        signal_line_ma_type: str = "SMA",
+        signal_line_column: list[str] = ["Close"]
+):
+    """
+    ma_crossover_signal for every symbol of a panel in one vectorised call.
+
+    Parameters:
+        panel: pd.DataFrame | dict[str, np.ndarray]
+            (field, symbol) or (symbol, field) panel, or (T x N) arrays keyed by field (see engine.py).
+        Others:
+            As ma_crossover_signal.
+
+    Returns:
+        dict[str, np.ndarray]
+            (T x N) 'Signal' array.
+    """
+    moving_averages = {"SMA": SMA, "EMA": EMA}
+    base = moving_averages[base_line_ma_type](panel, window=base_line_window, columns=base_line_column[:1],
+                                              output='arrays')
+    signal = moving_averages[signal_line_ma_type](panel, window=signal_line_window, columns=signal_line_column[:1],
+                                                  output='arrays')
+    base_line_col = f"{base_line_ma_type}_{base_line_window}_{base_line_column[0]}"
+    signal_line_col = f"{signal_line_ma_type}_{signal_line_window}_{signal_line_column[0]}"
+    return {"Signal": signal_codes(*crossings(base[base_line_col], signal[signal_line_col]))}
+
+def ma_crossover_signal_grid(
+        dataframe: pd.DataFrame,
+        base_line_windows: list = (14,),
+        signal_line_windows: list = (50,),
+        ma_type: str = "SMA",
+        column: str = "Close"
+):
+    """
+    Signal columns of ma_crossover_signal for every (base_line_window, signal_line_window) pair, without
+    modifying dataframe. The moving averages of all the windows are computed in one pass.
+
+    Parameters:
+        dataframe: pd.DataFrame
+            Input data containing price information.
+        base_line_windows: list[int]
+            Windows of the baseline moving average.
+        signal_line_windows: list[int]
+            Windows of the signal line moving average.
+        ma_type: str
+            Type of both moving averages ("SMA" or "EMA").
+        column: str
+            Column to calculate the moving averages on.
+
+    Returns:
+        pd.DataFrame
+            (T x P) BUY/SELL/HOLD codes, one column per (base_line_window, signal_line_window).
+    """
+    moving_averages = {"SMA": SMA_windows, "EMA": EMA_windows}
+    windows = sorted(set(base_line_windows) | set(signal_line_windows))
+    averages = moving_averages[ma_type](dataframe, windows, column=column)
+    position = {window: j for j, window in enumerate(windows)}
+
+    grid = list(itertools.product(base_line_windows, signal_line_windows))
+    base = averages[:, [position[base_window] for base_window, _ in grid]]
+    signal = averages[:, [position[signal_window] for _, signal_window in grid]]
+    return pd.DataFrame(signal_codes(*crossings(base, signal)), index=dataframe.index,
+                        columns=pd.MultiIndex.from_tuples(grid, names=['base_line_window', 'signal_line_window']))
+
 # Example usage
 if __name__ == "__main__":
     df = pd.DataFrame({
@@ -2,60 +2,174 @@
 Short Term Trading Strategies That Work
 """
 
+import itertools
+
 import pandas as pd
 import numpy as np
-from src.technicalanalysis.technicalanalysis import RSI, SMA
+from src.technicalanalysis.technicalanalysis import RSI, SMA, SMA_windows
+from src.technicalanalysis.engine import IndicatorEngine
+from src.signal.encoding import BUY, SELL
+from src.signal.state_machine import run_state_machine
+
+
+def _rsi_sma_spec(close, trend_sma, exit_sma, rsi, rsi_threshold: float, start: int, stop: int = None):
+    """
+    State machine spec of the strategy from precomputed arrays, shared by rsi_sma_signal, rsi_sma_signal_grid
+    and rsi_sma_signal_panel.
+    """
+    return {
+        "start": start, "stop": len(close) - 1 if stop is None else stop,
+        "long_entry": (close > trend_sma) & (rsi < rsi_threshold),
+        "long_entry_price": close,
+        "long_exit": close > exit_sma,
+        "long_exit_price": close,
+        "sizes": (1.0,),  # Always trade the full position
+        "signed_exit": True,
+    }
 
 
-def rsi_sma_signal(dataframe: pd.DataFrame):
+def rsi_sma_signal(dataframe: pd.DataFrame,
+                   trend_window: int = 200,
+                   exit_window: int = 5,
+                   rsi_window: int = 2,
+                   rsi_threshold: float = 5.0,
+                   start: int = None):
     """
     Generate a trading signal based on the following conditions:
-    - Buy when the stock is above its 200-day moving average AND the 2-period RSI is below 5.
-    - Exit when the stock closes above its 5-period moving average.
+    - Buy when the stock is above its trend_window-day (200) moving average AND the rsi_window-period (2)
+      RSI is below rsi_threshold (5).
+    - Exit when the stock closes above its exit_window-period (5) moving average.
 
     Parameters:
         dataframe: pd.DataFrame
             Input data containing price information.
+        trend_window: int
+            Window of the trend moving average the close must be above to buy.
+        exit_window: int
+            Window of the moving average the close must cross above to exit.
+        rsi_window: int
+            Window size for RSI calculation.
+        rsi_threshold: float
+            RSI value below which to buy.
+        start: int
+            First bar evaluated, trend_window by default.
 
     Returns:
         pd.DataFrame
             DataFrame with buy/sell/hold signals and quantities based on conditions.
     """
     # Compute moving averages
-    dataframe = SMA(dataframe, window=200, columns=['Close'])
-    dataframe = SMA(dataframe, window=5, columns=['Close'])
-
-    # Compute RSI (2-period)
-    dataframe = RSI(dataframe, window=2)
-
-    signals = ["Hold"] * len(dataframe)
-    execute_prices = [None] * len(dataframe)
-    quantities = [0] * len(dataframe)
-    position = 0  # Track whether we are in a trade
-
-    for i in range(200, len(dataframe) - 1):
-        close_price = dataframe['Close'].iloc[i]
-        sma_200 = dataframe[f'SMA_200_Close'].iloc[i]
-        sma_5 = dataframe[f'SMA_5_Close'].iloc[i]
-        rsi_2 = dataframe[f'RSI_2'].iloc[i]
-
-        if position == 0 and close_price > sma_200 and rsi_2 < 5:
-            signals[i] = "Buy"
-            execute_prices[i] = close_price
-            quantities[i] = 1  # Always buy full position
-            position = 1
-        elif position > 0 and close_price > sma_5:
-            signals[i] = "Sell"
-            execute_prices[i] = close_price
-            quantities[i] = -1  # Always sell full position
-            position = 0
-        else:
-            signals[i] = "Hold"
-            execute_prices[i] = None
-            quantities[i] = 0
+    dataframe = SMA(dataframe, window=trend_window, columns=['Close'])
+    dataframe = SMA(dataframe, window=exit_window, columns=['Close'])
+
+    # Compute RSI
+    dataframe = RSI(dataframe, window=rsi_window)
+
+    close = dataframe['Close'].to_numpy(dtype=float)
+    signals, execute_prices, quantities = run_state_machine(len(dataframe), _rsi_sma_spec(
+        close, dataframe[f'SMA_{trend_window}_Close'].to_numpy(), dataframe[f'SMA_{exit_window}_Close'].to_numpy(),
+        dataframe[f'RSI_{rsi_window}'].to_numpy(), rsi_threshold, trend_window if start is None else start))
 
     dataframe['Signal'] = signals
     dataframe['Execute'] = execute_prices
     dataframe['Quantity'] = quantities
 
-    return dataframe
\ No newline at end of file
+    return dataframe
+
+
+def rsi_sma_signal_panel(panel,
+                         trend_window: int = 200,
+                         exit_window: int = 5,
+                         rsi_window: int = 2,
+                         rsi_threshold: float = 5.0,
+                         start: int = None,
+                         evaluate_last_bar: bool = False):
+    """
+    rsi_sma_signal for every symbol of a panel: the indicators of all the symbols are computed in one
+    vectorised call, then the state machine runs once per symbol. start counts from the first bar of each symbol,
+    so a symbol listed late gets the signals of rsi_sma_signal on its own rows.
+
+    Parameters:
+        panel: pd.DataFrame | dict[str, np.ndarray]
+            (field, symbol) or (symbol, field) panel, or (T x N) arrays keyed by field (see engine.py).
+        trend_window, exit_window, rsi_window, rsi_threshold, start:
+            As rsi_sma_signal.
+        evaluate_last_bar: bool
+            Also evaluate the last bar, which rsi_sma_signal leaves on Hold (screening the latest close).
+
+    Returns:
+        dict[str, np.ndarray]
+            (T x N) 'Signal', 'Execute' and 'Quantity' arrays.
+    """
+    close = IndicatorEngine(panel).array('Close')
+    trend_sma = SMA(panel, window=trend_window, columns=['Close'], output='arrays')[f'SMA_{trend_window}_Close']
+    exit_sma = SMA(panel, window=exit_window, columns=['Close'], output='arrays')[f'SMA_{exit_window}_Close']
+    rsi = RSI(panel, window=rsi_window, output='arrays')[f'RSI_{rsi_window}']
+    first = np.argmax(~np.isnan(close), axis=0)
+
+    outputs = {"Signal": np.empty(close.shape, dtype=np.int8), "Execute": np.empty(close.shape),
+               "Quantity": np.empty(close.shape)}
+    length = len(close)
+    for j in range(close.shape[1]):
+        columns = run_state_machine(length, _rsi_sma_spec(
+            close[:, j], trend_sma[:, j], exit_sma[:, j], rsi[:, j], rsi_threshold,
+            first[j] + (trend_window if start is None else start), length if evaluate_last_bar else length - 1))
+        for name, values in zip(outputs, columns):
+            outputs[name][:, j] = values
+    return outputs
+
+
+def _trade_scores(signals, execute_prices):
+    """
+    Number of round trips, compounded return and share of winning round trips of a long-only signal.
+    A trade still open on the last bar is not counted.
+    """
+    entries = execute_prices[signals == BUY]
+    exits = execute_prices[signals == SELL]
+    returns = exits / entries[:len(exits)] - 1
+    return {"Trades": len(returns),
+            "Total_Return": np.prod(1 + returns) - 1,
+            "Hit_Rate": np.mean(returns > 0) if len(returns) else np.nan}
+
+
+def rsi_sma_signal_grid(dataframe: pd.DataFrame,
+                        trend_windows: list = (200,),
+                        exit_windows: list = (5,),
+                        rsi_windows: list = (2,),
+                        rsi_thresholds: list = (5.0,)):
+    """
+    Score rsi_sma_signal on every combination of the parameter grids without modifying dataframe.
+    The moving averages of all windows are computed in one pass and every RSI window once, then each
+    combination only builds its entry/exit masks and runs the state machine.
+
+    Parameters:
+        dataframe: pd.DataFrame
+            Input data containing price information.
+        trend_windows: list[int]
+            Windows of the trend moving average.
+        exit_windows: list[int]
+            Windows of the exit moving average.
+        rsi_windows: list[int]
+            Window sizes for RSI calculation.
+        rsi_thresholds: list[float]
+            RSI values below which to buy.
+
+    Returns:
+        pd.DataFrame
+            One row per (trend_window, exit_window, rsi_window, rsi_threshold) with the number of round trips
+            'Trades', their compounded 'Total_Return' and the share of winning ones 'Hit_Rate'.
+    """
+    close = dataframe['Close'].to_numpy(dtype=float)
+    windows = sorted(set(trend_windows) | set(exit_windows))
+    sma = dict(zip(windows, SMA_windows(dataframe, windows).T))
+    rsi = {window: RSI(dataframe, window=window, output='arrays')[f'RSI_{window}'] for window in set(rsi_windows)}
+
+    grid = list(itertools.product(trend_windows, exit_windows, rsi_windows, rsi_thresholds))
+    scores = []
+    for trend_window, exit_window, rsi_window, rsi_threshold in grid:
+        signals, execute_prices, _ = run_state_machine(len(close), _rsi_sma_spec(
+            close, sma[trend_window], sma[exit_window], rsi[rsi_window], rsi_threshold, trend_window))
+        scores.append(_trade_scores(signals, execute_prices))
+
+    index = pd.MultiIndex.from_tuples(grid, names=['trend_window', 'exit_window', 'rsi_window', 'rsi_threshold'])
+    return pd.DataFrame(scores, index=index)
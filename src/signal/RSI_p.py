@@ -5,7 +5,63 @@ Custom signal: RSI signal, BB entry, RSI exit
 import pandas as pd
 import numpy as np
 from src.technicalanalysis.technicalanalysis import RSI, SMA, EMA, Bollinger_Bands
-from src.technicalanalysis.target import inverse_RSI, inverse_Bollinger_Bands
+from src.technicalanalysis.target import inverse_RSI_series, inverse_Bollinger_Bands_series
+from src.technicalanalysis.order_statistics import rolling_quantiles
+from src.signal.state_machine import run_state_machine
+
+
+def RSI_quantile_bands(dataframe: pd.DataFrame,
+                       window: int = 14,
+                       dist_window: int = 100,
+                       alphas: list = (0.2,)):
+    """
+    Lower (alpha/2) and upper (1 - alpha/2) quantiles of the previous dist_window RSI values, for every bar.
+    All the quantiles of all the alphas are read off one incremental sorted window, so a sweep over alpha
+    costs a single pass. NaN RSI values (warm-up) are left out of the window, as with dropna.
+
+    Parameters:
+        dataframe: pd.DataFrame
+            Input data containing price information, or already holding the RSI_{window} column.
+        window: int
+            Window size for RSI calculation.
+        dist_window: int
+            Window size for RSI quantile calculation.
+        alphas: list[float]
+            Quantiles, between 0 and 1.
+
+    Returns:
+        pd.DataFrame
+            ('RSI_q_low', alpha) and ('RSI_q_high', alpha) columns, aligned on the index of dataframe,
+            with the window and dist_window they were built with in attrs.
+    """
+    rsi_column = f'RSI_{window}'
+    if rsi_column in dataframe.columns:
+        rsi = dataframe[rsi_column]
+    else:
+        rsi = RSI(dataframe, window=window, output='frame')[rsi_column]
+
+    quantiles = [alpha / 2 for alpha in alphas] + [1 - alpha / 2 for alpha in alphas]
+    bands = rolling_quantiles(rsi.to_numpy(dtype=float), dist_window, quantiles, closed="left")
+    columns = pd.MultiIndex.from_product([['RSI_q_low', 'RSI_q_high'], list(alphas)])
+
+    bands = pd.DataFrame(bands, index=dataframe.index, columns=columns)
+    bands.attrs.update(window=window, dist_window=dist_window)
+    return bands
+
+
+def _check_quantile_bands(quantile_bands: pd.DataFrame, index: pd.Index, alpha: float, window: int, dist_window: int):
+    """
+    Raise a ValueError unless quantile_bands is the RSI_quantile_bands output for this series and these parameters.
+    """
+    if not quantile_bands.index.equals(index):
+        raise ValueError("quantile_bands is not aligned on the index of dataframe")
+    missing = [key for key in [('RSI_q_low', alpha), ('RSI_q_high', alpha)] if key not in quantile_bands.columns]
+    if missing:
+        raise ValueError(f"quantile_bands has no {missing} columns, build it with alpha={alpha} in alphas")
+    for name, value in (("window", window), ("dist_window", dist_window)):
+        if quantile_bands.attrs.get(name, value) != value:
+            raise ValueError(f"quantile_bands was built with {name}={quantile_bands.attrs[name]}, expected {value}")
+
 
 def RSI_distrib(dataframe: pd.DataFrame,
                 alpha: float = 0.2,
@@ -14,7 +70,8 @@ def RSI_distrib(dataframe: pd.DataFrame,
                 lag: int = 1,
                 rsi_exit_up: float = 65.0,
                 rsi_exit_down: float = 35.0,
-                bb_target_std: float=2.0):
+                bb_target_std: float=2.0,
+                quantile_bands: pd.DataFrame = None):
     """
     Generate RSI distribution based on the given thresholds and integrate Bollinger Bands and inverse RSI.
 
@@ -33,7 +90,9 @@ def RSI_distrib(dataframe: pd.DataFrame,
             RSI value spread at which to clear the position for sold shares.
         rsi_exit_down: float
             RSI value spread at which to clear the position for bought shares.
-
+        quantile_bands: pd.DataFrame
+            Output of RSI_quantile_bands holding alpha, to share one sweep between several alphas. It must be
+            aligned on dataframe and built with the same window and dist_window, else a ValueError is raised.
 
     Returns:
         pd.DataFrame
@@ -44,59 +103,34 @@ def RSI_distrib(dataframe: pd.DataFrame,
     # Calculate Bollinger Bands
     dataframe = Bollinger_Bands(dataframe, window=window)
 
-    signals = ["Hold"] * (dist_window + lag)
-    execute_prices = [None] * (dist_window + lag)
-    quantities = [0] * (dist_window + lag)
-    position = 0
-    next_quantity = 0.1  # Start with 10% of portfolio
-
-    for i in range(dist_window + lag, len(dataframe) - 1):
-
-        # Calculate quantiles
-        quantile_down = min(np.quantile(dataframe[f'RSI_{window}'].iloc[i-dist_window:i].dropna(), alpha / 2), 30)
-        quantile_up = max(np.quantile(dataframe[f'RSI_{window}'].iloc[i-dist_window:i].dropna(), 1 - alpha / 2), 70)
-
-        current_rsi = dataframe[f'RSI_{window}'].iloc[i]
-
-        # Check for exit condition using inverse RSI
-        if position > 0:  # Long position
-            exit_price = inverse_RSI(dataframe.iloc[:i+1], window=window, target_rsi=rsi_exit_down)
-            signals.append("Sell")
-            execute_prices.append(exit_price)
-            quantities.append(position)
-            position = 0
-            next_quantity = 0.1
-        elif position < 0:  # Short position
-            exit_price = inverse_RSI(dataframe.iloc[:i+1], window=window, target_rsi=rsi_exit_up)
-            signals.append("Buy")
-            execute_prices.append(exit_price)
-            quantities.append(-position)
-            position = 0
-            next_quantity = 0.1
-        else:
-            # Entry signals using Bollinger Bands
-            if current_rsi < quantile_down:
-                entry_price = inverse_Bollinger_Bands(dataframe.iloc[:i+1], window=window, target_band='lower', target_std=bb_target_std)
-                signals.append("Buy")
-                execute_prices.append(entry_price)
-                quantities.append(next_quantity)
-                position += next_quantity
-                next_quantity = 0.3 if next_quantity == 0.1 else 0.1
-            elif current_rsi > quantile_up:
-                entry_price = inverse_Bollinger_Bands(dataframe.iloc[:i+1], window=window, target_band='upper', target_std=bb_target_std)
-                signals.append("Sell")
-                execute_prices.append(entry_price)
-                quantities.append(next_quantity)
-                position -= next_quantity
-                next_quantity = 0.3 if next_quantity == 0.1 else 0.1
-            else:
-                signals.append("Hold")
-                execute_prices.append(None)
-                quantities.append(0)
-
-    signals = signals + ["Hold"]
-    execute_prices = execute_prices + [None]
-    quantities = quantities + [0]
+    # Quantiles of the previous dist_window RSI values, one sorted window for the whole series
+    if quantile_bands is None:
+        quantile_bands = RSI_quantile_bands(dataframe, window=window, dist_window=dist_window, alphas=[alpha])
+    else:
+        _check_quantile_bands(quantile_bands, dataframe.index, alpha, window, dist_window)
+    dataframe['RSI_q_low'] = quantile_bands[('RSI_q_low', alpha)]
+    dataframe['RSI_q_high'] = quantile_bands[('RSI_q_high', alpha)]
+    rsi = dataframe[f'RSI_{window}'].to_numpy()
+    q_low = dataframe['RSI_q_low'].to_numpy()
+    q_high = dataframe['RSI_q_high'].to_numpy()
+    # Exit and entry prices of every bar, computed once over the whole history
+    exit_long = inverse_RSI_series(dataframe, window=window, target_rsi=rsi_exit_down).to_numpy()
+    exit_short = inverse_RSI_series(dataframe, window=window, target_rsi=rsi_exit_up).to_numpy()
+    entry_long = inverse_Bollinger_Bands_series(dataframe, window=window, target_band='lower', target_std=bb_target_std).to_numpy()
+    entry_short = inverse_Bollinger_Bands_series(dataframe, window=window, target_band='upper', target_std=bb_target_std).to_numpy()
+
+    # Flat: buy when the RSI falls below its lower quantile band, at the lower Bollinger Band, sell above
+    # the upper quantile band at the upper Bollinger Band, sizes alternating 10% / 30% of the portfolio.
+    # In a trade: exit on the next bar at the inverse RSI price.
+    every_bar = np.ones(len(dataframe), dtype=bool)
+    signals, execute_prices, quantities = run_state_machine(len(dataframe), {
+        "start": dist_window + lag, "stop": len(dataframe) - 1,
+        "long_entry": rsi < np.minimum(q_low, 30), "long_entry_price": entry_long,
+        "short_entry": rsi > np.maximum(q_high, 70), "short_entry_price": entry_short,
+        "long_exit": every_bar, "long_exit_price": exit_long,
+        "short_exit": every_bar, "short_exit_price": exit_short,
+        "sizes": (0.1, 0.3),
+    })
 
     # Add signals and quantities to the dataframe
     dataframe['Signal'] = signals
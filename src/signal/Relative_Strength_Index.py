@@ -2,8 +2,10 @@
 https://trendspider.com/learning-center/rsi-trading-strategies/
 """
 
+import numpy as np
 import pandas as pd
 from src.technicalanalysis.technicalanalysis import RSI, SMA, EMA
+from src.signal.encoding import BUY, SELL, HOLD
 
 
 def rsi_signal(
@@ -59,16 +61,16 @@ def rsi_signal(
 
         # Bullish divergence: price lower lows, RSI higher lows
         if curr_price < prev_price and curr_rsi > prev_rsi and curr_rsi < rsi_buy_threshold:
-            signals.append("Buy")
+            signals.append(BUY)
         # Bearish divergence: price higher highs, RSI lower highs
         elif curr_price > prev_price and curr_rsi < prev_rsi and curr_rsi > rsi_sell_threshold:
-            signals.append("Sell")
+            signals.append(SELL)
         else:
-            signals.append("Hold")
+            signals.append(HOLD)
 
     # Align signals with the DataFrame
-    signals.insert(0, "Hold")  # First entry has no divergence
-    dataframe['Signal'] = signals
+    signals.insert(0, HOLD)  # First entry has no divergence
+    dataframe['Signal'] = np.array(signals, dtype=np.int8)
 
     return dataframe
 
@@ -3,32 +3,64 @@
 """
 
 
-from src.technicalanalysis.technicalanalysis import volume_moving_average
+from src.technicalanalysis.technicalanalysis import volume_moving_average, SMA_windows
+from src.signal.encoding import signal_codes
+import numpy as np
 import pandas as pd
 
 
+def _divergence_codes(close, volume_ma):
+    """
+    Sell where the price rises while the volume average falls, Buy on the opposite, Hold elsewhere,
+    for (T) or (T x W) volume averages. NaN changes (first row, warm-up) compare False and stay on Hold.
+    """
+    price_change = np.full(close.shape, np.nan)
+    price_change[1:] = close[1:] - close[:-1]
+    volume_change = np.full(volume_ma.shape, np.nan)
+    volume_change[1:] = volume_ma[1:] - volume_ma[:-1]
+    if volume_ma.ndim == 2:
+        price_change = price_change[:, None]
+    return signal_codes((price_change < 0) & (volume_change > 0), (price_change > 0) & (volume_change < 0))
+
+
 def price_volume_divergence_signal(dataframe: pd.DataFrame, window: int = 14):
+    """
+    Sell when the close rises while the volume moving average falls, Buy when the close falls
+    while the volume moving average rises.
+
+    Parameters:
+        dataframe: pd.DataFrame
+            Input data with Close and Volume.
+        window: int
+            Window of the volume moving average.
+
+    Returns:
+        pd.DataFrame
+            dataframe with the Volume_MA and Signal columns.
+    """
     dataframe = volume_moving_average(dataframe, window)
-    signals = []
+    dataframe['Signal'] = _divergence_codes(dataframe['Close'].to_numpy(dtype=float),
+                                            dataframe['Volume_MA'].to_numpy(dtype=float))
+    return dataframe
 
-    for i in range(1, len(dataframe)):
-        price_change = dataframe['Close'].iloc[i] - dataframe['Close'].iloc[i - 1]
-        volume_change = dataframe['Volume_MA'].iloc[i] - dataframe['Volume_MA'].iloc[i - 1]
 
-        if price_change > 0 and volume_change < 0:
-            signals.append("Sell")
-        elif price_change < 0 and volume_change > 0:
-            signals.append("Buy")
-        else:
-            signals.append("Hold")
+def price_volume_divergence_signals(dataframe: pd.DataFrame, windows: list):
+    """
+    price_volume_divergence_signal for several windows at once, without adding columns to dataframe.
+    The volume averages of all the windows are taken from one cumulative sum of the volume.
 
-    signals.insert(0, "Hold")
-    dataframe['Signal'] = signals
-    return dataframe
+    Parameters:
+        dataframe: pd.DataFrame
+            Input data with Close and Volume.
+        windows: list[int]
+            Windows of the volume moving average.
 
-    signals.insert(0, "Hold")  # Align with DataFrame index
-    dataframe['Signal'] = signals
-    return dataframe
+    Returns:
+        pd.DataFrame
+            BUY/SELL/HOLD codes, one column per window, aligned on the index of dataframe.
+    """
+    codes = _divergence_codes(dataframe['Close'].to_numpy(dtype=float), SMA_windows(dataframe, windows, column='Volume'))
+    return pd.DataFrame(codes, index=dataframe.index, columns=list(windows))
 
 
 if __name__ == "__main__":
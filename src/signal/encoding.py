@@ -0,0 +1,61 @@
+"""
+Compact schema of the columns written by the signal functions
+
+    Signal   int8     BUY (1), SELL (-1) or HOLD (0)
+    Execute  float64  limit price of the order, NaN when there is no order
+    Quantity float64  size of the order
+
+The codes carry the direction of the trade, so a backtest can compare whole
+columns at once instead of testing strings row by row.
+"""
+import numpy as np
+import pandas as pd
+
+BUY = np.int8(1)
+SELL = np.int8(-1)
+HOLD = np.int8(0)
+
+SIGNAL_CODES = {"Buy": BUY, "Sell": SELL, "Hold": HOLD}
+SIGNAL_LABELS = np.array(["Sell", "Hold", "Buy"])
+
+
+def signal_codes(buy, sell):
+    """
+    Signal column from two boolean masks, buy taking precedence over sell.
+
+    buy np.ndarray[bool]: rows with a buy signal
+    sell np.ndarray[bool]: rows with a sell signal
+    returns np.ndarray[int8]
+    """
+    return np.where(buy, BUY, np.where(sell, SELL, HOLD)).astype(np.int8)
+
+
+def signal_labels(signal):
+    """
+    "Buy"/"Sell"/"Hold" strings of a Signal column, for display.
+    """
+    return SIGNAL_LABELS[np.asarray(signal, dtype=np.int64) + 1]
+
+
+def encode_signals(dataframe: pd.DataFrame):
+    """
+    Convert the Signal, Execute and Quantity columns of dataframe to the compact schema, in place.
+    Columns already in the schema are left as they are; "Buy"/"Sell"/"Hold" strings and None prices are converted.
+
+    dataframe pd.DataFrame: output of a signal function
+    returns pd.DataFrame: dataframe
+    """
+    signal = dataframe['Signal']
+    if signal.dtype != np.int8:
+        if pd.api.types.is_numeric_dtype(signal):
+            codes = signal.to_numpy()
+        else:
+            codes = signal.map(SIGNAL_CODES).to_numpy()
+        if pd.isna(codes).any() or not np.isin(codes, (BUY, SELL, HOLD)).all():
+            raise ValueError("Signal must hold 'Buy', 'Sell' or 'Hold' or their codes BUY, SELL and HOLD")
+        dataframe['Signal'] = codes.astype(np.int8)
+    if 'Execute' in dataframe.columns and dataframe['Execute'].dtype != np.float64:
+        dataframe['Execute'] = pd.to_numeric(dataframe['Execute']).astype(np.float64)
+    if 'Quantity' in dataframe.columns and dataframe['Quantity'].dtype != np.float64:
+        dataframe['Quantity'] = dataframe['Quantity'].astype(np.float64)
+    return dataframe
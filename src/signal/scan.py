@@ -0,0 +1,105 @@
+"""
+Scan a universe of symbols for the bars where a signal triggers
+
+The bars come as one panel (see src/technicalanalysis/engine.py): a frame with
+(field, symbol) or (symbol, field) MultiIndex columns, or a dict of per-symbol
+frames as returned by yfinanceGetter.history. The symbols are cut into chunks;
+signals with a panel implementation (PANEL_SIGNALS) compute each chunk in one
+vectorised call, the others run symbol by symbol. Chunks can be spread over
+worker processes. Only the triggered (bar, symbol) pairs are returned.
+
+Example:
+    entries = scan(panel, rsi_sma_signal, lookback=1, trend_window=200)
+    entries[entries['Signal'] == BUY]
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from src.technicalanalysis.engine import FIELDS, to_panel
+from src.signal.encoding import HOLD
+from src.signal.Moving_Average_Crossover import ma_crossover_signal, ma_crossover_signal_panel
+from src.signal.RSI_Two_Periods import rsi_sma_signal, rsi_sma_signal_panel
+
+# signal function -> function(panel, **params) returning its (T x N) Signal (Execute, Quantity) arrays.
+# A scan looks at the latest close, so the state machine signals evaluate the last bar too.
+PANEL_SIGNALS = {
+    ma_crossover_signal: ma_crossover_signal_panel,
+    rsi_sma_signal: partial(rsi_sma_signal_panel, evaluate_last_bar=True),
+}
+
+OUTPUT_COLUMNS = ("Signal", "Execute", "Quantity")
+
+
+def _as_panel(panel):
+    """
+    (field, symbol) panel of a dict of frames or of a panel in either orientation.
+    """
+    if isinstance(panel, dict):
+        return to_panel(panel)
+    if not set(panel.columns.get_level_values(0)) & set(FIELDS):
+        panel = panel.swaplevel(axis=1)
+    return panel
+
+
+def _triggers(index, symbols, outputs: dict, first_row: int):
+    """
+    Rows of the (T x N) outputs from first_row on where Signal is not Hold, indexed by (bar, symbol).
+    """
+    rows, cols = np.nonzero(outputs["Signal"][first_row:] != HOLD)
+    rows += first_row
+    return pd.DataFrame({name: values[rows, cols] for name, values in outputs.items()},
+                        index=pd.MultiIndex.from_arrays([index[rows], symbols[cols]]))
+
+
+def _scan_chunk(signal_function, panel: pd.DataFrame, lookback: int, params: dict):
+    """
+    Triggered bars of the symbols of one (field, symbol) panel.
+    """
+    symbols = panel.columns.get_level_values(1).unique()
+    first_row = 0 if lookback is None else max(len(panel) - lookback, 0)
+    if signal_function in PANEL_SIGNALS:
+        return _triggers(panel.index, symbols, PANEL_SIGNALS[signal_function](panel, **params), first_row)
+
+    triggered = []
+    for symbol in symbols:
+        dataframe = panel.xs(symbol, axis=1, level=1).dropna(how='all')
+        dataframe = signal_function(dataframe.copy(), **params)
+        latest = np.flatnonzero(dataframe.index.isin(panel.index[first_row:]))
+        outputs = {name: dataframe[name].to_numpy()[:, None] for name in OUTPUT_COLUMNS if name in dataframe}
+        triggered.append(_triggers(dataframe.index, pd.Index([symbol]), outputs,
+                                   latest[0] if len(latest) else len(dataframe)))
+    return pd.concat(triggered) if triggered else None
+
+
+def scan(panel, signal_function, lookback: int = 1, chunk_size: int = 500, processes: int = 1, **params):
+    """
+    Evaluate signal_function on every symbol of panel and return the bars where it triggers.
+
+    panel pd.DataFrame | dict[str, pd.DataFrame]: bars of N symbols
+    signal_function: batch signal function, run as a panel kernel when it is a key of PANEL_SIGNALS
+    lookback int: only report the triggers of the last lookback bars, None for the whole history
+    chunk_size int: symbols evaluated together
+    processes int: worker processes the chunks are spread over, 1 runs in this process
+    params: arguments of signal_function
+    returns pd.DataFrame: Signal (Execute, Quantity) of the triggered bars, indexed by (bar, symbol)
+    """
+    panel = _as_panel(panel)
+    symbols = panel.columns.get_level_values(1).unique()
+    chunks = [panel.loc[:, pd.IndexSlice[:, symbols[i:i + chunk_size]]] for i in range(0, len(symbols), chunk_size)]
+
+    if processes is None or processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(partial(_scan_chunk, signal_function, lookback=lookback, params=params), chunks))
+    else:
+        results = [_scan_chunk(signal_function, chunk, lookback, params) for chunk in chunks]
+
+    results = [result for result in results if result is not None]
+    if not results:
+        return pd.DataFrame({"Signal": pd.Series(dtype=np.int8)},
+                            index=pd.MultiIndex.from_arrays([[], []], names=[panel.index.name, "Symbol"]))
+    triggered = pd.concat(results).sort_index()
+    triggered.index.names = [panel.index.name, "Symbol"]
+    return triggered
@@ -0,0 +1,143 @@
+"""
+Compiled runner for path-dependent signal logic
+
+Strategies whose orders depend on the current position (enter when flat, exit
+when in a trade, alternate order sizes, ...) are written as a spec of
+precomputed arrays: entry/exit conditions and the prices to execute at. The
+runner walks the bars once with a flat/long/short state and emits the Signal,
+Execute and Quantity arrays of src/signal/encoding.py. The loop is compiled with
+Numba when it is installed (see src/technicalanalysis/kernels.py).
+PositionState is the same machine advanced one bar at a time, for live feeds.
+
+Example:
+    signals, execute, quantities = run_state_machine(len(df), {
+        "start": 200, "stop": len(df) - 1,
+        "long_entry": (close > sma_200) & (rsi_2 < 5), "long_entry_price": close,
+        "long_exit": close > sma_5, "long_exit_price": close,
+    })
+"""
+import numpy as np
+
+from src.technicalanalysis import kernels
+from src.signal.encoding import BUY, SELL, HOLD
+
+SPEC_KEYS = ("start", "stop", "long_entry", "short_entry", "long_exit", "short_exit",
+             "long_entry_price", "short_entry_price", "long_exit_price", "short_exit_price",
+             "sizes", "signed_exit")
+
+
+@kernels.jit
+def _state_machine_loop(start, stop, long_entry, short_entry, long_exit, short_exit,
+                        long_entry_price, short_entry_price, long_exit_price, short_exit_price,
+                        sizes, signed_exit, signals, execute, quantities):
+    position = 0.
+    size = 0
+    for i in range(start, stop):
+        if position > 0:
+            if long_exit[i]:
+                signals[i] = SELL
+                execute[i] = long_exit_price[i]
+                quantities[i] = -position if signed_exit else position
+                position = 0.
+                size = 0
+        elif position < 0:
+            if short_exit[i]:
+                signals[i] = BUY
+                execute[i] = short_exit_price[i]
+                quantities[i] = position if signed_exit else -position
+                position = 0.
+                size = 0
+        elif long_entry[i]:
+            signals[i] = BUY
+            execute[i] = long_entry_price[i]
+            quantities[i] = sizes[size]
+            position += sizes[size]
+            size = (size + 1) % len(sizes)
+        elif short_entry[i]:
+            signals[i] = SELL
+            execute[i] = short_entry_price[i]
+            quantities[i] = sizes[size]
+            position -= sizes[size]
+            size = (size + 1) % len(sizes)
+
+
+def run_state_machine(length: int, spec: dict):
+    """
+    Run a flat/long/short state machine over length bars.
+
+    When flat, a long_entry buys sizes[k] at long_entry_price, otherwise a short_entry sells sizes[k]
+    at short_entry_price, k cycling through sizes. When long (short), a long_exit (short_exit) closes
+    the whole position at long_exit_price (short_exit_price) and resets k. One order at most per bar.
+
+    length int: number of bars
+    spec dict:
+        start int, stop int: bars start..stop-1 are evaluated, the others are Hold (default 0, length)
+        long_entry, short_entry, long_exit, short_exit np.ndarray[bool]: conditions per bar (default never)
+        long_entry_price, ... np.ndarray[float]: execute price per bar (default NaN)
+        sizes tuple[float]: order sizes of successive entries (default (1.0,))
+        signed_exit bool: record exit quantities with the sign of the order (-1 to sell) rather than positive
+    returns (np.ndarray[int8], np.ndarray[float64], np.ndarray[float64]): Signal, Execute and Quantity
+    """
+    unknown = set(spec) - set(SPEC_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown state machine spec keys {sorted(unknown)}, expected some of {SPEC_KEYS}")
+
+    def condition(key):
+        values = spec.get(key)
+        return np.zeros(length, dtype=np.bool_) if values is None else np.ascontiguousarray(values, dtype=np.bool_)
+
+    def price(key):
+        values = spec.get(key)
+        return np.full(length, np.nan) if values is None else np.ascontiguousarray(values, dtype=np.float64)
+
+    signals = np.full(length, HOLD, dtype=np.int8)
+    execute = np.full(length, np.nan)
+    quantities = np.zeros(length)
+    loop = _state_machine_loop if kernels.backend == "numba" else getattr(_state_machine_loop, "py_func",
+                                                                            _state_machine_loop)
+    loop(int(spec.get("start", 0)), int(spec.get("stop", length)),
+         condition("long_entry"), condition("short_entry"), condition("long_exit"), condition("short_exit"),
+         price("long_entry_price"), price("short_entry_price"), price("long_exit_price"), price("short_exit_price"),
+         np.asarray(spec.get("sizes", (1.0,)), dtype=np.float64), bool(spec.get("signed_exit", False)),
+         signals, execute, quantities)
+    return signals, execute, quantities
+
+
+class PositionState:
+    """
+    The state machine of run_state_machine advanced one bar at a time: update takes the conditions and
+    prices of the bar (a falsy condition or a missing price when not given) and returns its order.
+
+    sizes tuple[float]: order sizes of successive entries
+    signed_exit bool: record exit quantities with the sign of the order
+    """
+
+    def __init__(self, sizes: tuple = (1.0,), signed_exit: bool = False):
+        self.sizes = tuple(float(size) for size in sizes)
+        self.signed_exit = signed_exit
+        self.position = 0.
+        self._size = 0
+
+    def update(self, long_entry=False, short_entry=False, long_exit=False, short_exit=False,
+               long_entry_price=np.nan, short_entry_price=np.nan, long_exit_price=np.nan, short_exit_price=np.nan):
+        """
+        returns (np.int8, np.float64, np.float64): Signal, Execute and Quantity of the bar
+        """
+        position = self.position
+        if position > 0:
+            if long_exit:
+                self.position, self._size = 0., 0
+                return SELL, np.float64(long_exit_price), np.float64(-position if self.signed_exit else position)
+        elif position < 0:
+            if short_exit:
+                self.position, self._size = 0., 0
+                return BUY, np.float64(short_exit_price), np.float64(position if self.signed_exit else -position)
+        elif long_entry or short_entry:
+            size = self.sizes[self._size]
+            self._size = (self._size + 1) % len(self.sizes)
+            if long_entry:
+                self.position = position + size
+                return BUY, np.float64(long_entry_price), np.float64(size)
+            self.position = position - size
+            return SELL, np.float64(short_entry_price), np.float64(size)
+        return HOLD, np.float64(np.nan), np.float64(0.)
@@ -0,0 +1,130 @@
+"""
+Declarative strategies and a planner computing their indicators once
+
+A strategy is a dict naming its signal function, the parameters to call it
+with and the indicator specs (as in src/technicalanalysis/engine.py) it reads:
+
+    {"signal": rsi_sma_signal,
+     "params": {"trend_window": 200, "exit_window": 5},
+     "indicators": [{"indicator": "SMA", "window": 200, "columns": ["Close"]},
+                    {"indicator": "SMA", "window": 5, "columns": ["Close"]},
+                    {"indicator": "RSI", "window": 2}]}
+
+strategy() builds it for the signals of this package. plan_strategies merges the
+indicators of all the strategies into one graph: equal specs become one node,
+and a spec reading a column written by another one (an SMA of RSI_14) depends
+on it. The nodes are grouped in stages whose inputs are all available, each
+stage runs through one IndicatorEngine so that they also share their
+intermediates. run_strategies then calls every signal function with those
+outputs already computed.
+
+Example:
+    results = run_strategies(df, {"rsi_sma": strategy(rsi_sma_signal),
+                                  "rsi": strategy(rsi_signal, window=2)})
+"""
+import inspect
+
+import pandas as pd
+
+from src.technicalanalysis.engine import IndicatorEngine, FIELDS, normalise_spec, output_names
+from src.technicalanalysis.technicalanalysis import shared_indicators, indicator_key
+from src.signal.Moving_Average_Crossover import ma_crossover_signal
+from src.signal.Relative_Strength_Index import rsi_signal
+from src.signal.Volume_Price_divergence import price_volume_divergence_signal
+from src.signal.RSI_Two_Periods import rsi_sma_signal
+from src.signal.RSI_p import RSI_distrib
+
+
+def _moving_average(ma_type: str, window: int, columns: list):
+    return [{"indicator": ma_type, "window": window, "columns": list(columns)}] if ma_type in ("SMA", "EMA") else []
+
+
+# indicators read by the signal functions of this package, from their full parameters
+SIGNAL_INDICATORS = {
+    ma_crossover_signal: lambda p: (
+        _moving_average(p["base_line_ma_type"], p["base_line_window"], p["base_line_column"])
+        + _moving_average(p["signal_line_ma_type"], p["signal_line_window"], p["signal_line_column"])),
+    rsi_signal: lambda p: (
+        [{"indicator": "RSI", "window": p["window"]}]
+        + _moving_average(p["rsi_signal_line_ma"], p["rsi_signal_line_window"], [f"RSI_{p['window']}"])),
+    price_volume_divergence_signal: lambda p: [{"indicator": "volume_moving_average", "window": p["window"]}],
+    rsi_sma_signal: lambda p: [{"indicator": "SMA", "window": p["trend_window"], "columns": ["Close"]},
+                               {"indicator": "SMA", "window": p["exit_window"], "columns": ["Close"]},
+                               {"indicator": "RSI", "window": p["rsi_window"]}],
+    RSI_distrib: lambda p: [{"indicator": "RSI", "window": p["window"]},
+                            {"indicator": "Bollinger_Bands", "window": p["window"]}],
+}
+
+
+def strategy(signal_function, **params):
+    """
+    Strategy spec of one of the signal functions of this package, its parameters completed with their defaults.
+
+    signal_function: key of SIGNAL_INDICATORS
+    params: arguments of signal_function other than dataframe
+    returns dict: {"signal", "params", "indicators"}
+    """
+    if signal_function not in SIGNAL_INDICATORS:
+        raise ValueError(f"No indicators declared for {signal_function.__name__}, "
+                         f"write its strategy dict with an 'indicators' list")
+    bound = inspect.signature(signal_function).bind(None, **params)
+    bound.apply_defaults()
+    params = dict(list(bound.arguments.items())[1:])
+    return {"signal": signal_function, "params": params, "indicators": SIGNAL_INDICATORS[signal_function](params)}
+
+
+def plan_strategies(strategies: dict, columns: list = FIELDS):
+    """
+    Deduplicate the indicators of all the strategies and order them by dependency.
+
+    strategies dict[str, dict]: strategy specs by name
+    columns list[str]: columns of the data the strategies will run on
+    returns list[list[dict]]: stages of normalised specs; every spec only reads columns of the data
+        or outputs of earlier stages
+    """
+    nodes = {}
+    for spec in (spec for strat in strategies.values() for spec in strat.get("indicators", ())):
+        spec = normalise_spec(spec)
+        nodes.setdefault(repr(sorted(spec.items())), spec)
+
+    available = set(columns)
+    pending = list(nodes.values())
+    stages = []
+    while pending:
+        stage = [spec for spec in pending if available.issuperset(spec.get("columns") or ())]
+        if not stage:
+            missing = sorted({col for spec in pending for col in spec.get("columns") or ()} - available)
+            raise ValueError(f"Columns {missing} are neither in the data nor written by an indicator")
+        stages.append(stage)
+        available.update(name for spec in stage for name in output_names(spec))
+        pending = [spec for spec in pending if not any(spec is done for done in stage)]
+    return stages
+
+
+def run_strategies(dataframe: pd.DataFrame, strategies: dict):
+    """
+    Run several strategies on the same data, computing each indicator they declare once.
+
+    dataframe pd.DataFrame: source of data, left untouched
+    strategies dict[str, dict]: strategy specs by name (see strategy)
+    returns dict[str, pd.DataFrame]: output of the signal function of every strategy
+    """
+    frame = dataframe.copy()
+    outputs = {}
+    for stage in plan_strategies(strategies, frame.columns):
+        engine = IndicatorEngine(frame)
+        for spec in stage:
+            block = engine.block(engine.compute([spec]))
+            key = indicator_key(spec)
+            if key is not None:
+                outputs[key] = block
+            for col in block.columns:
+                frame[col] = block[col]
+
+    # each signal gets a fresh copy of the data, its indicator calls are served from outputs
+    results = {}
+    for name, strat in strategies.items():
+        data = dataframe.copy()
+        with shared_indicators(data, outputs):
+            results[name] = strat["signal"](data, **strat.get("params", {}))
+    return results
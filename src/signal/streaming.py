@@ -0,0 +1,191 @@
+"""
+Streaming counterparts of the signal functions, for live feeds
+
+Each generator consumes an iterable of bars (any mapping holding the OHLCV
+fields of one row: dict, pd.Series, ...) and yields, for every bar, a dict with
+the Signal (and Execute/Quantity) values the batch function writes for that row.
+The indicators run on the streaming objects of src/technicalanalysis/streaming.py
+and the position on state_machine.PositionState. Every bar costs O(1) work,
+except stream_RSI_distrib, whose sorted quantile window costs an O(w) shift per
+bar (see order_statistics.py), and memory stays bounded by the windows, however
+long the session.
+
+The batch functions built on the state machine leave their last row on Hold;
+the streams evaluate every bar as it closes, so bar i yields what the batch
+function writes on row i once the history extends past it. To resume a session,
+feed the history through the generator before the live bars.
+
+Example:
+    for bar, order in zip(feed, stream_rsi_sma_signal(feed)):
+        if order["Signal"] != HOLD:
+            send(order)
+"""
+import numpy as np
+
+from src.technicalanalysis.streaming import StreamingSMA, StreamingEMA, StreamingRSI, StreamingInverseRSI, \
+    StreamingInverseBollingerBands
+from src.technicalanalysis.order_statistics import RollingQuantile
+from src.signal.encoding import BUY, SELL, HOLD
+from src.signal.state_machine import PositionState
+
+NAN = np.float64(np.nan)
+
+
+def _moving_average(ma_type: str, window: int, column: str):
+    if ma_type == "SMA":
+        return StreamingSMA(window=window, column=column)
+    if ma_type == "EMA":
+        return StreamingEMA(window=window, column=column)
+    raise ValueError(f"Unknown moving average type '{ma_type}', expected 'SMA' or 'EMA'")
+
+
+def stream_ma_crossover_signal(bars,
+                               base_line_window: int = 14,
+                               base_line_ma_type: str = "SMA",
+                               base_line_column: list[str] = ["Close"],
+                               signal_line_window: int = 50,
+                               signal_line_ma_type: str = "SMA",
+                               signal_line_column: list[str] = ["Close"]):
+    """
+    Streaming ma_crossover_signal, same parameters.
+
+    Yields:
+        dict
+            {'Signal': BUY/SELL/HOLD} for every bar.
+    """
+    base_line = _moving_average(base_line_ma_type, base_line_window, base_line_column[0])
+    signal_line = _moving_average(signal_line_ma_type, signal_line_window, signal_line_column[0])
+    prev_base = prev_signal = NAN
+    for bar in bars:
+        base, signal = base_line.update(bar), signal_line.update(bar)
+        # comparisons with NaN are False, which keeps the warm-up bars on Hold as crossover_signal
+        if prev_base <= prev_signal and base > signal:
+            code = BUY
+        elif prev_base >= prev_signal and base < signal:
+            code = SELL
+        else:
+            code = HOLD
+        prev_base, prev_signal = base, signal
+        yield {"Signal": code}
+
+
+def stream_rsi_signal(bars,
+                      window: int = 14,
+                      rsi_sell_threshold: float = 70.0,
+                      rsi_buy_threshold: float = 30.0):
+    """
+    Streaming rsi_signal. The smoothed RSI line of the batch function does not enter the signal
+    and is not computed.
+
+    Yields:
+        dict
+            {'Signal': BUY/SELL/HOLD} for every bar.
+    """
+    rsi = StreamingRSI(window=window)
+    prev_price = prev_rsi = NAN
+    for bar in bars:
+        curr_price, curr_rsi = np.float64(bar["Close"]), rsi.update(bar)
+        # Bullish divergence: price lower lows, RSI higher lows
+        if curr_price < prev_price and curr_rsi > prev_rsi and curr_rsi < rsi_buy_threshold:
+            code = BUY
+        # Bearish divergence: price higher highs, RSI lower highs
+        elif curr_price > prev_price and curr_rsi < prev_rsi and curr_rsi > rsi_sell_threshold:
+            code = SELL
+        else:
+            code = HOLD
+        prev_price, prev_rsi = curr_price, curr_rsi
+        yield {"Signal": code}
+
+
+def stream_price_volume_divergence_signal(bars, window: int = 14):
+    """
+    Streaming price_volume_divergence_signal.
+
+    Yields:
+        dict
+            {'Signal': BUY/SELL/HOLD} for every bar.
+    """
+    volume_ma = StreamingSMA(window=window, column="Volume")
+    prev_close = prev_volume_ma = NAN
+    for bar in bars:
+        close, curr_volume_ma = np.float64(bar["Close"]), volume_ma.update(bar)
+        price_change = close - prev_close
+        volume_change = curr_volume_ma - prev_volume_ma
+        if price_change > 0 and volume_change < 0:
+            code = SELL
+        elif price_change < 0 and volume_change > 0:
+            code = BUY
+        else:
+            code = HOLD
+        prev_close, prev_volume_ma = close, curr_volume_ma
+        yield {"Signal": code}
+
+
+def stream_rsi_sma_signal(bars,
+                          trend_window: int = 200,
+                          exit_window: int = 5,
+                          rsi_window: int = 2,
+                          rsi_threshold: float = 5.0,
+                          start: int = None):
+    """
+    Streaming rsi_sma_signal, same parameters.
+
+    Yields:
+        dict
+            {'Signal', 'Execute', 'Quantity'} for every bar.
+    """
+    trend_sma = StreamingSMA(window=trend_window)
+    exit_sma = StreamingSMA(window=exit_window)
+    rsi = StreamingRSI(window=rsi_window)
+    position = PositionState(sizes=(1.0,), signed_exit=True)
+    start = trend_window if start is None else start
+    for i, bar in enumerate(bars):
+        close = np.float64(bar["Close"])
+        trend, exit_, curr_rsi = trend_sma.update(bar), exit_sma.update(bar), rsi.update(bar)
+        if i < start:
+            signal, execute, quantity = HOLD, NAN, np.float64(0.)
+        else:
+            signal, execute, quantity = position.update(
+                long_entry=close > trend and curr_rsi < rsi_threshold, long_entry_price=close,
+                long_exit=close > exit_, long_exit_price=close)
+        yield {"Signal": signal, "Execute": execute, "Quantity": quantity}
+
+
+def stream_RSI_distrib(bars,
+                       alpha: float = 0.2,
+                       window: int = 14,
+                       dist_window: int = 100,
+                       lag: int = 1,
+                       rsi_exit_up: float = 65.0,
+                       rsi_exit_down: float = 35.0,
+                       bb_target_std: float = 2.0):
+    """
+    Streaming RSI_distrib, same parameters. The exit and entry prices are kept by the streaming inverse
+    targets, which match the batch ones up to rounding.
+
+    Yields:
+        dict
+            {'Signal', 'Execute', 'Quantity'} for every bar.
+    """
+    rsi = StreamingRSI(window=window)
+    distribution = RollingQuantile(dist_window)
+    exit_long = StreamingInverseRSI(window=window, target_rsi=rsi_exit_down)
+    exit_short = StreamingInverseRSI(window=window, target_rsi=rsi_exit_up)
+    entry_long = StreamingInverseBollingerBands(window=window, target_band='lower', target_std=bb_target_std)
+    entry_short = StreamingInverseBollingerBands(window=window, target_band='upper', target_std=bb_target_std)
+    position = PositionState(sizes=(0.1, 0.3))
+    for i, bar in enumerate(bars):
+        curr_rsi = rsi.update(bar)
+        # quantiles of the previous dist_window RSI values, the current one joins the window afterwards
+        q_low, q_high = distribution.quantile(alpha / 2), distribution.quantile(1 - alpha / 2)
+        distribution.update(curr_rsi)
+        prices = (exit_long.update(bar), exit_short.update(bar), entry_long.update(bar), entry_short.update(bar))
+        if i < dist_window + lag:
+            signal, execute, quantity = HOLD, NAN, np.float64(0.)
+        else:
+            signal, execute, quantity = position.update(
+                long_entry=curr_rsi < np.minimum(q_low, 30), long_entry_price=prices[2],
+                short_entry=curr_rsi > np.maximum(q_high, 70), short_entry_price=prices[3],
+                long_exit=True, long_exit_price=prices[0],
+                short_exit=True, short_exit_price=prices[1])
+        yield {"Signal": signal, "Execute": execute, "Quantity": quantity}
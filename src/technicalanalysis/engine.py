@@ -0,0 +1,449 @@
+"""
+Fused indicator engine over NumPy arrays
+
+The OHLCV columns are read once as contiguous float arrays, intermediates shared
+by several indicators (price changes, true range, log ranges, cumulative sums)
+are computed once per call, and every requested output is returned as one block.
+
+Besides a plain OHLCV frame, the engine accepts a panel of N symbols: a frame
+with (field, symbol) or (symbol, field) MultiIndex columns, a dict of (T x N)
+arrays keyed by field, or a bare (T x N) array standing for Close. Every kernel
+runs along the time axis, so all symbols are computed in the same vectorised
+call; symbols listed late are NaN-padded and start their windows at their
+first observation.
+
+Example:
+    block = compute_indicators(dataframe, [
+        {"indicator": "SMA", "window": 20, "columns": ["Close"]},
+        {"indicator": "RSI", "window": 14},
+        {"indicator": "MACD"},
+    ])
+"""
+import inspect
+
+import numpy as np
+import pandas as pd
+
+from src.technicalanalysis import kernels, order_statistics, volatility
+
+
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+# intermediates the indicator functions have always written next to their outputs
+SCRATCH_COLUMNS = ("Log_Returns", "Range", "GK", "RS", "Open_Close", "Close_Close", "YZ", "TR",
+                   "Lowest_Low", "Highest_High", "EMA_short", "EMA_long")
+
+
+class IndicatorEngine:
+    """
+    Holds the input arrays of one dataframe or panel and the intermediates computed from them.
+
+    dataframe pd.DataFrame | dict[str, np.ndarray] | np.ndarray: source of data
+    dtype: float type of the inputs, intermediates and outputs; sums are always accumulated in float64
+    """
+
+    def __init__(self, dataframe, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        if isinstance(dataframe, np.ndarray):
+            dataframe = {"Close": dataframe}
+        self.dataframe = dataframe
+        self.index = getattr(dataframe, "index", None)
+        self._field_level = None
+        self.symbols = None
+        if isinstance(dataframe, pd.DataFrame) and isinstance(dataframe.columns, pd.MultiIndex):
+            self._field_level = _field_level(dataframe.columns)
+            self.symbols = dataframe.columns.get_level_values(1 - self._field_level).unique()
+        self._arrays = {}
+        self._cache = {}
+
+    @property
+    def is_panel(self):
+        return not isinstance(self.dataframe, pd.DataFrame) or self._field_level is not None
+
+    def array(self, column: str):
+        """
+        Contiguous array of a column, (T) for a frame or (T x N) for a panel, extracted once per engine.
+        No copy is made when the column already has the engine dtype.
+        """
+        if column not in self._arrays:
+            if self._field_level is not None:
+                values = self.dataframe.xs(column, axis=1, level=self._field_level).reindex(columns=self.symbols)
+            else:
+                values = self.dataframe[column]
+            self._arrays[column] = np.ascontiguousarray(np.asarray(values, dtype=self.dtype))
+        return self._arrays[column]
+
+    def started(self, column: str):
+        """
+        Mask of the rows at or after the first observation of column, per symbol for a panel.
+        """
+        return self.cached(("started", column), lambda: np.maximum.accumulate(~np.isnan(self.array(column)), axis=0))
+
+    def block(self, outputs: dict, as_arrays: bool = False):
+        """
+        Pack the output arrays the way the input came in: a frame, a MultiIndex frame or a dict of arrays.
+        """
+        if as_arrays or not isinstance(self.dataframe, pd.DataFrame):
+            return outputs
+        if self._field_level is None:
+            return pd.DataFrame(outputs, index=self.index)
+        frames = {name: pd.DataFrame(values, index=self.index, columns=self.symbols) for name, values in outputs.items()}
+        block = pd.concat(frames, axis=1)
+        return block.swaplevel(axis=1) if self._field_level == 1 else block
+
+    def cached(self, key, func):
+        """
+        Return the intermediate stored under key, computing it with func on first use.
+        """
+        if key not in self._cache:
+            self._cache[key] = func()
+        return self._cache[key]
+
+    def cumsum(self, key, values):
+        """
+        Cumulative sum of values (non-finite entries counted as zero) and the running count of non-finite entries.
+        """
+        def compute():
+            invalid = ~np.isfinite(values)
+            return (np.cumsum(np.where(invalid, 0.0, values), axis=0, dtype=np.float64),
+                    np.cumsum(invalid, axis=0))
+        return self.cached(("cumsum", key), compute)
+
+    def rolling_sum(self, key, values, window: int):
+        """
+        Rolling sum over window rows taken from the cumulative sum of values.
+        NaN while the window is incomplete or holds a non-finite value, as pandas rolling(window).
+        """
+        return self._rolling_sum64(key, values, window).astype(self.dtype, copy=False)
+
+    def _rolling_sum64(self, key, values, window: int):
+        return self.cached(("rolling_sum", key, window), lambda: _window_difference(*self.cumsum(key, values), window))
+
+    def rolling_mean(self, key, values, window: int):
+        return self.rolling_sum(key, values, window) / window
+
+    def rolling_var(self, key, values, window: int):
+        """
+        Rolling sample variance (ddof=1) with the windowed Welford update of kernels.rolling_var: unlike
+        differences of cumulative sums of values**2, its error does not grow with the length of the history.
+        """
+        def compute():
+            return kernels.rolling_var(np.asarray(values, dtype=np.float64), window).astype(self.dtype, copy=False)
+        return self.cached(("rolling_var", key, window), compute)
+
+    def rolling_std(self, key, values, window: int):
+        return np.sqrt(self.rolling_var(key, values, window))
+
+    def rolling_means(self, key, values, windows):
+        """
+        Rolling means of values for several windows at once, (T x W), all taken from the same cumulative sum.
+        """
+        windows = np.asarray(windows, dtype=np.int64)
+        return (_window_differences(*self.cumsum(key, values), windows) / windows).astype(self.dtype, copy=False)
+
+    def shift(self, column: str):
+        """
+        Column lagged by one row, NaN on the first row.
+        """
+        def compute():
+            values = self.array(column)
+            shifted = np.empty_like(values)
+            shifted[0:1] = np.nan
+            shifted[1:] = values[:-1]
+            return shifted
+        return self.cached(("shift", column), compute)
+
+    def compute(self, specs: list, scratch: bool = True):
+        """
+        Evaluate a list of indicator specs and return the outputs as an ordered dict of arrays.
+        scratch bool: keep the intermediates listed in SCRATCH_COLUMNS among the outputs
+        """
+        outputs = {}
+        for spec in specs:
+            params = dict(spec)
+            name = params.pop("indicator")
+            if name not in INDICATORS:
+                raise ValueError(f"Unknown indicator '{name}', expected one of {list(INDICATORS)}")
+            outputs.update(INDICATORS[name](self, **params))
+        return {name: values.astype(self.dtype, copy=False) for name, values in outputs.items()
+                if scratch or name not in SCRATCH_COLUMNS}
+
+
+def _field_level(columns: pd.MultiIndex):
+    for level in (0, 1):
+        if set(columns.get_level_values(level)) & set(FIELDS):
+            return level
+    raise ValueError(f"Panel columns must have a level holding the fields {FIELDS}")
+
+
+def _window_difference(csum, cinvalid, window: int):
+    out = np.full(csum.shape, np.nan)
+    if window > len(csum):
+        return out
+    total = csum[window - 1:].copy()
+    total[1:] -= csum[:-window]
+    invalid = cinvalid[window - 1:].copy()
+    invalid[1:] -= cinvalid[:-window]
+    out[window - 1:] = np.where(invalid > 0, np.nan, total)
+    return out
+
+
+def _window_differences(csum, cinvalid, windows):
+    """
+    (T x W) counterpart of _window_difference: one slice difference per window of the same cumulative sums.
+    """
+    out = np.full((len(csum), len(windows)), np.nan, order="F")
+    any_invalid = len(cinvalid) and cinvalid[-1] > 0
+    for j, window in enumerate(windows):
+        if window > len(csum):
+            continue
+        total = out[window - 1:, j]
+        total[0] = csum[window - 1]
+        np.subtract(csum[window:], csum[:-window], out=total[1:])
+        if any_invalid:
+            invalid = cinvalid[window - 1:].copy()
+            invalid[1:] -= cinvalid[:-window]
+            total[invalid > 0] = np.nan
+    return out
+
+
+def ewm_recurrence(values, alphas):
+    """
+    y[t] = (1 - alpha) * y[t-1] + alpha * x[t], seeded with the first value, for every alpha at once (T x W).
+
+    The series is cut into blocks of about sqrt(T) rows: the recurrence runs along all blocks at once
+    starting from zero, then the value carried in from the previous blocks is added back with its decay.
+    values must not contain NaN.
+    """
+    alphas = np.asarray(alphas, dtype=np.float64)
+    decay = 1. - alphas
+    n = len(values)
+    if n == 0:
+        return np.empty((0, len(alphas)))
+    block = max(int(np.sqrt(n)), 1)
+    n_blocks = -(-n // block)
+    x = np.zeros(n_blocks * block)
+    x[:n] = values
+    x = x.reshape(n_blocks, block)
+
+    local = np.empty((block, n_blocks, len(alphas)))
+    acc = np.zeros((n_blocks, len(alphas)))
+    for i in range(block):
+        acc *= decay
+        acc += alphas * x[:, i, None]
+        local[i] = acc
+
+    # the seed y[0] = x[0] is the alpha * x[0] of the first step plus a carried-in value of x[0]
+    powers = decay[None, :] ** np.arange(1, block + 1)[:, None]
+    carried = np.empty((n_blocks, len(alphas)))
+    carry = np.full(len(alphas), values[0], dtype=np.float64)
+    for b in range(n_blocks):
+        carried[b] = carry
+        carry = local[-1, b] + powers[-1] * carry
+    local += powers[:, None, :] * carried[None, :, :]
+    return local.transpose(1, 0, 2).reshape(-1, len(alphas))[:n]
+
+
+def ewm_spans(values, spans):
+    """
+    EWM(span, adjust=False) of values for several spans at once (T x W), as pandas ewm column by column.
+    """
+    spans = np.asarray(spans, dtype=np.float64)
+    alphas = 1. / (1. + (spans - 1) / 2)
+    observed = np.flatnonzero(~np.isnan(values))
+    out = np.full((len(values), len(spans)), np.nan)
+    if len(observed) == 0:
+        return out
+    if kernels.backend == "numba":
+        for j, span in enumerate(spans):
+            out[:, j] = kernels.ewm(values, span=span, adjust=False)
+        return out
+    first = observed[0]
+    if len(observed) != len(values) - first:
+        # gaps after the first observation change the pandas weights, use it directly
+        for j, span in enumerate(spans):
+            out[:, j] = pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+        return out
+    out[first:] = ewm_recurrence(values[first:], alphas)
+    return out
+
+
+def _ewm(engine: IndicatorEngine, key, values, **kwargs):
+    """
+    Exponentially weighted mean of values, shared between indicators asking for the same smoothing of key.
+    """
+    if kwargs.get("times") is not None:
+        return pd.DataFrame(values).ewm(**kwargs).mean().to_numpy(dtype=values.dtype).reshape(values.shape)
+    kwargs.pop("times", None)
+    return engine.cached(("ewm", key, tuple(sorted(kwargs.items()))), lambda: kernels.ewm(values, **kwargs))
+
+
+def _sma(engine: IndicatorEngine, window: int = 14, columns: list = None):
+    return {f"SMA_{window}_{col}": engine.rolling_mean(col, engine.array(col), window) for col in columns}
+
+
+def _sme(engine: IndicatorEngine, window: int = 14, columns: list = None):
+    return {f"SME_{window}_{col}": order_statistics.rolling_median(engine.array(col), window) for col in columns}
+
+
+def _ema(engine: IndicatorEngine, window: int = 14, columns: list = None,
+         com=None, span=None, halflife=None, alpha=None, min_periods=0, adjust=True, ignore_na=False, times=None):
+    if window is not None:
+        span = window
+    return {f"EMA_{window}_{col}": _ewm(engine, col, engine.array(col), com=com, span=span, halflife=halflife,
+                                        alpha=alpha, min_periods=min_periods, adjust=False, ignore_na=ignore_na,
+                                        times=times)
+            for col in columns}
+
+
+def _volume_moving_average(engine: IndicatorEngine, window: int = 14):
+    return {"Volume_MA": engine.rolling_mean("Volume", engine.array("Volume"), window)}
+
+
+def _realised_volatility(engine: IndicatorEngine, window: int = 14, model: str = "CloseToClose"):
+    return volatility.estimate(engine, window=window, model=model)
+
+
+def _realised_volatilities(engine: IndicatorEngine, window: int = 14, models: list = None):
+    return volatility.estimate_all(engine, window=window, models=models)
+
+
+def _rsi(engine: IndicatorEngine, window: int = 14):
+    def gains():
+        # rows before the first close (NaN padding of a panel) hold no gain rather than a zero gain
+        delta = engine.array("Close") - engine.shift("Close")
+        started = engine.started("Close")
+        return (np.where(started, np.where(delta > 0, delta, 0), np.nan),
+                np.where(started, np.where(delta < 0, -delta, 0), np.nan))
+    gain, loss = engine.cached("gain_loss", gains)
+    avg_gain = engine.rolling_mean("gain", gain, window)
+    avg_loss = engine.rolling_mean("loss", loss, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return {f"RSI_{window}": 100 - (100 / (1 + rs))}
+
+
+def _bollinger_bands(engine: IndicatorEngine, window: int = 14, volatility_model: str = "CloseToClose"):
+    outputs = _realised_volatility(engine, window=window, model=volatility_model)
+    sma = engine.rolling_mean("Close", engine.array("Close"), window)
+    outputs["SMA"] = sma
+    outputs["Upper_Band"] = sma + (2 * outputs["Realised_Volatility"])
+    outputs["Lower_Band"] = sma - (2 * outputs["Realised_Volatility"])
+    return outputs
+
+
+def _macd(engine: IndicatorEngine, short_window: int = 12, long_window: int = 26, signal_window: int = 9):
+    close = engine.array("Close")
+    ema_short = _ewm(engine, "Close", close, com=None, span=short_window, halflife=None, alpha=None,
+                     min_periods=0, adjust=False, ignore_na=False, times=None)
+    ema_long = _ewm(engine, "Close", close, com=None, span=long_window, halflife=None, alpha=None,
+                    min_periods=0, adjust=False, ignore_na=False, times=None)
+    macd = ema_short - ema_long
+    return {"EMA_short": ema_short, "EMA_long": ema_long, "MACD": macd,
+            "Signal_Line": _ewm(engine, "MACD", macd, span=signal_window, adjust=False)}
+
+
+def _true_range(engine: IndicatorEngine):
+    def compute():
+        high, low, prev_close = engine.array("High"), engine.array("Low"), engine.shift("Close")
+        return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return engine.cached("TR", compute)
+
+
+def _atr(engine: IndicatorEngine, window: int = 14):
+    tr = _true_range(engine)
+    return {"TR": tr, "ATR": engine.rolling_mean("TR", tr, window)}
+
+
+def _stochastic_oscillator(engine: IndicatorEngine, window: int = 14):
+    lowest_low = engine.cached(("rolling_min", "Low", window),
+                               lambda: order_statistics.rolling_extremum(engine.array("Low"), window, "min"))
+    highest_high = engine.cached(("rolling_max", "High", window),
+                                 lambda: order_statistics.rolling_extremum(engine.array("High"), window, "max"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = 100 * ((engine.array("Close") - lowest_low) / (highest_high - lowest_low))
+    return {"Lowest_Low": lowest_low, "Highest_High": highest_high, "%K": k,
+            "%D": engine.rolling_mean(("%K", window), k, 3)}
+
+
+INDICATORS = {
+    "SMA": _sma,
+    "SME": _sme,
+    "EMA": _ema,
+    "volume_moving_average": _volume_moving_average,
+    "realised_volatility": _realised_volatility,
+    "realised_volatilities": _realised_volatilities,
+    "RSI": _rsi,
+    "Bollinger_Bands": _bollinger_bands,
+    "MACD": _macd,
+    "ATR": _atr,
+    "Stochastic_Oscillator": _stochastic_oscillator,
+}
+
+
+def normalise_spec(spec: dict):
+    """
+    Spec with every parameter of its indicator filled with its default and lists turned into tuples,
+    so that two specs asking for the same outputs compare equal.
+    """
+    params = dict(spec)
+    name = params.pop("indicator")
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator '{name}', expected one of {list(INDICATORS)}")
+    signature = inspect.signature(INDICATORS[name])
+    normalised = {"indicator": name}
+    for param in list(signature.parameters.values())[1:]:
+        value = params.pop(param.name, param.default)
+        normalised[param.name] = tuple(value) if isinstance(value, list) else value
+    if params:
+        raise ValueError(f"Unknown parameters {sorted(params)} for indicator '{name}'")
+    return normalised
+
+
+def output_names(spec: dict):
+    """
+    Columns written by an indicator spec, intermediates included, found by running it on a single row.
+    """
+    columns = set(FIELDS) | set(spec.get("columns") or ())
+    probe = pd.DataFrame({col: np.ones(1) for col in columns})
+    return list(IndicatorEngine(probe).compute([spec]))
+
+
+def compute_indicators(dataframe, specs: list, scratch: bool = True, dtype=np.float64, as_arrays: bool = False):
+    """
+    Compute several indicators in one pass over the OHLCV arrays, without modifying dataframe.
+
+    dataframe pd.DataFrame | dict[str, np.ndarray] | np.ndarray: source of data, a single symbol or a panel
+    specs list[dict]: one dict per indicator, {"indicator": <function name>, **parameters of that function}
+    scratch bool: also return the intermediates listed in SCRATCH_COLUMNS
+    dtype: np.float64, or np.float32 to halve the memory of inputs and outputs
+    as_arrays bool: return a dict of arrays instead of a frame
+    returns pd.DataFrame: every output column, aligned on the index of dataframe;
+        (output, symbol) MultiIndex columns for a panel frame, a dict of (T x N) arrays for array inputs
+    """
+    engine = IndicatorEngine(dataframe, dtype=dtype)
+    return engine.block(engine.compute(specs, scratch=scratch), as_arrays=as_arrays)
+
+
+def assign_outputs(dataframe, block):
+    """
+    Write the columns of an output block into dataframe, in order.
+    Panels are not modified: a MultiIndex frame comes back as a new frame with the outputs appended,
+    array inputs get the dict of output arrays.
+    """
+    if not isinstance(dataframe, pd.DataFrame):
+        return block
+    if isinstance(dataframe.columns, pd.MultiIndex):
+        return pd.concat([dataframe, block], axis=1)
+    for col in block.columns:
+        dataframe[col] = block[col]
+    return dataframe
+
+
+def to_panel(dict_df: dict):
+    """
+    Stack per-symbol OHLCV frames (as returned by yfinanceGetter.history) into one (field, symbol) panel.
+    Symbols are aligned on the union of their indexes, missing rows are NaN.
+    """
+    panel = pd.concat(dict_df, axis=1, names=["Symbol", "Field"]).swaplevel(axis=1)
+    return panel[[field for field in FIELDS if field in panel.columns.get_level_values(0)]]
@@ -0,0 +1,338 @@
+"""
+Compiled kernels for the sequential parts of the indicators
+
+The exponentially weighted mean (EMA, MACD and its signal line), the rolling
+min/max/median and the rolling variance are recurrences over the rows that numpy cannot vectorise. When
+Numba is installed they run as compiled loops over every column of a (T x N)
+array; otherwise, or after set_backend("pandas"), the pandas implementations are
+used. Both backends return the same values bit for bit: the loops below are
+ports of the pandas window aggregations (the rolling variance of a 2-row window
+only up to rounding).
+
+Example:
+    from src.technicalanalysis import kernels
+    kernels.set_backend("pandas")
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ("numba", "pandas")
+backend = "numba" if numba is not None else "pandas"
+
+
+def set_backend(name: str):
+    """
+    Select the backend of every kernel.
+
+    name str: 'numba' (requires Numba to be installed) or 'pandas'
+    """
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {BACKENDS}")
+    if name == "numba" and numba is None:
+        raise ImportError("The numba backend requires Numba to be installed")
+    backend = name
+
+
+def center_of_mass(com=None, span=None, halflife=None, alpha=None):
+    """
+    Center of mass of an exponential decay given in any of the pandas ewm parametrisations,
+    with the same validation as pandas.
+    """
+    if sum(param is not None for param in (com, span, halflife, alpha)) > 1:
+        raise ValueError("comass, span, halflife, and alpha are mutually exclusive")
+    if com is not None:
+        if com < 0:
+            raise ValueError("comass must satisfy: comass >= 0")
+        return float(com)
+    if span is not None:
+        if span < 1:
+            raise ValueError("span must satisfy: span >= 1")
+        return float((span - 1) / 2)
+    if halflife is not None:
+        if halflife <= 0:
+            raise ValueError("halflife must satisfy: halflife > 0")
+        decay = 1 - np.exp(np.log(0.5) / halflife)
+        return float(1 / decay - 1)
+    if alpha is not None:
+        if alpha <= 0 or alpha > 1:
+            raise ValueError("alpha must satisfy: 0 < alpha <= 1")
+        return float((1 - alpha) / alpha)
+    raise ValueError("Must pass one of comass, span, halflife, or alpha")
+
+
+def jit(func):
+    """
+    Compile func with Numba when it is installed (the Python function stays available as py_func),
+    return it unchanged otherwise.
+    """
+    return numba.njit(cache=True, nogil=True)(func) if numba is not None else func
+
+
+@jit
+def _ewm_loop(values, com, adjust, ignore_na, min_periods):
+    n_rows, n_cols = values.shape
+    out = np.empty((n_rows, n_cols))
+    alpha = 1. / (1. + com)
+    old_wt_factor = 1. - alpha
+    new_wt = 1. if adjust else alpha
+    for j in range(n_cols):
+        if n_rows == 0:
+            break
+        weighted = values[0, j]
+        nobs = 1 if weighted == weighted else 0
+        out[0, j] = weighted if nobs >= min_periods else np.nan
+        old_wt = 1.
+        for i in range(1, n_rows):
+            cur = values[i, j]
+            is_observation = cur == cur
+            if is_observation:
+                nobs += 1
+            if weighted == weighted:
+                if is_observation or not ignore_na:
+                    old_wt *= old_wt_factor
+                    if is_observation:
+                        # avoid numerical errors on constant series
+                        if weighted != cur:
+                            weighted = old_wt * weighted + new_wt * cur
+                            weighted /= (old_wt + new_wt)
+                        if adjust:
+                            old_wt += new_wt
+                        else:
+                            old_wt = 1.
+            elif is_observation:
+                weighted = cur
+            out[i, j] = weighted if nobs >= min_periods else np.nan
+    return out
+
+
+@jit
+def _rolling_extremum_loop(values, window, is_max):
+    n_rows, n_cols = values.shape
+    out = np.empty((n_rows, n_cols))
+    capacity = window + 1
+    candidates = np.empty(capacity, dtype=np.int64)
+    for j in range(n_cols):
+        # candidates[head:tail] (modulo capacity) holds row indexes with monotonic values
+        head = 0
+        tail = 0
+        last_nan = -window - 1
+        for i in range(n_rows):
+            value = values[i, j]
+            if value != value:
+                last_nan = i
+            else:
+                while tail > head:
+                    back = values[candidates[(tail - 1) % capacity], j]
+                    if (value >= back) if is_max else (value <= back):
+                        tail -= 1
+                    else:
+                        break
+                candidates[tail % capacity] = i
+                tail += 1
+            while tail > head and candidates[head % capacity] <= i - window:
+                head += 1
+            if i < window - 1 or i - last_nan < window:
+                out[i, j] = np.nan
+            else:
+                out[i, j] = values[candidates[head % capacity], j]
+    return out
+
+
+@jit
+def _rolling_median_loop(values, window):
+    n_rows, n_cols = values.shape
+    out = np.empty((n_rows, n_cols))
+    ordered = np.empty(window + 1)
+    mid = window // 2
+    for j in range(n_cols):
+        size = 0
+        nans = 0
+        for i in range(n_rows):
+            value = values[i, j]
+            if value != value:
+                nans += 1
+            else:
+                position = np.searchsorted(ordered[:size], value)
+                ordered[position + 1:size + 1] = ordered[position:size].copy()
+                ordered[position] = value
+                size += 1
+            if i >= window:
+                old = values[i - window, j]
+                if old != old:
+                    nans -= 1
+                else:
+                    position = np.searchsorted(ordered[:size], old)
+                    ordered[position:size - 1] = ordered[position + 1:size].copy()
+                    size -= 1
+            if i < window - 1 or nans > 0:
+                out[i, j] = np.nan
+            elif window % 2:
+                out[i, j] = ordered[mid]
+            else:
+                out[i, j] = (ordered[mid] + ordered[mid - 1]) / 2
+    return out
+
+
+# state of the rolling variance: observations, mean, sum of squared deviations, compensations of the adds and of
+# the removals, run of equal consecutive values and previous value
+VAR_STATE_SIZE = 7
+
+
+@jit
+def _var_reset_run(state):
+    """
+    A window holding a single run of equal values restarts from that value, dropping the rounding left
+    in the mean and the sum of squared deviations.
+    """
+    if state[0] > 0 and state[5] >= state[0]:
+        state[1] = state[6]
+        state[2] = 0.
+
+
+@jit
+def _var_add(value, state):
+    """
+    Add value to the window: Welford update of the mean with Kahan compensation, as pandas add_var.
+    """
+    if value != value:
+        return
+    state[0] += 1
+    if value == state[6]:
+        state[5] += 1
+    else:
+        state[5] = 1
+    state[6] = value
+    prev_mean = state[1] - state[3]
+    y = value - state[3]
+    t = y - state[1]
+    state[3] = t + state[1] - y
+    state[1] = state[1] + t / state[0]
+    state[2] = state[2] + (value - prev_mean) * (value - state[1])
+    _var_reset_run(state)
+
+
+@jit
+def _var_remove(value, state):
+    """
+    Remove value from the window, as pandas remove_var.
+    """
+    if value != value:
+        return
+    state[0] -= 1
+    if state[0]:
+        prev_mean = state[1] - state[4]
+        y = value - state[4]
+        t = y - state[1]
+        state[4] = t + state[1] - y
+        state[1] = state[1] - t / state[0]
+        state[2] = state[2] - (value - prev_mean) * (value - state[1])
+    else:
+        state[1] = 0.
+        state[2] = 0.
+    _var_reset_run(state)
+
+
+@jit
+def _var_value(state, window):
+    """
+    Sample variance (ddof=1) of a window holding window observations, NaN otherwise, as pandas calc_var.
+    """
+    nobs = state[0]
+    if nobs < window or nobs <= 1:
+        return np.nan
+    # a run of equal values has no variance, whatever the rounding left in the sums
+    if state[5] >= nobs:
+        return 0.
+    result = state[2] / (nobs - 1)
+    return result if result >= 0 else 0.
+
+
+@jit
+def _rolling_var_loop(values, window, state):
+    """
+    Rolling variance of one column from state (fresh or carried over), rows before 0 are not in values:
+    the first window rows only add. Returns the variances; state holds the state after the last row.
+    """
+    n_rows = len(values)
+    out = np.empty(n_rows)
+    for i in range(n_rows):
+        # removals before additions, as pandas roll_var
+        if i >= window:
+            _var_remove(values[i - window], state)
+        _var_add(values[i], state)
+        out[i] = _var_value(state, window)
+    return out
+
+
+def new_var_state(first_value=np.nan):
+    """
+    Empty rolling variance state, the run of equal values starting at first_value as pandas.
+    """
+    state = np.zeros(VAR_STATE_SIZE)
+    state[6] = first_value
+    return state
+
+
+def _columns(values):
+    return np.ascontiguousarray(values, dtype=np.float64).reshape(len(values), -1)
+
+
+def ewm(values, com=None, span=None, halflife=None, alpha=None, min_periods=0, adjust=True, ignore_na=False):
+    """
+    Exponentially weighted mean of values (T or T x N) along the rows, as pandas ewm(...).mean().
+    """
+    if backend == "pandas":
+        result = pd.DataFrame(values).ewm(com=com, span=span, halflife=halflife, alpha=alpha, min_periods=min_periods,
+                                          adjust=adjust, ignore_na=ignore_na).mean()
+        return result.to_numpy(dtype=values.dtype).reshape(values.shape)
+    result = _ewm_loop(_columns(values), center_of_mass(com, span, halflife, alpha), bool(adjust), bool(ignore_na),
+                       max(int(min_periods), 1))
+    return result.astype(values.dtype, copy=False).reshape(values.shape)
+
+
+def rolling_extremum(values, window: int, kind: str = "min"):
+    """
+    Rolling min or max of values (T or T x N), NaN while the window is incomplete or holds a NaN.
+    """
+    if kind not in ("min", "max"):
+        raise ValueError("kind must be either 'min' or 'max'")
+    if backend == "pandas":
+        result = getattr(pd.DataFrame(values).rolling(window=window), kind)()
+        return result.to_numpy(dtype=values.dtype).reshape(values.shape)
+    result = _rolling_extremum_loop(_columns(values), int(window), kind == "max")
+    return result.astype(values.dtype, copy=False).reshape(values.shape)
+
+
+def rolling_var(values, window: int):
+    """
+    Rolling sample variance (ddof=1) of values (T or T x N), NaN while the window is incomplete or holds a
+    non-finite value, as pandas rolling(window).var(). The windowed Welford update keeps the error bounded by
+    the window, however long the series.
+    """
+    if backend == "pandas":
+        result = pd.DataFrame(values).rolling(window=window).var()
+        return result.to_numpy(dtype=values.dtype).reshape(values.shape)
+    columns = _columns(values)
+    columns = np.where(np.isfinite(columns), columns, np.nan)
+    result = np.empty(columns.shape)
+    for j in range(columns.shape[1]):
+        column = np.ascontiguousarray(columns[:, j])
+        result[:, j] = _rolling_var_loop(column, int(window), new_var_state(column[0] if len(column) else np.nan))
+    return result.astype(values.dtype, copy=False).reshape(values.shape)
+
+
+def rolling_median(values, window: int):
+    """
+    Rolling median of values (T or T x N), NaN while the window is incomplete or holds a NaN.
+    """
+    if backend == "pandas":
+        result = pd.DataFrame(values).rolling(window=window).median()
+        return result.to_numpy(dtype=values.dtype).reshape(values.shape)
+    result = _rolling_median_loop(_columns(values), int(window))
+    return result.astype(values.dtype, copy=False).reshape(values.shape)
@@ -0,0 +1,255 @@
+"""
+Rolling order statistics: min/max, medians and quantiles
+
+RollingExtremum keeps a monotonic deque of the window (amortised O(1) per bar),
+RollingQuantile keeps the window as a sorted Python list, so any set of
+quantiles is read off the same sorted state. Its insert/removal are located by
+binary search (O(log w) comparisons) but shift the list, O(w) per update: a
+memmove, cheap for windows of a few hundred values. Both are streaming objects
+with update(value).
+
+The batch functions do not replay them: rolling_extremum and rolling_median run
+the kernels of kernels.py (compiled with Numba, or pandas rolling), and
+rolling_quantiles counts the window in a Fenwick tree over the ranks of all the
+values, O(log T) per bar, compiled with Numba (RollingQuantile row by row on
+the pandas backend).
+
+Conventions:
+    min/max/median follow pandas rolling(window): NaN while the window is
+    incomplete or holds a NaN, median of an even window is the mean of the two
+    middle values.
+    quantiles follow np.quantile (linear method) on the non-NaN values of the
+    window, as np.quantile(series.iloc[i-window:i].dropna(), q).
+"""
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+from src.technicalanalysis import kernels
+
+NAN = np.float64(np.nan)
+
+
+class RollingExtremum:
+    """
+    Rolling min or max over window values with a monotonic deque.
+
+    window int: size of the rolling window
+    kind str: 'min' or 'max'
+    """
+
+    def __init__(self, window: int, kind: str = "min"):
+        if kind not in ("min", "max"):
+            raise ValueError("kind must be either 'min' or 'max'")
+        self.window = window
+        self._better = np.less_equal if kind == "min" else np.greater_equal
+        self._candidates = deque()
+        self._count = 0
+        self._last_nan = -window - 1
+
+    def update(self, value):
+        i = self._count
+        self._count += 1
+        if np.isnan(value):
+            self._last_nan = i
+        else:
+            while self._candidates and self._better(value, self._candidates[-1][1]):
+                self._candidates.pop()
+            self._candidates.append((i, value))
+        while self._candidates and self._candidates[0][0] <= i - self.window:
+            self._candidates.popleft()
+        if self._count < self.window or i - self._last_nan < self.window:
+            return NAN
+        return self._candidates[0][1]
+
+    def warm_start(self, values):
+        """
+        Seed the state from a history; only the last window values are replayed.
+        """
+        start = max(len(values) - self.window, 0)
+        self._count = start
+        nans = np.flatnonzero(np.isnan(values))
+        if len(nans):
+            self._last_nan = int(nans[-1])
+        for value in values[start:]:
+            self.update(value)
+        return self
+
+
+class RollingQuantile:
+    """
+    Sorted window of the last window values, from which medians and quantiles are read.
+
+    window int: size of the rolling window
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque()
+        self._sorted = []
+        self._nans = 0
+
+    def update(self, value):
+        """
+        Push value into the window, dropping the oldest one once the window is full.
+        """
+        self._values.append(value)
+        if np.isnan(value):
+            self._nans += 1
+        else:
+            insort(self._sorted, value)
+        if len(self._values) > self.window:
+            old = self._values.popleft()
+            if np.isnan(old):
+                self._nans -= 1
+            else:
+                del self._sorted[bisect_left(self._sorted, old)]
+        return self
+
+    @property
+    def complete(self):
+        """
+        True when the window holds window values and none of them is NaN.
+        """
+        return len(self._values) == self.window and self._nans == 0
+
+    def median(self):
+        """
+        Median of the window as pandas rolling(window).median(), NaN unless the window is complete.
+        """
+        if not self.complete:
+            return NAN
+        n = len(self._sorted)
+        mid = n // 2
+        if n % 2:
+            return self._sorted[mid]
+        return (self._sorted[mid] + self._sorted[mid - 1]) / 2
+
+    def quantile(self, q: float):
+        """
+        Quantile q of the non-NaN values in the window as np.quantile (linear method), NaN when there are none.
+        """
+        n = len(self._sorted)
+        if n == 0:
+            return NAN
+        virtual = (n - 1) * q
+        if virtual >= n - 1:
+            return self._sorted[-1]
+        previous = int(np.floor(virtual))
+        gamma = virtual - previous
+        a, b = self._sorted[previous], self._sorted[previous + 1]
+        diff = b - a
+        return b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+
+    def warm_start(self, values):
+        """
+        Seed the state from a history; only the last window values are kept.
+        """
+        for value in values[max(len(values) - self.window, 0):]:
+            self.update(value)
+        return self
+
+
+def rolling_extremum(values, window: int, kind: str = "min"):
+    """
+    Rolling min or max of values (T or T x N), same values as RollingExtremum.
+    The batch path runs the compiled monotonic deque of kernels.py (Numba, or the pandas rolling kernel).
+    """
+    return kernels.rolling_extremum(values, window, kind)
+
+
+def rolling_median(values, window: int):
+    """
+    Rolling median of values (T or T x N), same values as RollingQuantile.median.
+    The batch path runs the compiled sorted window of kernels.py (Numba, or the pandas rolling kernel).
+    """
+    return kernels.rolling_median(values, window)
+
+
+@kernels.jit
+def _kth(tree, k):
+    """
+    Rank of the (k+1)-th smallest value counted in the Fenwick tree, by binary lifting.
+    """
+    position = 0
+    step = 1
+    while step * 2 <= len(tree) - 1:
+        step *= 2
+    while step:
+        if position + step < len(tree) and tree[position + step] <= k:
+            position += step
+            k -= tree[position]
+        step //= 2
+    return position
+
+
+@kernels.jit
+def _rolling_quantiles_loop(ranks, ordered, window, quantiles):
+    """
+    Right-closed rolling quantiles from the ranks of the values in ordered (-1 for NaN), as RollingQuantile.quantile.
+    """
+    n_rows = len(ranks)
+    out = np.empty((n_rows, len(quantiles)))
+    tree = np.zeros(len(ordered) + 1, dtype=np.int64)
+    count = 0
+    for i in range(n_rows):
+        if ranks[i] >= 0:
+            position = ranks[i] + 1
+            while position < len(tree):
+                tree[position] += 1
+                position += position & -position
+            count += 1
+        if i >= window and ranks[i - window] >= 0:
+            position = ranks[i - window] + 1
+            while position < len(tree):
+                tree[position] -= 1
+                position += position & -position
+            count -= 1
+        for j in range(len(quantiles)):
+            if count == 0:
+                out[i, j] = np.nan
+                continue
+            virtual = (count - 1) * quantiles[j]
+            if virtual >= count - 1:
+                out[i, j] = ordered[_kth(tree, count - 1)]
+                continue
+            previous = int(np.floor(virtual))
+            gamma = virtual - previous
+            a = ordered[_kth(tree, previous)]
+            b = ordered[_kth(tree, previous + 1)]
+            diff = b - a
+            out[i, j] = b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+    return out
+
+
+def rolling_quantiles(values, window: int, quantiles: list, closed: str = "right"):
+    """
+    Several rolling quantiles of values (T), as a (T x Q) array, same values as RollingQuantile.quantile.
+
+    window int: size of the rolling window
+    quantiles list[float]: quantiles between 0 and 1
+    closed str: 'right' uses rows i-window+1..i, 'left' uses rows i-window..i-1 (excludes the current row)
+    """
+    if closed not in ("right", "left"):
+        raise ValueError("closed must be either 'right' or 'left'")
+    values = np.asarray(values, dtype=np.float64)
+    if kernels.backend == "numba":
+        finite = ~np.isnan(values)
+        order = np.flatnonzero(finite)[np.argsort(values[finite], kind="stable")]
+        ranks = np.full(len(values), -1, dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        out = _rolling_quantiles_loop(ranks, np.ascontiguousarray(values[order]), int(window),
+                                      np.asarray(quantiles, dtype=np.float64))
+        if closed == "left":
+            out = np.concatenate([np.full((min(len(out), 1), len(quantiles)), np.nan), out[:-1]])
+        return out
+    out = np.full((len(values), len(quantiles)), np.nan)
+    state = RollingQuantile(window)
+    for i, value in enumerate(values):
+        if closed == "right":
+            state.update(value)
+        out[i] = [state.quantile(q) for q in quantiles]
+        if closed == "left":
+            state.update(value)
+    return out
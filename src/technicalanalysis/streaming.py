@@ -0,0 +1,488 @@
+"""
+Streaming counterparts of the indicators in technicalanalysis.py
+
+Each object keeps the state of one indicator and returns the newest value from
+update(bar) in O(1) (amortised O(1) for rolling min/max, an O(w) shift of a sorted
+list for medians),
+where bar is any mapping holding the OHLCV fields of one row (dict, pd.Series, ...).
+warm_start(dataframe) seeds the state from a history in one vectorised pass.
+The arithmetic mirrors engine.py step for step so that the streamed values are
+bit-for-bit equal to the batch functions run over the same rows.
+
+Example:
+    rsi = StreamingRSI(window=14).warm_start(history)
+    value = rsi.update(bar)
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.technicalanalysis import kernels
+from src.technicalanalysis.kernels import center_of_mass
+from src.technicalanalysis.order_statistics import RollingExtremum, RollingQuantile
+
+NAN = np.float64(np.nan)
+
+
+def _values(dataframe: pd.DataFrame, column: str):
+    return np.ascontiguousarray(dataframe[column].to_numpy(dtype=np.float64))
+
+
+def _shift(values):
+    shifted = np.empty_like(values)
+    shifted[0:1] = np.nan
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+class _RollingSum:
+    """
+    Rolling sum over window values kept as the difference of two cumulative sums, as engine.rolling_sum.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._total = np.float64(0.0)
+        self._invalid = 0
+        self._cumulative = deque([(self._total, self._invalid)], maxlen=window + 1)
+
+    def update(self, value):
+        invalid = not np.isfinite(value)
+        self._total = self._total + (np.float64(0.0) if invalid else value)
+        self._invalid += invalid
+        self._cumulative.append((self._total, self._invalid))
+        if len(self._cumulative) <= self.window:
+            return NAN
+        total, invalid = self._cumulative[0]
+        return NAN if self._invalid - invalid > 0 else self._total - total
+
+    def warm_start(self, values):
+        invalid = ~np.isfinite(values)
+        csum = np.cumsum(np.where(invalid, 0.0, values))
+        cinvalid = np.cumsum(invalid)
+        if len(values):
+            self._total, self._invalid = csum[-1], int(cinvalid[-1])
+        tail = slice(max(len(values) - self.window, 0), None)
+        self._cumulative.extend(zip(csum[tail], cinvalid[tail].tolist()))
+        return self
+
+
+class _RollingVar:
+    """
+    Rolling sample variance with the windowed Welford update of kernels.rolling_var, state for state.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque(maxlen=window)
+        self._state = None
+
+    def update(self, value):
+        value = value if np.isfinite(value) else NAN
+        if self._state is None:
+            self._state = kernels.new_var_state(value)
+        if len(self._values) == self.window:
+            kernels._var_remove(self._values[0], self._state)
+        self._values.append(value)
+        kernels._var_add(value, self._state)
+        return np.float64(kernels._var_value(self._state, self.window))
+
+    def warm_start(self, values):
+        values = np.where(np.isfinite(values), values, np.nan)
+        if len(values):
+            self._state = kernels.new_var_state(values[0])
+            kernels._rolling_var_loop(np.ascontiguousarray(values), self.window, self._state)
+        self._values.extend(values[max(len(values) - self.window, 0):])
+        return self
+
+
+class _EWM:
+    """
+    Exponentially weighted mean with adjust=False, a port of the pandas ewm recursion.
+    """
+
+    def __init__(self, com=None, span=None, halflife=None, alpha=None, min_periods=0, ignore_na=False):
+        self._com = center_of_mass(com, span, halflife, alpha)
+        self._alpha = 1. / (1. + self._com)
+        self._old_wt_factor = 1. - self._alpha
+        self._min_periods = max(int(min_periods), 1)
+        self._ignore_na = ignore_na
+        self._weighted = None
+        self._old_wt = 1.
+        self._nobs = 0
+
+    def update(self, value):
+        is_observation = value == value
+        self._nobs += is_observation
+        if self._weighted is None:
+            self._weighted = value
+        elif self._weighted == self._weighted:
+            if is_observation or not self._ignore_na:
+                self._old_wt *= self._old_wt_factor
+                if is_observation:
+                    if self._weighted != value:
+                        self._weighted = self._old_wt * self._weighted + self._alpha * value
+                        self._weighted /= (self._old_wt + self._alpha)
+                    self._old_wt = 1.
+        elif is_observation:
+            self._weighted = value
+        return self._weighted if self._nobs >= self._min_periods else NAN
+
+    def warm_start(self, values):
+        observed = np.flatnonzero(~np.isnan(values))
+        if len(observed) < self._min_periods:
+            for value in values:
+                self.update(value)
+            return self
+        if len(values):
+            self._weighted = pd.Series(values).ewm(com=self._com, adjust=False,
+                                                   ignore_na=self._ignore_na).mean().to_numpy()[-1]
+            self._nobs = len(observed)
+            if len(observed) and not self._ignore_na:
+                for _ in range(len(values) - 1 - observed[-1]):
+                    self._old_wt *= self._old_wt_factor
+        return self
+
+
+class StreamingSMA:
+    """
+    Simple moving average of one column, streaming counterpart of SMA.
+
+    window int: size of the rolling window
+    column str: column of the bar to average
+    """
+
+    def __init__(self, window: int = 14, column: str = "Close"):
+        self.window = window
+        self.column = column
+        self._sum = _RollingSum(window)
+
+    def update(self, bar):
+        return self._sum.update(np.float64(bar[self.column])) / self.window
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        self._sum.warm_start(_values(dataframe, self.column))
+        return self
+
+
+class StreamingSME:
+    """
+    Simple moving median of one column, streaming counterpart of SME.
+
+    window int: size of the rolling window
+    column str: column of the bar to take the median of
+    """
+
+    def __init__(self, window: int = 14, column: str = "Close"):
+        self.window = window
+        self.column = column
+        self._window = RollingQuantile(window)
+
+    def update(self, bar):
+        return self._window.update(np.float64(bar[self.column])).median()
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        self._window.warm_start(_values(dataframe, self.column))
+        return self
+
+
+class StreamingEMA:
+    """
+    Exponential moving average of one column, streaming counterpart of EMA (adjust=False).
+
+    window int: span of the average, overrides span when given
+    column str: column of the bar to average
+    """
+
+    def __init__(self, window: int = 14, column: str = "Close", com=None, span=None, halflife=None, alpha=None,
+                 min_periods=0, ignore_na=False):
+        if window is not None:
+            span = window
+        self.window = window
+        self.column = column
+        self._ewm = _EWM(com=com, span=span, halflife=halflife, alpha=alpha, min_periods=min_periods,
+                         ignore_na=ignore_na)
+
+    def update(self, bar):
+        return self._ewm.update(np.float64(bar[self.column]))
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        self._ewm.warm_start(_values(dataframe, self.column))
+        return self
+
+
+class StreamingRSI:
+    """
+    Relative strength index of Close, streaming counterpart of RSI.
+
+    window int: size of the rolling window
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self._prev_close = NAN
+        self._started = False
+        self._gain = _RollingSum(window)
+        self._loss = _RollingSum(window)
+
+    def update(self, bar):
+        close = np.float64(bar["Close"])
+        delta = close - self._prev_close
+        self._prev_close = close
+        self._started = self._started or not np.isnan(close)
+        gain = (delta if delta > 0 else np.float64(0.0)) if self._started else NAN
+        loss = (-delta if delta < 0 else np.float64(0.0)) if self._started else NAN
+        avg_gain = self._gain.update(gain) / self.window
+        avg_loss = self._loss.update(loss) / self.window
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = avg_gain / avg_loss
+            return 100 - (100 / (1 + rs))
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        close = _values(dataframe, "Close")
+        delta = close - _shift(close)
+        started = np.maximum.accumulate(~np.isnan(close))
+        self._gain.warm_start(np.where(started, np.where(delta > 0, delta, 0), np.nan))
+        self._loss.warm_start(np.where(started, np.where(delta < 0, -delta, 0), np.nan))
+        if len(close):
+            self._prev_close = close[-1]
+            self._started = bool(started[-1])
+        return self
+
+
+class StreamingATR:
+    """
+    Average true range, streaming counterpart of ATR.
+
+    window int: size of the rolling window
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self._prev_close = NAN
+        self._tr = _RollingSum(window)
+
+    def update(self, bar):
+        high, low, close = np.float64(bar["High"]), np.float64(bar["Low"]), np.float64(bar["Close"])
+        tr = np.maximum(high - low, np.maximum(np.abs(high - self._prev_close), np.abs(low - self._prev_close)))
+        self._prev_close = close
+        return self._tr.update(tr) / self.window
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        high, low, close = _values(dataframe, "High"), _values(dataframe, "Low"), _values(dataframe, "Close")
+        prev_close = _shift(close)
+        self._tr.warm_start(np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close))))
+        if len(close):
+            self._prev_close = close[-1]
+        return self
+
+
+class StreamingMACD:
+    """
+    Moving average convergence divergence, streaming counterpart of MACD.
+    update returns a dict with the 'MACD' and 'Signal_Line' values.
+    """
+
+    def __init__(self, short_window: int = 12, long_window: int = 26, signal_window: int = 9):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.signal_window = signal_window
+        self._short = _EWM(span=short_window)
+        self._long = _EWM(span=long_window)
+        self._signal = _EWM(span=signal_window)
+
+    def update(self, bar):
+        close = np.float64(bar["Close"])
+        macd = self._short.update(close) - self._long.update(close)
+        return {"MACD": macd, "Signal_Line": self._signal.update(macd)}
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        close = _values(dataframe, "Close")
+        self._short.warm_start(close)
+        self._long.warm_start(close)
+        ema = lambda span: pd.Series(close).ewm(span=span, adjust=False).mean().to_numpy()
+        self._signal.warm_start(ema(self.short_window) - ema(self.long_window))
+        return self
+
+
+class StreamingStochasticOscillator:
+    """
+    Stochastic oscillator, streaming counterpart of Stochastic_Oscillator.
+    update returns a dict with the '%K' and '%D' values.
+
+    window int: size of the rolling window
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self._lowest_low = RollingExtremum(window, "min")
+        self._highest_high = RollingExtremum(window, "max")
+        self._d = _RollingSum(3)
+
+    def update(self, bar):
+        lowest_low = self._lowest_low.update(np.float64(bar["Low"]))
+        highest_high = self._highest_high.update(np.float64(bar["High"]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = 100 * ((np.float64(bar["Close"]) - lowest_low) / (highest_high - lowest_low))
+        return {"%K": k, "%D": self._d.update(k) / 3}
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        low, high = _values(dataframe, "Low"), _values(dataframe, "High")
+        self._lowest_low.warm_start(low)
+        self._highest_high.warm_start(high)
+        lowest_low = pd.Series(low).rolling(window=self.window).min().to_numpy()
+        highest_high = pd.Series(high).rolling(window=self.window).max().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._d.warm_start(100 * ((_values(dataframe, "Close") - lowest_low) / (highest_high - lowest_low)))
+        return self
+
+
+class StreamingBollingerBands:
+    """
+    Bollinger Bands, streaming counterpart of Bollinger_Bands.
+    update returns a dict with the 'Realised_Volatility', 'SMA', 'Upper_Band' and 'Lower_Band' values.
+
+    window int: size of the rolling window
+    volatility_model str: 'CloseToClose', 'Parkinson', 'GarmanKlass', 'RogersSatchell' or 'YangZhang'
+    """
+
+    def __init__(self, window: int = 14, volatility_model: str = "CloseToClose"):
+        if volatility_model not in ("CloseToClose", "Parkinson", "GarmanKlass", "RogersSatchell", "YangZhang"):
+            raise ValueError(f"Unknown volatility model '{volatility_model}'")
+        self.window = window
+        self.volatility_model = volatility_model
+        self._prev_close = NAN
+        self._close = _RollingSum(window)
+        self._log_returns = _RollingVar(window)
+        self._open_close = _RollingVar(window)
+        self._term = _RollingSum(window)
+
+    def _terms(self, open_, high, low, close, prev_close):
+        """
+        Per-bar terms of the volatility model: (log return, log open / previous close, summed term).
+        """
+        log_returns = np.log(close / prev_close)
+        open_close = np.log(open_ / prev_close)
+        if self.volatility_model == "Parkinson":
+            term = np.log(high / low) ** 2
+        elif self.volatility_model == "GarmanKlass":
+            term = 0.5 * (np.log(high / low)**2) - (2 * np.log(2) - 1) * (np.log(close / open_)**2)
+        elif self.volatility_model in ("RogersSatchell", "YangZhang"):
+            term = np.log(high / close) * np.log(high / open_) + np.log(low / close) * np.log(low / open_)
+        else:
+            term = None
+        return log_returns, open_close, term
+
+    def _volatility(self, log_returns_var, open_close_var, term_sum):
+        window = self.window
+        if self.volatility_model == "CloseToClose":
+            return np.sqrt(log_returns_var) * np.sqrt(window)
+        if self.volatility_model == "Parkinson":
+            return np.sqrt(term_sum / window / (4 * np.log(2)))
+        if self.volatility_model in ("GarmanKlass", "RogersSatchell"):
+            return term_sum ** 0.5
+        k = 0.34 / (1.34 + (window + 1)/(window - 1))
+        return np.sqrt((1 - k) * open_close_var + k * (term_sum / window) + log_returns_var)
+
+    def update(self, bar):
+        open_ = np.float64(bar["Open"]) if self.volatility_model != "CloseToClose" else NAN
+        high = np.float64(bar["High"]) if self.volatility_model != "CloseToClose" else NAN
+        low = np.float64(bar["Low"]) if self.volatility_model != "CloseToClose" else NAN
+        close = np.float64(bar["Close"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_returns, open_close, term = self._terms(open_, high, low, close, self._prev_close)
+            self._prev_close = close
+            log_returns_var = self._log_returns.update(log_returns)
+            open_close_var = self._open_close.update(open_close) if self.volatility_model == "YangZhang" else NAN
+            term_sum = self._term.update(term) if term is not None else NAN
+            volatility = self._volatility(log_returns_var, open_close_var, term_sum)
+        sma = self._close.update(close) / self.window
+        return {"Realised_Volatility": volatility, "SMA": sma,
+                "Upper_Band": sma + (2 * volatility), "Lower_Band": sma - (2 * volatility)}
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        close = _values(dataframe, "Close")
+        prev_close = _shift(close)
+        if self.volatility_model == "CloseToClose":
+            open_ = high = low = np.full_like(close, np.nan)
+        else:
+            open_, high, low = _values(dataframe, "Open"), _values(dataframe, "High"), _values(dataframe, "Low")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_returns, open_close, term = self._terms(open_, high, low, close, prev_close)
+        self._log_returns.warm_start(log_returns)
+        if self.volatility_model == "YangZhang":
+            self._open_close.warm_start(open_close)
+        if term is not None:
+            self._term.warm_start(term)
+        self._close.warm_start(close)
+        if len(close):
+            self._prev_close = close[-1]
+        return self
+
+
+class StreamingInverseRSI:
+    """
+    Threshold closing price to reach a target RSI, streaming counterpart of inverse_RSI_series.
+    The sums follow engine.py rather than pandas rolling, so the values match the batch series up to rounding.
+
+    window int: size of the rolling window for RSI
+    target_rsi float: desired RSI value to achieve
+    """
+
+    def __init__(self, window: int = 14, target_rsi: float = 50):
+        self.window = window
+        self.target_rsi = target_rsi
+        self._prev_close = NAN
+        self._gain = _RollingSum(window)
+        self._loss = _RollingSum(window)
+
+    def update(self, bar):
+        close = np.float64(bar["Close"])
+        delta = close - self._prev_close
+        self._prev_close = close
+        avg_gain = self._gain.update(delta if delta > 0 else np.float64(0.0)) / self.window
+        avg_loss = self._loss.update(-delta if delta < 0 else np.float64(0.0)) / self.window
+        target_rs = (100 - self.target_rsi) / self.target_rsi
+        price_change_needed = (target_rs * avg_loss * self.window) - (avg_gain * (self.window - 1))
+        return NAN if avg_loss == 0 else close + price_change_needed
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        close = _values(dataframe, "Close")
+        delta = close - _shift(close)
+        self._gain.warm_start(np.where(delta > 0, delta, 0))
+        self._loss.warm_start(np.where(delta < 0, -delta, 0))
+        if len(close):
+            self._prev_close = close[-1]
+        return self
+
+
+class StreamingInverseBollingerBands:
+    """
+    Threshold closing price to reach a Bollinger Band, streaming counterpart of inverse_Bollinger_Bands_series,
+    up to rounding as StreamingInverseRSI.
+
+    window int: size of the rolling window
+    target_band str: 'upper' or 'lower'
+    target_std float: number of standard deviations of the band
+    """
+
+    def __init__(self, window: int = 14, target_band: str = 'upper', target_std: float = 2.0):
+        if target_band not in ('upper', 'lower'):
+            raise ValueError("target_band must be either 'upper' or 'lower'")
+        self.window = window
+        self._sign = 1 if target_band == 'upper' else -1
+        self.target_std = target_std
+        self._close = _RollingSum(window)
+        self._var = _RollingVar(window)
+
+    def update(self, bar):
+        close = np.float64(bar["Close"])
+        sma = self._close.update(close) / self.window
+        return sma + self._sign * self.target_std * np.sqrt(self._var.update(close))
+
+    def warm_start(self, dataframe: pd.DataFrame):
+        close = _values(dataframe, "Close")
+        self._close.warm_start(close)
+        self._var.warm_start(close)
+        return self
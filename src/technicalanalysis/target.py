@@ -1,87 +1,221 @@
 import pandas as pd
 import numpy as np
 
+from src.technicalanalysis.engine import IndicatorEngine
+
+def _tail(dataframe: pd.DataFrame, rows: int):
+    """
+    Engine over the last rows of dataframe: the latest-bar targets never read further back,
+    so their cost does not grow with the length of the history.
+    """
+    return IndicatorEngine(dataframe.iloc[-rows:])
+
+
+def _last_rows(values, rows: int):
+    """
+    The last rows of values (T or T x N), with NaN rows on top when the history is shorter.
+    """
+    if len(values) >= rows:
+        return values[len(values) - rows:]
+    return np.concatenate([np.full((rows - len(values),) + values.shape[1:], np.nan), values])
+
+
+def _latest(engine: IndicatorEngine, values):
+    """
+    A scalar for a single frame, a Series indexed by symbol for a panel.
+    """
+    if engine.is_panel:
+        return pd.Series(values, index=engine.symbols)
+    return np.float64(values)
+
+
 def inverse_RSI(dataframe: pd.DataFrame, window: int = 14, target_rsi: float = 50):
     """
     Compute the threshold closing price needed to reach a target RSI value.
+    Only the last window + 1 rows are read; a (field, symbol) panel gives one price per symbol.
 
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window for RSI
     target_rsi float: desired RSI value to achieve
     """
-    if 'Close' not in dataframe.columns:
+    if not isinstance(dataframe.columns, pd.MultiIndex) and 'Close' not in dataframe.columns:
         raise ValueError("DataFrame must contain a 'Close' column.")
 
-    delta = dataframe['Close'].diff()
-    gain = np.where(delta > 0, delta, 0)
-    loss = np.where(delta < 0, -delta, 0)
-
-    avg_gain = pd.Series(gain).rolling(window=window).mean().iloc[-1]
-    avg_loss = pd.Series(loss).rolling(window=window).mean().iloc[-1]
+    engine = _tail(dataframe, window + 1)
+    close = engine.array('Close')
+    delta = np.diff(close, axis=0, prepend=np.nan)
+    gain = _last_rows(np.where(delta > 0, delta, 0), window)
+    loss = _last_rows(np.where(delta < 0, -delta, 0), window)
 
-    if avg_loss == 0:
-        return np.nan  # Cannot compute RSI if avg_loss is zero
+    avg_gain = gain.mean(axis=0)
+    avg_loss = loss.mean(axis=0)
 
     target_rs = (100 - target_rsi) / target_rsi
     required_avg_gain = target_rs * avg_loss
 
     # Calculate the necessary price change to reach the target RSI
     price_change_needed = (required_avg_gain * window) - (avg_gain * (window - 1))
-    threshold_price = dataframe['Close'].iloc[-1] + price_change_needed
+    # Cannot compute RSI if avg_loss is zero
+    threshold_price = np.where(avg_loss == 0, np.nan, close[-1] + price_change_needed)
 
-    return threshold_price
+    return _latest(engine, threshold_price)
 
 
 def inverse_Bollinger_Bands(dataframe: pd.DataFrame, window: int = 14, target_band: str = 'upper', target_std: float = 2.0):
     """
     Compute the threshold closing price needed to reach the target Bollinger Band.
+    Only the last window rows are read; a (field, symbol) panel gives one price per symbol.
 
     target_band str: 'upper' or 'lower'
     """
-    sma = dataframe['Close'].rolling(window=window).mean().iloc[-1]
-    std = dataframe['Close'].rolling(window=window).std().iloc[-1]
+    if target_band not in ('upper', 'lower'):
+        raise ValueError("target_band must be either 'upper' or 'lower'")
+
+    engine = _tail(dataframe, window)
+    close = _last_rows(engine.array('Close'), window)
+    sma = close.mean(axis=0)
+    std = close.std(axis=0, ddof=1)
 
     if target_band == 'upper':
         threshold_price = sma + target_std * std
-    elif target_band == 'lower':
-        threshold_price = sma - target_std * std
     else:
-        raise ValueError("target_band must be either 'upper' or 'lower'")
+        threshold_price = sma - target_std * std
 
-    return threshold_price
+    return _latest(engine, threshold_price)
 
 
 def inverse_ATR(dataframe: pd.DataFrame, window: int = 14):
     """
     Compute the price change needed to match the current ATR value.
+    Only the last window + 1 rows are read; a (field, symbol) panel gives one price per symbol.
+    """
+    engine = _tail(dataframe, window + 1)
+    high, low, prev_close = engine.array('High'), engine.array('Low'), engine.shift('Close')
+
+    # the first bar has no previous close, its true range is High - Low
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    atr = _last_rows(tr, window).mean(axis=0)
+
+    return _latest(engine, engine.array('Close')[-1] + atr)
+
+
+def inverse_Stochastic_Oscillator(dataframe: pd.DataFrame, window: int = 14, target: str = '%K',
+                                  target_value: float = 50):
+    """
+    Compute the price needed to achieve a target %K or %D value in the Stochastic Oscillator.
+    Only the last max(window, 3) rows are read and dataframe is left untouched;
+    a (field, symbol) panel gives one price per symbol.
+
+    target str: '%K' or '%D'
+    target_value float: Desired value for %K or %D
+    """
+    if target not in ('%K', '%D'):
+        raise ValueError("target must be either '%K' or '%D'")
+
+    engine = _tail(dataframe, max(window, 3))
+    lowest_low = _last_rows(engine.array('Low'), window).min(axis=0)
+    highest_high = _last_rows(engine.array('High'), window).max(axis=0)
+
+    if target == '%K':
+        threshold_price = lowest_low + ((target_value / 100) * (highest_high - lowest_low))
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = 100 * ((_last_rows(engine.array('Close'), 3) - lowest_low) / (highest_high - lowest_low))
+        threshold_price = k.mean(axis=0)
+
+    return _latest(engine, threshold_price)
+
+
+def inverse_RSI_series(dataframe: pd.DataFrame, window: int = 14, target_rsi: float = 50):
+    """
+    Threshold closing price to reach a target RSI for every bar at once:
+    the value at bar i is inverse_RSI(dataframe.iloc[:i+1], window, target_rsi).
+
+    dataframe pd.DataFrame: source of data
+    window int: size of the rolling window for RSI
+    target_rsi float: desired RSI value to achieve
+    returns pd.Series: threshold price per bar, aligned on the index of dataframe
+    """
+    if 'Close' not in dataframe.columns:
+        raise ValueError("DataFrame must contain a 'Close' column.")
+
+    close = dataframe['Close'].to_numpy(dtype=float)
+    delta = dataframe['Close'].diff().to_numpy()
+    gain = np.where(delta > 0, delta, 0)
+    loss = np.where(delta < 0, -delta, 0)
+
+    avg_gain = pd.Series(gain).rolling(window=window).mean().to_numpy()
+    avg_loss = pd.Series(loss).rolling(window=window).mean().to_numpy()
+
+    target_rs = (100 - target_rsi) / target_rsi
+    required_avg_gain = target_rs * avg_loss
+    price_change_needed = (required_avg_gain * window) - (avg_gain * (window - 1))
+    threshold_price = np.where(avg_loss == 0, np.nan, close + price_change_needed)
+
+    return pd.Series(threshold_price, index=dataframe.index, name='Inverse_RSI')
+
+
+def inverse_Bollinger_Bands_series(dataframe: pd.DataFrame, window: int = 14, target_band: str = 'upper',
+                                   target_std: float = 2.0):
+    """
+    Threshold closing price to reach the target Bollinger Band for every bar at once:
+    the value at bar i is inverse_Bollinger_Bands(dataframe.iloc[:i+1], ...).
+
+    target_band str: 'upper' or 'lower'
+    returns pd.Series: threshold price per bar, aligned on the index of dataframe
+    """
+    if target_band not in ('upper', 'lower'):
+        raise ValueError("target_band must be either 'upper' or 'lower'")
+
+    sma = dataframe['Close'].rolling(window=window).mean()
+    std = dataframe['Close'].rolling(window=window).std()
+    threshold_price = sma + target_std * std if target_band == 'upper' else sma - target_std * std
+
+    return threshold_price.rename('Inverse_Bollinger_Bands')
+
+
+def inverse_ATR_series(dataframe: pd.DataFrame, window: int = 14):
+    """
+    Close plus the current ATR for every bar at once: the value at bar i is inverse_ATR(dataframe.iloc[:i+1], window).
+
+    returns pd.Series: threshold price per bar, aligned on the index of dataframe
     """
     high_low = dataframe['High'] - dataframe['Low']
     high_close = abs(dataframe['High'] - dataframe['Close'].shift(1))
     low_close = abs(dataframe['Low'] - dataframe['Close'].shift(1))
 
     tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    atr = tr.rolling(window=window).mean().iloc[-1]
+    atr = tr.rolling(window=window).mean()
 
-    return dataframe['Close'].iloc[-1] + atr
+    return (dataframe['Close'] + atr).rename('Inverse_ATR')
 
 
-def inverse_Stochastic_Oscillator(dataframe: pd.DataFrame, window: int = 14, target: str = '%K',
-                                  target_value: float = 50):
+def inverse_Stochastic_Oscillator_series(dataframe: pd.DataFrame, window: int = 14, target: str = '%K',
+                                         target_value: float = 50):
     """
-    Compute the price needed to achieve a target %K or %D value in the Stochastic Oscillator.
+    Price for a target %K or %D value for every bar at once:
+    the value at bar i is inverse_Stochastic_Oscillator(dataframe.iloc[:i+1], ...).
+    For '%D' the last three closes are rescaled with the range of bar i, as the single-bar function does;
+    their mean is taken directly, so it can differ from the rolling mean of the single-bar function by rounding.
 
     target str: '%K' or '%D'
     target_value float: Desired value for %K or %D
+    returns pd.Series: threshold per bar, aligned on the index of dataframe
     """
-    lowest_low = dataframe['Low'].rolling(window=window).min().iloc[-1]
-    highest_high = dataframe['High'].rolling(window=window).max().iloc[-1]
+    lowest_low = dataframe['Low'].rolling(window=window).min().to_numpy()
+    highest_high = dataframe['High'].rolling(window=window).max().to_numpy()
 
     if target == '%K':
         threshold_price = lowest_low + ((target_value / 100) * (highest_high - lowest_low))
     elif target == '%D':
-        dataframe['%K'] = 100 * ((dataframe['Close'] - lowest_low) / (highest_high - lowest_low))
-        threshold_price = dataframe['%K'].rolling(window=3).mean().iloc[-1]
+        close = dataframe['Close'].to_numpy(dtype=float)
+        threshold_price = np.full(len(close), np.nan)
+        if len(close) >= 3:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                k = [100 * ((close[lag:len(close) - 2 + lag] - lowest_low[2:]) / (highest_high[2:] - lowest_low[2:]))
+                     for lag in range(3)]
+            threshold_price[2:] = (k[0] + k[1] + k[2]) / 3
     else:
         raise ValueError("target must be either '%K' or '%D'")
 
-    return threshold_price
+    return pd.Series(threshold_price, index=dataframe.index, name=f'Inverse_{target}')
@@ -1,156 +1,233 @@
 """
 Functions to transform time series of OHLCV
+
+Every indicator also accepts a panel of symbols in place of dataframe: a frame
+with (field, symbol) MultiIndex columns (see to_panel), a dict of (T x N) arrays
+keyed by field, or a (T x N) array of closes. Panels are computed in one
+vectorised call and returned as a new frame (or a dict of arrays) instead of
+being modified in place.
+
+By default an indicator adds its outputs, and the intermediates it needs
+(Log_Returns, TR, Lowest_Low, ...), as columns of dataframe. output='frame'
+returns a new frame and output='arrays' a dict of arrays holding only the
+indicator outputs, leaving dataframe untouched; dtype=np.float32 computes them
+in single precision to halve the memory of bulk studies.
+
+Inside shared_indicators(dataframe), repeated calls on the same dataframe with
+the same parameters (one per grid point of a parameter sweep) compute each
+indicator once. src/signal/strategy.py fills the same store from the indicators
+several strategies declare.
 """
+from contextlib import contextmanager
+
 import pandas as pd
 import numpy as np
+from src.technicalanalysis.engine import IndicatorEngine, compute_indicators, assign_outputs, ewm_spans, to_panel, \
+    normalise_spec
+
+# id(dataframe) -> {(spec, output, dtype): outputs}, filled inside shared_indicators
+_shared_outputs = {}
+
+@contextmanager
+def shared_indicators(dataframe, outputs: dict = None):
+    """
+    Memoise the indicators computed on dataframe for the duration of the block.
+    Only columns derived by the indicators and signals may be added to dataframe meanwhile:
+    its source columns must not change.
+    outputs dict: store to use, keyed by indicator_key, to share outputs between copies of the same frame
+    """
+    _shared_outputs[id(dataframe)] = {} if outputs is None else outputs
+    try:
+        yield dataframe
+    finally:
+        del _shared_outputs[id(dataframe)]
+
+def indicator_key(spec: dict, output: str = "inplace", dtype=np.float64):
+    """
+    Key of the outputs of spec in the shared_indicators store, None for specs holding arrays (EMA times)
+    """
+    spec = normalise_spec(spec)
+    if any(isinstance(value, (np.ndarray, pd.Series, pd.Index)) for value in spec.values()):
+        return None
+    return repr(sorted(spec.items())), output, np.dtype(dtype).str
+
+def _compute(dataframe, spec: dict, output: str, dtype):
+    if output == "inplace":
+        return compute_indicators(dataframe, [spec], dtype=dtype)
+    elif output == "frame":
+        return compute_indicators(dataframe, [spec], scratch=False, dtype=dtype)
+    elif output == "arrays":
+        return compute_indicators(dataframe, [spec], scratch=False, dtype=dtype, as_arrays=True)
+    raise ValueError("output must be 'inplace', 'frame' or 'arrays'")
+
+def _indicator(dataframe, spec: dict, output: str = "inplace", dtype=np.float64):
+    """
+    Run one indicator spec through the engine and hand back its outputs the way output asks for.
+    """
+    shared = _shared_outputs.get(id(dataframe))
+    key = None if shared is None else indicator_key(spec, output, dtype)
+    if key is None:
+        block = _compute(dataframe, spec, output, dtype)
+    else:
+        if key not in shared:
+            shared[key] = _compute(dataframe, spec, output, dtype)
+        block = shared[key]
+        if output == "inplace":
+            return assign_outputs(dataframe, block)
+        # hand out copies so that the caller cannot alter the memoised outputs
+        return {name: values.copy() for name, values in block.items()} if output == "arrays" else block.copy()
+    return assign_outputs(dataframe, block) if output == "inplace" else block
 
-def SMA(dataframe:pd.DataFrame=None, window:int=14, columns:list=None):
+def SMA(dataframe:pd.DataFrame=None, window:int=14, columns:list=None, output:str="inplace", dtype=np.float64):
     """
     Simple moving average
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window, number of rows given the dataframe
     columns list[str]: list of column names to compute sma
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    for col in columns:
-        dataframe[f"SMA_{window}_{col}"] = dataframe[col].rolling(window).mean()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "SMA", "window": window, "columns": columns}, output, dtype)
 
-def SME(dataframe:pd.DataFrame=None, window:int=14, columns:list=None):
+def SME(dataframe:pd.DataFrame=None, window:int=14, columns:list=None, output:str="inplace", dtype=np.float64):
     """
     Simple moving median
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window, number of rows given the dataframe
     columns list[str]: list of column names to compute sme
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    for col in columns:
-        dataframe[f"SME_{window}_{col}"] = dataframe[col].rolling(window).median()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "SME", "window": window, "columns": columns}, output, dtype)
 
 def EMA(dataframe:pd.DataFrame=None, window:int=14, columns:list=None,
-        com=None, span=None, halflife=None, alpha=None, min_periods=0, adjust=True, ignore_na=False, times=None):
+        com=None, span=None, halflife=None, alpha=None, min_periods=0, adjust=True, ignore_na=False, times=None,
+        output:str="inplace", dtype=np.float64):
     """
     Exponential moving average
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window, number of rows given the dataframe
     columns list[str]: list of column names to compute ema
     arguments of dataframe.ewm : https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.ewm.html
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    if window is not None:
-        span = window
-    for col in columns:
-        # default span
-        dataframe[f"EMA_{window}_{col}"] = dataframe[col].ewm(com=com, span=span, halflife=halflife, alpha=alpha,
-        min_periods=min_periods, adjust=False, ignore_na=ignore_na, times=times).mean()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "EMA", "window": window, "columns": columns,
+                                  "com": com, "span": span, "halflife": halflife, "alpha": alpha,
+                                  "min_periods": min_periods, "ignore_na": ignore_na, "times": times},
+                      output, dtype)
 
-def volume_moving_average(dataframe: pd.DataFrame, window: int = 14):
+def SMA_windows(dataframe: pd.DataFrame, windows: list, column: str = "Close"):
+    """
+    Simple moving averages of one column for a grid of windows, without adding columns to dataframe
+    dataframe pd.DataFrame: source of data
+    windows list[int]: sizes of the rolling windows
+    column str: column name to compute sma
+    returns np.ndarray: (len(dataframe) x len(windows)), column j equals SMA_{windows[j]}_{column}
+    """
+    engine = IndicatorEngine(dataframe)
+    return engine.rolling_means(column, engine.array(column), windows)
+
+def EMA_windows(dataframe: pd.DataFrame, windows: list, column: str = "Close"):
+    """
+    Exponential moving averages (span=window, adjust=False) of one column for a grid of windows
+    dataframe pd.DataFrame: source of data
+    windows list[int]: spans of the averages
+    column str: column name to compute ema
+    returns np.ndarray: (len(dataframe) x len(windows)), column j equals EMA_{windows[j]}_{column} up to rounding
+    """
+    return ewm_spans(IndicatorEngine(dataframe).array(column), windows)
+
+def volume_moving_average(dataframe: pd.DataFrame, window: int = 14, output: str = "inplace", dtype=np.float64):
     """
     Calculate the moving average of trading volume.
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    dataframe['Volume_MA'] = dataframe['Volume'].rolling(window=window).mean()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "volume_moving_average", "window": window}, output, dtype)
 
-def realised_volatility(dataframe: pd.DataFrame, window: int = 14, model: str = "CloseToClose"):
+def realised_volatility(dataframe: pd.DataFrame, window: int = 14, model: str = "CloseToClose",
+                        output: str = "inplace", dtype=np.float64):
     """
     Rolling realised volatility
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window
     model str: formula used for the realised volatility ('CloseToClose', 'Parkinson', 'GarmanKlass', 'RogersSatchell', 'YangZhang')
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    if model == "CloseToClose":
-        dataframe['Log_Returns'] = np.log(dataframe['Close'] / dataframe['Close'].shift(1))
-        dataframe['Realised_Volatility'] = dataframe['Log_Returns'].rolling(window=window).std() * np.sqrt(window)
-    elif model == "Parkinson":
-        dataframe['Range'] = np.log(dataframe['High'] / dataframe['Low'])
-        dataframe['Realised_Volatility'] = dataframe['Range'].rolling(window=window).apply(lambda x: np.sqrt((x**2).mean() / (4 * np.log(2))))
-    elif model == "GarmanKlass":
-        dataframe['GK'] = 0.5 * (np.log(dataframe['High'] / dataframe['Low'])**2) - (2 * np.log(2) - 1) * (np.log(dataframe['Close'] / dataframe['Open'])**2)
-        dataframe['Realised_Volatility'] = dataframe['GK'].rolling(window=window).sum() ** 0.5
-    elif model == "RogersSatchell":
-        dataframe['RS'] = (np.log(dataframe['High'] / dataframe['Close']) * np.log(dataframe['High'] / dataframe['Open'])) + \
-                           (np.log(dataframe['Low'] / dataframe['Close']) * np.log(dataframe['Low'] / dataframe['Open']))
-        dataframe['Realised_Volatility'] = dataframe['RS'].rolling(window=window).sum() ** 0.5
-    elif model == "YangZhang":
-        dataframe['Open_Close'] = np.log(dataframe['Open'] / dataframe['Close'].shift(1))
-        dataframe['Close_Close'] = np.log(dataframe['Close'] / dataframe['Close'].shift(1))
-        dataframe['RS'] = (np.log(dataframe['High'] / dataframe['Close']) * np.log(dataframe['High'] / dataframe['Open'])) + \
-                           (np.log(dataframe['Low'] / dataframe['Close']) * np.log(dataframe['Low'] / dataframe['Open']))
-        k = 0.34 / (1.34 + (window + 1)/(window - 1))
-        dataframe['YZ'] = (1 - k) * dataframe['Open_Close'].rolling(window=window).var() + \
-                          k * dataframe['RS'].rolling(window=window).mean() + \
-                          dataframe['Close_Close'].rolling(window=window).var()
-        dataframe['Realised_Volatility'] = np.sqrt(dataframe['YZ'])
-    return dataframe
-
-def RSI(dataframe: pd.DataFrame, window: int = 14):
+    return _indicator(dataframe, {"indicator": "realised_volatility", "window": window, "model": model}, output, dtype)
+
+def realised_volatilities(dataframe: pd.DataFrame, window: int = 14, models: list = None,
+                          output: str = "inplace", dtype=np.float64):
     """
-    Relative strength index
+    Several rolling realised volatility estimators in one pass, sharing their log terms and rolling sums
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window
+    models list[str]: subset of ('CloseToClose', 'Parkinson', 'GarmanKlass', 'RogersSatchell', 'YangZhang'), all by default
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
+    returns one Realised_Volatility_{model} column per model
     """
-    delta = dataframe['Close'].diff()
-    gain = np.where(delta > 0, delta, 0)
-    loss = np.where(delta < 0, -delta, 0)
+    return _indicator(dataframe, {"indicator": "realised_volatilities", "window": window, "models": models},
+                      output, dtype)
 
-    avg_gain = pd.Series(gain).rolling(window=window).mean()
-    avg_loss = pd.Series(loss).rolling(window=window).mean()
-
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    rsi.index = dataframe.index
-    dataframe[f'RSI_{window}'] = rsi
-    return dataframe
+def RSI(dataframe: pd.DataFrame, window: int = 14, output: str = "inplace", dtype=np.float64):
+    """
+    Relative strength index
+    dataframe pd.DataFrame: source of data
+    window int: size of the rolling window
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
+    """
+    return _indicator(dataframe, {"indicator": "RSI", "window": window}, output, dtype)
 
-def Bollinger_Bands(dataframe: pd.DataFrame, window: int = 14, volatility_model: str = "CloseToClose"):
+def Bollinger_Bands(dataframe: pd.DataFrame, window: int = 14, volatility_model: str = "CloseToClose",
+                    output: str = "inplace", dtype=np.float64):
     """
     Bollinger Bands with selectable volatility model
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window
     volatility_model str: model used for volatility calculation ('CloseToClose', 'Parkinson', 'GarmanKlass', 'RogersSatchell', 'YangZhang')
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    dataframe = realised_volatility(dataframe, window=window, model=volatility_model)
-    dataframe['SMA'] = dataframe['Close'].rolling(window=window).mean()
-    dataframe['Upper_Band'] = dataframe['SMA'] + (2 * dataframe['Realised_Volatility'])
-    dataframe['Lower_Band'] = dataframe['SMA'] - (2 * dataframe['Realised_Volatility'])
-    return dataframe
+    return _indicator(dataframe, {"indicator": "Bollinger_Bands", "window": window,
+                                  "volatility_model": volatility_model}, output, dtype)
 
-def MACD(dataframe: pd.DataFrame, short_window: int = 12, long_window: int = 26, signal_window: int = 9):
+def MACD(dataframe: pd.DataFrame, short_window: int = 12, long_window: int = 26, signal_window: int = 9,
+         output: str = "inplace", dtype=np.float64):
     """
     Moving Average Convergence Divergence
     dataframe pd.DataFrame: source of data
     short_window int: period for the short-term EMA
     long_window int: period for the long-term EMA
     signal_window int: period for the signal line
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    dataframe['EMA_short'] = dataframe['Close'].ewm(span=short_window, adjust=False).mean()
-    dataframe['EMA_long'] = dataframe['Close'].ewm(span=long_window, adjust=False).mean()
-    dataframe['MACD'] = dataframe['EMA_short'] - dataframe['EMA_long']
-    dataframe['Signal_Line'] = dataframe['MACD'].ewm(span=signal_window, adjust=False).mean()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "MACD", "short_window": short_window,
+                                  "long_window": long_window, "signal_window": signal_window}, output, dtype)
 
-def ATR(dataframe: pd.DataFrame, window: int = 14):
+def ATR(dataframe: pd.DataFrame, window: int = 14, output: str = "inplace", dtype=np.float64):
     """
     Average True Range
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    dataframe['TR'] = np.maximum((dataframe['High'] - dataframe['Low']),
-                                 np.maximum(abs(dataframe['High'] - dataframe['Close'].shift(1)),
-                                            abs(dataframe['Low'] - dataframe['Close'].shift(1))))
-    dataframe['ATR'] = dataframe['TR'].rolling(window=window).mean()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "ATR", "window": window}, output, dtype)
 
-def Stochastic_Oscillator(dataframe: pd.DataFrame, window: int = 14):
+def Stochastic_Oscillator(dataframe: pd.DataFrame, window: int = 14, output: str = "inplace", dtype=np.float64):
     """
     Stochastic Oscillator
     dataframe pd.DataFrame: source of data
     window int: size of the rolling window
+    output str: 'inplace', 'frame' or 'arrays' (see module docstring)
+    dtype: np.float64 or np.float32
     """
-    dataframe['Lowest_Low'] = dataframe['Low'].rolling(window=window).min()
-    dataframe['Highest_High'] = dataframe['High'].rolling(window=window).max()
-    dataframe['%K'] = 100 * ((dataframe['Close'] - dataframe['Lowest_Low']) / (dataframe['Highest_High'] - dataframe['Lowest_Low']))
-    dataframe['%D'] = dataframe['%K'].rolling(window=3).mean()
-    return dataframe
+    return _indicator(dataframe, {"indicator": "Stochastic_Oscillator", "window": window}, output, dtype)
 
 def fibonacci_retracement(high: float, low: float):
     """
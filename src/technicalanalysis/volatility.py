@@ -0,0 +1,94 @@
+"""
+Realised volatility estimators over the arrays of an IndicatorEngine
+
+The log terms (log(High/Low), log(Close/Open), log(High/Close), ...) are computed
+once per engine and shared by every estimator. The rolling sums and means come
+from the engine's cumulative-sum kernel and the rolling variances from its
+windowed Welford kernel (kernels.rolling_var), all cached by the engine, so
+asking for several models costs little more than asking for one.
+"""
+import numpy as np
+
+MODELS = ("CloseToClose", "Parkinson", "GarmanKlass", "RogersSatchell", "YangZhang")
+
+
+def log_ratio(engine, numerator: str, denominator: str):
+    """
+    log(numerator / denominator) of two columns, computed once per engine.
+    """
+    return engine.cached(("log", numerator, denominator),
+                         lambda: np.log(engine.array(numerator) / engine.array(denominator)))
+
+
+def log_returns(engine):
+    """
+    Close to previous close log returns.
+    """
+    return engine.cached("Log_Returns", lambda: np.log(engine.array("Close") / engine.shift("Close")))
+
+
+def log_open_close(engine):
+    """
+    Open to previous close log returns (overnight gap).
+    """
+    return engine.cached("Open_Close", lambda: np.log(engine.array("Open") / engine.shift("Close")))
+
+
+def parkinson_term(engine):
+    return engine.cached("Range_sq", lambda: log_ratio(engine, "High", "Low") ** 2)
+
+
+def garman_klass_term(engine):
+    return engine.cached("GK", lambda: 0.5 * (log_ratio(engine, "High", "Low")**2) -
+                                       (2 * np.log(2) - 1) * (log_ratio(engine, "Close", "Open")**2))
+
+
+def rogers_satchell_term(engine):
+    return engine.cached("RS", lambda: log_ratio(engine, "High", "Close") * log_ratio(engine, "High", "Open") +
+                                       log_ratio(engine, "Low", "Close") * log_ratio(engine, "Low", "Open"))
+
+
+def estimate(engine, window: int = 14, model: str = "CloseToClose"):
+    """
+    One estimator, returned with its per-bar terms as the legacy realised_volatility columns.
+
+    window int: size of the rolling window
+    model str: 'CloseToClose', 'Parkinson', 'GarmanKlass', 'RogersSatchell' or 'YangZhang'
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if model == "CloseToClose":
+            returns = log_returns(engine)
+            return {"Log_Returns": returns,
+                    "Realised_Volatility": engine.rolling_std("Log_Returns", returns, window) * np.sqrt(window)}
+        elif model == "Parkinson":
+            range_sq = parkinson_term(engine)
+            return {"Range": log_ratio(engine, "High", "Low"),
+                    "Realised_Volatility": np.sqrt(engine.rolling_mean("Range_sq", range_sq, window) / (4 * np.log(2)))}
+        elif model == "GarmanKlass":
+            gk = garman_klass_term(engine)
+            return {"GK": gk, "Realised_Volatility": engine.rolling_sum("GK", gk, window) ** 0.5}
+        elif model == "RogersSatchell":
+            rs = rogers_satchell_term(engine)
+            return {"RS": rs, "Realised_Volatility": engine.rolling_sum("RS", rs, window) ** 0.5}
+        elif model == "YangZhang":
+            open_close = log_open_close(engine)
+            close_close = log_returns(engine)
+            rs = rogers_satchell_term(engine)
+            k = 0.34 / (1.34 + (window + 1)/(window - 1))
+            yz = (1 - k) * engine.rolling_var("Open_Close", open_close, window) + \
+                 k * engine.rolling_mean("RS", rs, window) + \
+                 engine.rolling_var("Log_Returns", close_close, window)
+            return {"Open_Close": open_close, "Close_Close": close_close, "RS": rs, "YZ": yz,
+                    "Realised_Volatility": np.sqrt(yz)}
+    raise ValueError(f"Unknown volatility model '{model}', expected one of {MODELS}")
+
+
+def estimate_all(engine, window: int = 14, models: list = None):
+    """
+    Several estimators at once, as {f"Realised_Volatility_{model}": array}.
+
+    window int: size of the rolling window
+    models list[str]: subset of MODELS, all of them by default
+    """
+    return {f"Realised_Volatility_{model}": estimate(engine, window, model)["Realised_Volatility"]
+            for model in (MODELS if models is None else models)}
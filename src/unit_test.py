@@ -1,9 +1,34 @@
+import contextlib
+import io
 import unittest
 import pandas as pd
-from src.signal.Volume_Price_divergence import price_volume_divergence_signal
-from src.backtest.Volume_Price_divergence import calculate_sharpe_ratio
-from src.technicalanalysis.technicalanalysis import fibonacci_retracement
-from src.technicalanalysis.target import inverse_Bollinger_Bands, inverse_ATR, inverse_Stochastic_Oscillator
+import numpy as np
+from src.signal.Volume_Price_divergence import price_volume_divergence_signal, price_volume_divergence_signals
+from src.signal.Moving_Average_Crossover import crossover_signal, ma_crossover_signal, ma_crossover_signal_grid
+from src.signal.RSI_p import RSI_quantile_bands, RSI_distrib
+from src.signal.state_machine import run_state_machine
+from src.signal.RSI_Two_Periods import rsi_sma_signal, rsi_sma_signal_grid
+from src.signal.encoding import BUY, SELL, HOLD, signal_labels, encode_signals
+from src.signal.strategy import strategy, plan_strategies, run_strategies
+from src.signal.streaming import stream_ma_crossover_signal, stream_price_volume_divergence_signal, \
+    stream_rsi_sma_signal, stream_RSI_distrib
+from src.signal.RSI_p import RSI_distrib
+from src.signal.scan import scan
+from src.signal.Relative_Strength_Index import rsi_signal
+from src.backtest.Volume_Price_divergence import calculate_sharpe_ratio, window_study
+from src.backtest import sweep as sweep_module
+from src.backtest.sweep import sweep, signal_metrics
+from src.backtest.Backtest_class import BacktestSingleStock, BacktestPortfolio
+from src.backtest.core import run_backtest
+from src.backtest.metrics import performance_metrics, max_drawdown, calculate_sharpe_ratio as sharpe_ratio
+from src.technicalanalysis.technicalanalysis import fibonacci_retracement, SMA, EMA, RSI, ATR, Stochastic_Oscillator, \
+    SMA_windows, EMA_windows, to_panel, realised_volatility, realised_volatilities, shared_indicators
+from src.technicalanalysis.engine import compute_indicators, IndicatorEngine
+from src.technicalanalysis.streaming import StreamingSMA, StreamingRSI, StreamingATR, StreamingStochasticOscillator
+from src.technicalanalysis import kernels
+from src.technicalanalysis.order_statistics import RollingQuantile, rolling_quantiles
+from src.technicalanalysis.target import inverse_Bollinger_Bands, inverse_ATR, inverse_Stochastic_Oscillator, \
+    inverse_RSI, inverse_RSI_series, inverse_Bollinger_Bands_series, inverse_ATR_series, inverse_Stochastic_Oscillator_series
 
 class TestTechnicalAnalysis(unittest.TestCase):
 
@@ -19,7 +44,171 @@ class TestTechnicalAnalysis(unittest.TestCase):
     def test_volume_price_divergence_signal(self):
         df = price_volume_divergence_signal(self.example_data, window=3)
         self.assertIn('Signal', df.columns)
-        self.assertTrue(all(signal in ["Buy", "Sell", "Hold"] for signal in df['Signal']))
+        self.assertEqual(df['Signal'].dtype, np.int8)
+        self.assertTrue(all(signal in [BUY, SELL, HOLD] for signal in df['Signal']))
+
+    def test_volume_price_divergence_windows(self):
+        df = self.example_data.copy()
+        signals = price_volume_divergence_signals(df, [2, 3, 5])
+        for window in (2, 3, 5):
+            expected = price_volume_divergence_signal(df.copy(), window=window)['Signal']
+            np.testing.assert_array_equal(signals[window].to_numpy(), expected.to_numpy())
+            price_change, volume_change = df['Close'].diff(), df['Volume'].rolling(window).mean().diff()
+            np.testing.assert_array_equal(expected == SELL, (price_change > 0) & (volume_change < 0))
+            np.testing.assert_array_equal(expected == BUY, (price_change < 0) & (volume_change > 0))
+        self.assertEqual(list(window_study(df, [2, 3, 5]).index), [2, 3, 5])
+
+    def test_crossover_signal(self):
+        df = pd.DataFrame({'Fast': [np.nan, 1, 3, 2, 2, 1, np.nan, 3], 'Slow': [2, 2, 2, 2, 3, 2, 2, 2]})
+        signals = crossover_signal(df, 'Fast', 'Slow')
+        self.assertEqual(list(signal_labels(signals)), ["Hold", "Hold", "Buy", "Hold", "Sell", "Hold", "Hold", "Hold"])
+
+    def test_encode_signals(self):
+        df = pd.DataFrame({'Signal': ["Hold", "Buy", "Sell"], 'Execute': [None, 101.5, 99.0], 'Quantity': [0, 1, 1]})
+        encode_signals(df)
+        self.assertEqual(list(df['Signal']), [HOLD, BUY, SELL])
+        self.assertEqual(df['Signal'].dtype, np.int8)
+        self.assertTrue(np.isnan(df['Execute'].iloc[0]))
+        self.assertEqual(df['Quantity'].dtype, np.float64)
+        with self.assertRaises(ValueError):
+            encode_signals(pd.DataFrame({'Signal': ["Hold", "Short"]}))
+
+    def test_RSI_quantile_bands(self):
+        bands = RSI_quantile_bands(self.example_data, window=3, dist_window=4, alphas=[0.2, 0.5])
+        rsi = RSI(self.example_data, window=3, output='frame')['RSI_3'].to_numpy()
+        for i in range(4, len(rsi)):
+            window = rsi[i-4:i]
+            window = window[~np.isnan(window)]
+            for alpha in [0.2, 0.5]:
+                self.assertEqual(bands[('RSI_q_low', alpha)].iloc[i], np.quantile(window, alpha / 2))
+                self.assertEqual(bands[('RSI_q_high', alpha)].iloc[i], np.quantile(window, 1 - alpha / 2))
+        # shared bands give the signals of the bands RSI_distrib builds, and are checked against its parameters
+        shared = RSI_distrib(self.example_data.copy(), alpha=0.5, window=3, dist_window=4, quantile_bands=bands)
+        own = RSI_distrib(self.example_data.copy(), alpha=0.5, window=3, dist_window=4)
+        pd.testing.assert_frame_equal(shared, own)
+        for kwargs in [dict(alpha=0.1), dict(dist_window=5), dict(window=4)]:
+            with self.assertRaises(ValueError):
+                RSI_distrib(self.example_data.copy(), **{"alpha": 0.5, "window": 3, "dist_window": 4, **kwargs},
+                            quantile_bands=bands)
+        with self.assertRaises(ValueError):
+            RSI_distrib(self.example_data.copy(), alpha=0.5, window=3, dist_window=4, quantile_bands=bands.iloc[1:])
+
+    def test_state_machine(self):
+        spec = {"start": 1, "stop": 7,
+                "long_entry": [True, True, False, True, False, True, True, True],
+                "long_exit": [False, False, True, False, True, True, True, True],
+                "long_entry_price": np.arange(8.), "long_exit_price": np.arange(8.) + 0.5,
+                "sizes": (0.1, 0.3)}
+        signals, execute, quantities = run_state_machine(8, spec)
+        np.testing.assert_array_equal(signals, [HOLD, BUY, SELL, BUY, SELL, BUY, SELL, HOLD])
+        np.testing.assert_array_equal(execute, [np.nan, 1., 2.5, 3., 4.5, 5., 6.5, np.nan])
+        np.testing.assert_array_equal(quantities, [0., 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.])
+        with self.assertRaises(ValueError):
+            run_state_machine(8, {"long_entries": spec["long_entry"]})
+
+    def test_rsi_sma_signal_grid(self):
+        df = self.example_data.copy()
+        df['Close'] = [100, 110, 120, 130, 119, 130, 140, 150, 139, 150, 160]
+        grid = rsi_sma_signal_grid(df, trend_windows=[4, 5], exit_windows=[2], rsi_windows=[2], rsi_thresholds=[20, 50])
+        self.assertEqual(len(grid), 4)
+        for (trend_window, exit_window, rsi_window, rsi_threshold), scores in grid.iterrows():
+            signals = rsi_sma_signal(df.copy(), trend_window, exit_window, rsi_window, rsi_threshold)['Signal']
+            self.assertEqual(scores['Trades'], (signals == SELL).sum())
+        self.assertGreater(grid['Trades'].max(), 0)
+
+    def test_sweep(self):
+        df = self.example_data.copy()
+        df['Close'] = [100, 110, 120, 130, 119, 130, 140, 150, 139, 150, 160]
+        with shared_indicators(df):
+            shared = SMA(df, window=3, columns=['Close'], output='arrays')
+            shared['SMA_3_Close'][:] = 0
+            np.testing.assert_array_equal(SMA(df, window=3, columns=['Close'], output='arrays')['SMA_3_Close'],
+                                          SMA(df.copy(), window=3, columns=['Close'], output='arrays')['SMA_3_Close'])
+        grid = {"trend_window": [4, 5], "exit_window": [2], "rsi_threshold": [20, 50]}
+        results = sweep(rsi_sma_signal, grid, df, processes=1)
+        self.assertEqual(len(results), 4)
+        self.assertNotIn('Signal', df.columns)
+        for _, row in results.iterrows():
+            expected = signal_metrics(rsi_sma_signal(df.copy(), int(row['trend_window']), int(row['exit_window']),
+                                                     rsi_threshold=row['rsi_threshold']))
+            self.assertEqual(row['Trades'], expected['Trades'])
+            self.assertAlmostEqual(row['Total_Return'], expected['Total_Return'])
+        pd.testing.assert_frame_equal(sweep(rsi_sma_signal, grid, df, processes=2), results)
+        # the workers map the shared block without copying it and get the non-numeric columns back in place
+        block, layout = sweep_module._share(df.assign(Tag='x'))
+        try:
+            sweep_module._attach(*layout)
+            mapped = np.ndarray(layout[1], dtype=np.float64, buffer=sweep_module._dataset[0].buf)
+            self.assertTrue(np.shares_memory(sweep_module._dataset[1]['Close'].to_numpy(), mapped))
+            np.ndarray(layout[1], dtype=np.float64, buffer=block.buf)[0, 0] = -1.
+            self.assertEqual(sweep_module._dataset[1]['Close'].iloc[0], -1.)
+            del mapped
+            self.assertEqual(list(sweep_module._dataset[1].columns), list(df.columns) + ['Tag'])
+            sweep_module._dataset[0].close()
+        finally:
+            sweep_module._dataset = None
+            block.close()
+            block.unlink()
+        pd.testing.assert_frame_equal(sweep(rsi_sma_signal, grid, df.assign(Tag='x'), processes=2), results)
+
+    def test_strategy_plan(self):
+        df = self.example_data.copy()
+        strategies = {"rsi_sma": strategy(rsi_sma_signal, trend_window=4, exit_window=2),
+                      "rsi": strategy(rsi_signal, window=2, rsi_signal_line_window=3)}
+        stages = plan_strategies(strategies)
+        self.assertEqual([len(stage) for stage in stages], [3, 1])
+        self.assertEqual(stages[1][0]['columns'], ('RSI_2',))
+        results = run_strategies(df, strategies)
+        self.assertNotIn('Signal', df.columns)
+        for name, strat in strategies.items():
+            pd.testing.assert_frame_equal(results[name], strat["signal"](df.copy(), **strat["params"]))
+        with self.assertRaises(ValueError):
+            plan_strategies({"bad": {"indicators": [{"indicator": "SMA", "window": 3, "columns": ["Missing"]}]}})
+
+    def test_streaming_signals(self):
+        rng = np.random.default_rng(0)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 300)))
+        df = pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                           'Volume': rng.integers(1, 100, 300).astype(float)})
+        bars = df.to_dict('records')
+        cases = [(ma_crossover_signal, stream_ma_crossover_signal, dict(base_line_window=3, signal_line_window=10)),
+                 (price_volume_divergence_signal, stream_price_volume_divergence_signal, dict(window=3)),
+                 (rsi_sma_signal, stream_rsi_sma_signal, dict(trend_window=20, rsi_threshold=20)),
+                 (RSI_distrib, stream_RSI_distrib, dict(window=5, dist_window=30))]
+        for batch, stream, params in cases:
+            expected = batch(df.copy(), **params)
+            streamed = pd.DataFrame(list(stream(bars, **params)))
+            self.assertGreater((expected['Signal'] != HOLD).sum(), 0)
+            # the state machine signals leave the last row of the batch on Hold
+            rows = slice(None, -1) if 'Execute' in streamed.columns else slice(None)
+            np.testing.assert_array_equal(streamed['Signal'].to_numpy()[rows], expected['Signal'].to_numpy()[rows])
+            if 'Execute' in streamed.columns:
+                np.testing.assert_allclose(streamed['Execute'].to_numpy()[rows], expected['Execute'].to_numpy()[rows],
+                                           rtol=1e-10)
+                np.testing.assert_array_equal(streamed['Quantity'].to_numpy()[rows],
+                                              expected['Quantity'].to_numpy()[rows])
+
+    def test_scan(self):
+        rng = np.random.default_rng(1)
+        index = pd.date_range('2020-01-01', periods=120)
+        universe = {}
+        for k, start in enumerate([0, 0, 40]):
+            close = 100 * np.exp(np.cumsum(rng.normal(0.001, 0.02, 120)))
+            universe[f'S{k}'] = pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+                                              'Close': close, 'Volume': rng.integers(1, 100, 120).astype(float)},
+                                             index=index).iloc[start:]
+        for function, params in [(rsi_sma_signal, dict(trend_window=20, rsi_threshold=20)),
+                                 (price_volume_divergence_signal, dict(window=3))]:
+            triggered = scan(universe, function, lookback=None, chunk_size=2, **params)
+            self.assertGreater(len(triggered), 0)
+            for symbol, dataframe in universe.items():
+                expected = function(dataframe.copy(), **params)['Signal'].iloc[:-1]
+                expected = expected[expected != HOLD]
+                found = triggered['Signal'][triggered.index.get_level_values('Symbol') == symbol].droplevel('Symbol')
+                pd.testing.assert_series_equal(found[found.index < index[-1]], expected, check_names=False,
+                                               check_freq=False)
+        latest = scan(universe, rsi_sma_signal, trend_window=20, rsi_threshold=20)
+        self.assertTrue((latest.index.get_level_values(0) == index[-1]).all())
 
     def test_inverse_Bollinger_Bands(self):
         upper_band = inverse_Bollinger_Bands(self.example_data, window=3, target_band='upper')
@@ -37,12 +226,252 @@ class TestTechnicalAnalysis(unittest.TestCase):
         self.assertIsInstance(k_threshold, float)
         self.assertIsInstance(d_threshold, float)
 
+    def test_inverse_target_series(self):
+        cases = [(inverse_RSI_series, inverse_RSI, {'window': 3, 'target_rsi': 70}),
+                 (inverse_Bollinger_Bands_series, inverse_Bollinger_Bands, {'window': 3, 'target_band': 'lower'}),
+                 (inverse_ATR_series, inverse_ATR, {'window': 3}),
+                 (inverse_Stochastic_Oscillator_series, inverse_Stochastic_Oscillator, {'window': 3, 'target_value': 80})]
+        for series_func, func, params in cases:
+            series = series_func(self.example_data, **params)
+            expected = [func(self.example_data.iloc[:i+1], **params) for i in range(len(self.example_data))]
+            np.testing.assert_allclose(series.to_numpy(), np.array(expected, dtype=float), rtol=1e-12)
+
+    def test_latest_bar_targets(self):
+        df = self.example_data.copy()
+        d_threshold = inverse_Stochastic_Oscillator(df, window=3, target='%D', target_value=20)
+        pd.testing.assert_frame_equal(df, self.example_data)
+        # only the last window + 1 rows are read
+        history = pd.concat([pd.DataFrame(np.nan, index=range(-50, 0), columns=df.columns), df])
+        self.assertEqual(inverse_RSI(history, window=3, target_rsi=70), inverse_RSI(df, window=3, target_rsi=70))
+        panel = to_panel({'A': df, 'B': df * 2})
+        atr = inverse_ATR(panel, window=3)
+        self.assertEqual(list(atr.index), ['A', 'B'])
+        self.assertAlmostEqual(atr['B'], 2 * inverse_ATR(df, window=3))
+        self.assertAlmostEqual(inverse_Stochastic_Oscillator(panel, window=3, target='%D', target_value=20)['A'], d_threshold)
+
     def test_fibonacci_retracement(self):
         fib_levels = fibonacci_retracement(high=110, low=100)
         expected_levels = ['0.0%', '23.6%', '38.2%', '50.0%', '61.8%', '78.6%', '100.0%']
         for level in expected_levels:
             self.assertIn(level, fib_levels)
 
+    def test_compute_indicators(self):
+        block = compute_indicators(self.example_data, [
+            {"indicator": "SMA", "window": 3, "columns": ["Close"]},
+            {"indicator": "RSI", "window": 3},
+            {"indicator": "ATR", "window": 3},
+            {"indicator": "Stochastic_Oscillator", "window": 3},
+        ])
+        self.assertListEqual(list(block.columns), ['SMA_3_Close', 'RSI_3', 'TR', 'ATR', 'Lowest_Low', 'Highest_High', '%K', '%D'])
+        self.assertNotIn('SMA_3_Close', self.example_data.columns)
+        expected = self.example_data['Close'].rolling(3).mean()
+        pd.testing.assert_series_equal(block['SMA_3_Close'], expected, check_names=False)
+
+    def test_indicator_wrappers(self):
+        df = self.example_data.copy()
+        df = Stochastic_Oscillator(ATR(RSI(SMA(df, window=3, columns=['Close']), window=3), window=3), window=3)
+        block = compute_indicators(self.example_data, [
+            {"indicator": "SMA", "window": 3, "columns": ["Close"]},
+            {"indicator": "RSI", "window": 3},
+            {"indicator": "ATR", "window": 3},
+            {"indicator": "Stochastic_Oscillator", "window": 3},
+        ])
+        pd.testing.assert_frame_equal(df[block.columns], block)
+
+    def test_streaming_indicators(self):
+        batch = Stochastic_Oscillator(ATR(RSI(SMA(self.example_data.copy(), window=3, columns=['Close']), window=3), window=3), window=3)
+        history, live = self.example_data.iloc[:5], self.example_data.iloc[5:]
+        sma = StreamingSMA(window=3).warm_start(history)
+        rsi = StreamingRSI(window=3).warm_start(history)
+        atr = StreamingATR(window=3).warm_start(history)
+        stochastic = StreamingStochasticOscillator(window=3).warm_start(history)
+        for i, bar in live.iterrows():
+            self.assertEqual(sma.update(bar), batch.loc[i, 'SMA_3_Close'])
+            self.assertEqual(rsi.update(bar), batch.loc[i, 'RSI_3'])
+            self.assertEqual(atr.update(bar), batch.loc[i, 'ATR'])
+            self.assertEqual(stochastic.update(bar)['%D'], batch.loc[i, '%D'])
+
+    def test_moving_average_windows(self):
+        windows = [2, 3, 5]
+        sma_grid = SMA_windows(self.example_data, windows, column='Close')
+        ema_grid = EMA_windows(self.example_data, windows, column='Close')
+        self.assertEqual(sma_grid.shape, (len(self.example_data), len(windows)))
+        df = self.example_data.copy()
+        for j, window in enumerate(windows):
+            df = EMA(SMA(df, window=window, columns=['Close']), window=window, columns=['Close'])
+            np.testing.assert_array_equal(sma_grid[:, j], df[f'SMA_{window}_Close'].to_numpy())
+            np.testing.assert_allclose(ema_grid[:, j], df[f'EMA_{window}_Close'].to_numpy(), rtol=1e-12)
+
+    def test_panel_indicators(self):
+        late = self.example_data.iloc[4:] * 1.5
+        panel = to_panel({'A': self.example_data, 'B': late})
+        result = Stochastic_Oscillator(ATR(RSI(panel, window=3), window=3), window=3)
+        for symbol, df in {'A': self.example_data, 'B': late}.items():
+            single = Stochastic_Oscillator(ATR(RSI(df.copy(), window=3), window=3), window=3)
+            for col in ['RSI_3', 'ATR', '%K', '%D']:
+                np.testing.assert_array_equal(result[(col, symbol)].loc[df.index].to_numpy(), single[col].to_numpy())
+        self.assertTrue(result[('RSI_3', 'B')].iloc[:4].isna().all())
+
+        arrays = RSI(panel['Close'].to_numpy(), window=3)
+        np.testing.assert_array_equal(arrays['RSI_3'], result['RSI_3'].to_numpy())
+
+    def test_non_mutating_output(self):
+        columns = list(self.example_data.columns)
+        frame = Stochastic_Oscillator(self.example_data, window=3, output='frame')
+        arrays = ATR(self.example_data, window=3, output='arrays', dtype=np.float32)
+        self.assertListEqual(list(self.example_data.columns), columns)
+        self.assertListEqual(list(frame.columns), ['%K', '%D'])
+        self.assertListEqual(list(arrays), ['ATR'])
+        self.assertEqual(arrays['ATR'].dtype, np.float32)
+        expected = ATR(self.example_data.copy(), window=3)['ATR'].to_numpy()
+        np.testing.assert_allclose(arrays['ATR'], expected, rtol=1e-6)
+
+    def test_realised_volatilities(self):
+        df = self.example_data.assign(Open=self.example_data['Close'].shift(1).fillna(100))
+        models = ['CloseToClose', 'Parkinson', 'GarmanKlass', 'RogersSatchell', 'YangZhang']
+        block = realised_volatilities(df, window=3, models=models, output='frame')
+        for model in models:
+            single = realised_volatility(df.copy(), window=3, model=model)
+            np.testing.assert_array_equal(block[f'Realised_Volatility_{model}'].to_numpy(),
+                                          single['Realised_Volatility'].to_numpy())
+        log_range = np.log(df['High'] / df['Low'])
+        expected = log_range.rolling(3).apply(lambda x: np.sqrt((x**2).mean() / (4 * np.log(2))))
+        np.testing.assert_allclose(block['Realised_Volatility_Parkinson'].to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+    def test_rolling_order_statistics(self):
+        close = self.example_data['Close'].to_numpy(dtype=float, copy=True)
+        close[4] = np.nan
+        quantiles = rolling_quantiles(close, 4, [0.1, 0.5, 0.9], closed='left')
+        for i in range(4, len(close)):
+            window = close[i-4:i]
+            np.testing.assert_array_equal(quantiles[i], np.quantile(window[~np.isnan(window)], [0.1, 0.5, 0.9]))
+        state = RollingQuantile(4)
+        medians = [state.update(value).median() for value in close]
+        np.testing.assert_array_equal(medians, pd.Series(close).rolling(4).median().to_numpy())
+        # the batch quantiles (Fenwick tree on the numba backend) read the same values as the streaming window
+        state = RollingQuantile(4)
+        streamed = [[window.quantile(q) for q in (0.1, 0.5, 0.9)] for window in map(state.update, close)]
+        np.testing.assert_array_equal(rolling_quantiles(close, 4, [0.1, 0.5, 0.9]), streamed)
+
+    @unittest.skipIf(kernels.numba is None, "numba is not installed")
+    def test_kernel_backends(self):
+        df = self.example_data.assign(Open=self.example_data['Close'].shift(1).fillna(100))
+        specs = [{"indicator": "SME", "window": 4, "columns": ["Close"]},
+                 {"indicator": "EMA", "window": 3, "columns": ["Close"]},
+                 {"indicator": "MACD", "short_window": 2, "long_window": 4, "signal_window": 3},
+                 {"indicator": "Stochastic_Oscillator", "window": 3}]
+        backend = kernels.backend
+        try:
+            kernels.set_backend('pandas')
+            expected = compute_indicators(df, specs)
+            kernels.set_backend('numba')
+            pd.testing.assert_frame_equal(compute_indicators(df, specs), expected, check_exact=True)
+        finally:
+            kernels.set_backend(backend)
+
+    def test_rolling_var_long_series(self):
+        # two years of 1Min bars of a trending price: the error must not grow with the history
+        rng = np.random.default_rng(0)
+        close = 100 + np.cumsum(rng.normal(0.01, 1, 1_000_000)) + np.arange(1_000_000) * 0.5
+        expected = pd.Series(close).rolling(20).var().to_numpy()
+        backend = kernels.backend
+        try:
+            for name in ([backend, 'pandas'] if backend == 'numba' else [backend]):
+                kernels.set_backend(name)
+                engine = IndicatorEngine(pd.DataFrame({'Close': close}))
+                np.testing.assert_allclose(engine.rolling_var('Close', engine.array('Close'), 20), expected, rtol=1e-9)
+        finally:
+            kernels.set_backend(backend)
+
+    def test_backtest_single_stock(self):
+        df = pd.DataFrame({'Close': [10., 10., 12., 12., 11.], 'High': [10.5, 10.5, 12.5, 12.5, 11.5],
+                           'Low': [9.5, 9.5, 11.5, 11.5, 10.5], 'Signal': ['Hold', 'Buy', 'Sell', 'Sell', 'Hold'],
+                           'Execute': [None, 10., 12., 20., None], 'Quantity': [0., 0.5, 0., 0.1, 0.]})
+        backend = kernels.backend
+        try:
+            for name in ([backend, 'pandas'] if backend == 'numba' else [backend]):
+                kernels.set_backend(name)
+                backtest = BacktestSingleStock(df.copy())
+                with contextlib.redirect_stdout(io.StringIO()):
+                    backtest.compute_backtest(initial_capital=1000, fees_type='%', fees_amount=0.01)
+                # buy 500 at 10 (fee 5), sell 50 shares at 12 (fee 6), the order at 20 is outside the bar
+                np.testing.assert_allclose(backtest.data['Cash'], [1000, 495, 1089, 1089, 1089])
+                np.testing.assert_allclose(backtest.data['Portfolio_Value'], [1000, 995, 1089, 1089, 1089])
+                self.assertEqual(len(backtest.daily_returns), 4)
+        finally:
+            kernels.set_backend(backend)
+
+    def test_backtest_portfolio(self):
+        bars = {'Signal': [[HOLD, HOLD], [BUY, BUY], [SELL, HOLD]], 'Execute': [[np.nan] * 2, [10., 20.], [11., np.nan]],
+                'Quantity': [[0., 0.], [1.2, 1.2], [0., 0.]], 'Close': [[10., 20.], [10., 20.], [11., 21.]]}
+        bars['High'] = [[close + 1 for close in row] for row in bars['Close']]
+        bars['Low'] = [[close - 1 for close in row] for row in bars['Close']]
+        panel = pd.concat({field: pd.DataFrame(values, columns=['A', 'B']) for field, values in bars.items()}, axis=1)
+        backtest = BacktestPortfolio(panel)
+        with contextlib.redirect_stdout(io.StringIO()):
+            backtest.compute_backtest(initial_capital=1000)
+        # A buys 1200 on margin, B's order would take the cash below -1000 and is rejected; A closes at 11
+        np.testing.assert_allclose(backtest.positions['A'], [0, 120, 0])
+        np.testing.assert_allclose(backtest.positions['B'], [0, 0, 0])
+        np.testing.assert_allclose(backtest.cash_values, [1000, -200, 1120])
+        np.testing.assert_allclose(backtest.portfolio_values, [1000, 1000, 1120])
+
+    def test_backtest_columns(self):
+        df = self.example_data.assign(Close=[100, 98, 97, 99, 102, 104, 103, 101, 99, 100, 103])
+        df = df.assign(High=df['Close'] + 1, Low=df['Close'] - 1)
+        signals = ma_crossover_signal_grid(df, base_line_windows=[2, 3], signal_line_windows=[4, 5])
+        self.assertEqual(list(signals.columns), [(2, 4), (2, 5), (3, 4), (3, 5)])
+        values, metrics = BacktestSingleStock(df.copy()).compute_backtest_columns(signals, quantities=0.5,
+                                                                                 fees_type='%', fees_amount=0.01)
+        for column in signals.columns:
+            expected = ma_crossover_signal(df.copy(), column[0], "SMA", ["Close"], column[1], "SMA", ["Close"])
+            np.testing.assert_array_equal(signals[column], expected['Signal'])
+            orders = df.assign(Signal=signals[column], Execute=df['Close'].where(signals[column] != HOLD), Quantity=0.5)
+            backtest = BacktestSingleStock(orders)
+            with contextlib.redirect_stdout(io.StringIO()):
+                backtest.compute_backtest(fees_type='%', fees_amount=0.01)
+            np.testing.assert_array_equal(values[column], backtest.portfolio_values)
+            self.assertAlmostEqual(metrics.loc[column, 'Sharpe_Ratio'], backtest.compute_sharpe_ratio())
+
+    def test_backtest_fill_rules(self):
+        df = pd.DataFrame({'Open': [10., 11., 12., 13.], 'Close': [10., 12., 11., 14.],
+                           'Signal': [BUY, HOLD, SELL, HOLD]})
+        # all in: 100 shares at the close of 10, sold at the close of 11
+        close = run_backtest(df.copy(), fill="close", initial_capital=1000)
+        np.testing.assert_allclose(close['Portfolio_Value'], [1000, 1200, 1100, 1100])
+        # next open: the Buy of bar 0 fills at the open of bar 1, the Sell of bar 2 at the open of bar 3
+        next_open = run_backtest(df.copy(), fill="next_open", initial_capital=1000)
+        np.testing.assert_allclose(next_open['Portfolio_Value'], [1000, 1000 / 11 * 12, 1000 / 11 * 11,
+                                                                  1000 / 11 * 13])
+        np.testing.assert_allclose(next_open['Cash'], [1000, 0, 0, 1000 / 11 * 13])
+        with self.assertRaises(ValueError):
+            run_backtest(df.copy(), fill="vwap")
+        # string signals give the same values and the caller's frame is left as it is
+        labels = df.assign(Signal=signal_labels(df['Signal']))
+        given = labels.copy()
+        np.testing.assert_array_equal(run_backtest(labels, fill="next_open", initial_capital=1000)['Cash'],
+                                      next_open['Cash'])
+        pd.testing.assert_frame_equal(labels, given)
+
+    def test_performance_metrics(self):
+        values = np.array([100., 120., 90., 110., 130., 125.])
+        depth, duration = max_drawdown(values)
+        self.assertAlmostEqual(depth, -0.25)
+        self.assertEqual(duration, 2)
+        runs = pd.DataFrame({'up': np.linspace(100, 150, 6), 'swing': values})
+        stock_values = np.column_stack([np.zeros(6), [0., 0., 90., 110., 0., 0.]])
+        metrics = performance_metrics(runs, stock_values, np.ones(6), frequency='1D')
+        self.assertEqual(list(metrics.index), ['up', 'swing'])
+        self.assertAlmostEqual(metrics.loc['swing', 'Total_Return'], 0.25)
+        self.assertAlmostEqual(metrics.loc['swing', 'Hit_Rate'], 0.6)
+        self.assertAlmostEqual(metrics.loc['swing', 'Exposure'], 2 / 6)
+        self.assertEqual(metrics.loc['up', 'Max_Drawdown'], 0)
+        self.assertTrue(np.isnan(metrics.loc['up', 'Calmar_Ratio']))
+        returns = runs.pct_change().dropna()
+        np.testing.assert_allclose(metrics['Sharpe_Ratio'], [sharpe_ratio(returns[run], periods=252) for run in runs])
+        with self.assertRaises(ValueError):
+            performance_metrics(runs, frequency='daily')
+
     def test_sharpe_ratio(self):
         dummy_returns = pd.Series([0.01, 0.02, -0.005, 0.015, -0.01])
         sharpe = calculate_sharpe_ratio(dummy_returns)